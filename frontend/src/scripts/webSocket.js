@@ -6,10 +6,12 @@ const MAX_RECONNECT_ATTEMPTS = 5;
 let ecgChart = null;
 let spo2Chart = null;
 const MAX_DATA_POINTS = 100;
+const DISPLAY_RATE = 50; // Points per second requested from the server (min/max decimated)
 
 let ecgData = Array(MAX_DATA_POINTS).fill(0);
 let spo2Data = Array(MAX_DATA_POINTS).fill(95);
 let timeLabels = Array(MAX_DATA_POINTS).fill('');
+let measuredHeartRate = null; // From 'beat' messages, when the server detects beats
 
 // Anomaly tracking variables
 let consecutiveAnomalies = 0;
@@ -18,7 +20,9 @@ let lastAlertTime = 0;
 const MIN_ALERT_INTERVAL = 300000; // 5 minutes in milliseconds
 
 export function initializeWebSocket() {
-    ws = new WebSocket('ws://localhost:8765', ['frontend']);
+    // Prefer compact binary sample frames; the server falls back to JSON for 'frontend'
+    ws = new WebSocket(`ws://localhost:8765/?rate=${DISPLAY_RATE}`, ['frontend.bin', 'frontend']);
+    ws.binaryType = 'arraybuffer';
     
     ws.onopen = () => {
         console.log('Connected to WebSocket server');
@@ -300,14 +304,62 @@ async function handleAnomalyDetection() {
     }
 }
 
+// Decode a binary sample frame (layout documented in src/server/protocol.py)
+function decodeSampleFrame(buffer) {
+    const view = new DataView(buffer);
+    if (view.getUint8(0) !== 0xED) {
+        throw new Error('Unknown binary frame');
+    }
+    // High bit of the encoding byte marks a history snapshot
+    const encoding = view.getUint8(2) & 0x7F;
+    const history = (view.getUint8(2) & 0x80) !== 0;
+    const idLength = view.getUint8(3);
+    const count = view.getUint32(4, true);
+    const deviceId = new TextDecoder().decode(new Uint8Array(buffer, 20, idLength));
+    let offset = 20 + idLength + ((4 - (idLength % 4)) % 4);
+    const values = encoding === 2
+        ? new Int16Array(buffer, offset, count)
+        : new Float32Array(buffer, offset, count);
+    offset += count * values.BYTES_PER_ELEMENT;
+    const bitmask = new Uint8Array(buffer, offset);
+    const anomalies = Array.from({ length: count }, (_, i) => ((bitmask[i >> 3] >> (i & 7)) & 1) === 1);
+    return {
+        deviceId,
+        startTimestamp: view.getFloat64(8, true),
+        samplePeriod: view.getFloat32(16, true),
+        values,
+        anomalies,
+        history
+    };
+}
+
 function handleWebSocketMessage(event) {
     try {
+        if (event.data instanceof ArrayBuffer) {
+            const frame = decodeSampleFrame(event.data);
+            if (frame.history) {
+                showECGHistory(frame);
+            } else {
+                updateECGBatch(frame);
+            }
+            return;
+        }
         const data = JSON.parse(event.data);
         
         if (data.type === 'alert') {
             handleAlert(data);
         } else if (data.type === 'error') {
             updateStatus(data.message, 'warning');
+        } else if (data.type === 'beat') {
+            updateBeat(data);
+        } else if (data.type === 'data_batch') {
+            updateECGBatch(data);
+        } else if (data.type === 'history') {
+            showECGHistory({
+                values: data.values,
+                startTimestamp: data.start_timestamp,
+                samplePeriod: 1 / data.display_rate
+            });
         } else if (data.value !== undefined) {
             updateECGData(data);
         }
@@ -316,6 +368,16 @@ function handleWebSocketMessage(event) {
     }
 }
 
+function updateBeat(data) {
+    // Heart rate measured from the last RR interval (sent once per detected beat)
+    if (data.heart_rate == null) return;
+    measuredHeartRate = Math.round(data.heart_rate);
+    const heartRateDisplay = document.getElementById('heartRate');
+    if (heartRateDisplay) {
+        heartRateDisplay.textContent = measuredHeartRate;
+    }
+}
+
 function updateECGData(data) {
     // Update ECG data
     ecgData.shift();
@@ -327,7 +389,7 @@ function updateECGData(data) {
     
     // Update heart rate display
     const heartRateDisplay = document.getElementById('heartRate');
-    if (heartRateDisplay) {
+    if (heartRateDisplay && measuredHeartRate === null) {
         const simulatedHeartRate = Math.round(70 + Math.random() * 10);
         heartRateDisplay.textContent = simulatedHeartRate;
     }
@@ -352,6 +414,54 @@ function updateECGData(data) {
     }
 }
 
+function updateECGBatch(data) {
+    const label = new Date().toLocaleTimeString();
+    for (const value of data.values) {
+        ecgData.shift();
+        ecgData.push(value);
+        timeLabels.shift();
+        timeLabels.push(label);
+    }
+
+    ecgChart?.setOption({
+        xAxis: {
+            data: timeLabels
+        },
+        series: [{
+            data: ecgData
+        }]
+    });
+
+    // A batch counts as one anomalous reading if any of its points were flagged
+    if (data.anomalies.some(Boolean)) {
+        handleAnomalyDetection();
+        updateStatus('Anomaly Detected', 'warning');
+    } else {
+        consecutiveAnomalies = 0;
+        updateStatus('Normal', 'normal');
+    }
+}
+
+// Fill the chart with the recent trace the server sends on connect, so it
+// is not empty until live data arrives. Past anomalies do not raise alerts.
+function showECGHistory(data) {
+    const values = Array.from(data.values).slice(-MAX_DATA_POINTS);
+    const offset = data.values.length - values.length;
+    const padding = MAX_DATA_POINTS - values.length;
+    ecgData = Array(padding).fill(0).concat(values);
+    timeLabels = Array(padding).fill('').concat(values.map((_, i) =>
+        new Date((data.startTimestamp + (offset + i) * data.samplePeriod) * 1000).toLocaleTimeString()
+    ));
+
+    ecgChart?.setOption({
+        xAxis: {
+            data: timeLabels
+        },
+        series: [{
+            data: ecgData
+        }]
+    });
+}
 
 // Handle window resize
 window.addEventListener('resize', () => {
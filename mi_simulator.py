@@ -2,8 +2,6 @@ import numpy as np
 import time
 import random
 import math
-import requests
-import websocket
 import json
 import threading
 
@@ -126,6 +124,10 @@ class MISimulator:
 
 def test_mi_detection():
     """Test the ECG server with MI simulation"""
+    # Only needed for this Socket.IO demo; MISimulator itself has no network dependencies
+    import requests
+    import websocket
+
     # Server configuration
     SERVER_URL = "http://localhost:5000"
     WS_URL = "ws://localhost:5000/socket.io/?EIO=4&transport=websocket"
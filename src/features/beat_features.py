@@ -0,0 +1,117 @@
+"""
+Per-beat ECG features shared by the batch extractors and the streaming pipeline
+
+Only numpy is needed, so the live server can compute the same features as
+MIFeatureExtractor (which also needs wfdb and pandas to read records).
+"""
+import numpy as np
+
+# Segment windows around the R peak, in seconds
+SEGMENT_WINDOWS = {
+    'p_wave': (-0.15, -0.07),  # P wave
+    'pq': (-0.07, -0.03),      # PQ segment (baseline)
+    'qrs': (-0.03, 0.05),      # QRS complex
+    'stp': (0.05, 0.09),       # Early ST segment (ST point)
+    'st': (0.09, 0.16),        # ST segment
+    't_wave': (0.16, 0.35),    # T wave
+    'tp': (0.35, 0.45)         # TP segment (when available)
+}
+
+SPECTRAL_BAND = (0.5, 40.0)  # Physiologically relevant frequencies in Hz
+
+
+def spectral_features(fft_vals, freqs):
+    """
+    Dominant frequency, power and entropy of FFT magnitudes within SPECTRAL_BAND
+
+    Args:
+        fft_vals: FFT magnitudes
+        freqs: Frequency of each magnitude in Hz
+
+    Returns:
+        dict with dominant_frequency, spectral_power and spectral_entropy
+        (empty if no frequency falls in the band)
+    """
+    mask = (freqs >= SPECTRAL_BAND[0]) & (freqs <= SPECTRAL_BAND[1])
+    if not np.any(mask):
+        return {}
+    fft_vals = fft_vals[mask]
+    freqs = freqs[mask]
+    normalized_psd = fft_vals / np.sum(fft_vals)
+    return {
+        'dominant_frequency': freqs[np.argmax(fft_vals)],
+        'spectral_power': np.sum(np.square(fft_vals)),
+        'spectral_entropy': -np.sum(normalized_psd * np.log2(normalized_psd + 1e-10))
+    }
+
+
+def beat_segment_features(beat, fs, r_peak_idx):
+    """
+    Extract enhanced features from a single heartbeat
+
+    Args:
+        beat: Samples around one beat
+        fs: Sampling rate in Hz
+        r_peak_idx: Index of the R peak within beat
+
+    Returns:
+        dict of segment, ST/T and spectral features
+    """
+    features = {}
+
+    # Convert windows to sample indices
+    indices = {name: (int(start * fs) + r_peak_idx, int(end * fs) + r_peak_idx)
+               for name, (start, end) in SEGMENT_WINDOWS.items()}
+
+    # Extract enhanced features from each segment
+    for name, (start_idx, end_idx) in indices.items():
+        if start_idx >= 0 and end_idx < len(beat):
+            segment = beat[start_idx:end_idx]
+
+            # Basic statistical features
+            features[f'{name}_mean'] = np.mean(segment)
+            features[f'{name}_median'] = np.median(segment)
+            features[f'{name}_std'] = np.std(segment)
+            features[f'{name}_range'] = np.ptp(segment)
+            features[f'{name}_energy'] = np.sum(np.square(segment))
+
+            # Morphology features
+            features[f'{name}_max'] = np.max(segment)
+            features[f'{name}_min'] = np.min(segment)
+            features[f'{name}_area'] = np.trapezoid(y=segment, dx=1/fs)
+
+            if len(segment) > 2:
+                # Slope features (using polyfit for robustness)
+                x = np.arange(len(segment))
+                slope, intercept = np.polyfit(x, segment, 1)
+                features[f'{name}_slope'] = slope
+
+                # Curvature features (2nd derivative approximation)
+                if len(segment) > 4:
+                    diff2 = np.diff(np.diff(segment))
+                    features[f'{name}_curvature_mean'] = np.mean(np.abs(diff2))
+                    features[f'{name}_curvature_max'] = np.max(np.abs(diff2))
+
+    # ST segment specific features (ST elevation/depression)
+    if 'pq_mean' in features and 'st_mean' in features:
+        features['st_deviation'] = features['st_mean'] - features['pq_mean']
+        features['st_deviation_normalized'] = features['st_deviation'] / features['qrs_range'] if features['qrs_range'] > 0 else 0
+
+    # T wave features relative to baseline
+    if 'pq_mean' in features and 't_wave_max' in features:
+        features['t_wave_amplitude'] = features['t_wave_max'] - features['pq_mean']
+        features['t_wave_symmetry'] = features['t_wave_mean'] / features['t_wave_max'] if features['t_wave_max'] != 0 else 0
+
+    # QT interval estimation (when both Q and T are visible)
+    if 'qrs_min' in features and 't_wave_max' in features:
+        qt_proxy = (end_idx - start_idx) / fs  # Approximate QT interval in seconds
+        features['qt_interval'] = qt_proxy
+
+    # Frequency domain features using FFT
+    if len(beat) > 20:
+        fft_vals = np.abs(np.fft.rfft(beat))
+        freqs = np.fft.rfftfreq(len(beat), 1/fs)
+        if len(freqs) > 1:
+            features.update(spectral_features(fft_vals, freqs))
+
+    return features
@@ -1,5 +1,6 @@
 import numpy as np
 from scipy.signal import find_peaks
+from src.features.beat_features import spectral_features
 from src.features.mi_feature_extractor import MIFeatureExtractor  # Assuming you rename your current file to mi_feature_extractor.py
 
 def extract_features(signal, sampling_rate):
@@ -64,26 +65,11 @@ def extract_features(signal, sampling_rate):
         features['st_max'] = 0
         features['st_min'] = 0
     
-    # Frequency domain features
+    # Frequency domain features (0.5-40Hz, see beat_features.spectral_features)
     fft_vals = np.abs(np.fft.rfft(signal))
     freqs = np.fft.rfftfreq(len(signal), 1/sampling_rate)
-    
-    # Consider only physiologically relevant frequencies (0.5-40Hz)
-    mask = (freqs >= 0.5) & (freqs <= 40)
-    fft_vals = fft_vals[mask]
-    freqs = freqs[mask]
-    
-    if len(freqs) > 0:
-        features['dominant_frequency'] = freqs[np.argmax(fft_vals)]
-        features['spectral_power'] = np.sum(np.square(fft_vals))
-        
-        # Spectral entropy
-        normalized_psd = fft_vals / np.sum(fft_vals)
-        features['spectral_entropy'] = -np.sum(normalized_psd * np.log2(normalized_psd + 1e-10))
-    else:
-        features['dominant_frequency'] = 0
-        features['spectral_power'] = 0
-        features['spectral_entropy'] = 0
+    features.update({'dominant_frequency': 0, 'spectral_power': 0, 'spectral_entropy': 0})
+    features.update(spectral_features(fft_vals, freqs))
     
     # Convert features to list in fixed order for ML model
     feature_list = [
@@ -4,6 +4,7 @@ import wfdb.processing
 import os
 import pandas as pd
 from pathlib import Path
+from src.features.beat_features import beat_segment_features
 
 class MIFeatureExtractor:
     def __init__(self, data_dir):
@@ -76,89 +77,8 @@ class MIFeatureExtractor:
         return st_episodes
 
     def extract_features_from_beat(self, beat, fs, r_peak_idx):
-        """Extract enhanced features from a single heartbeat"""
-        features = {}
-        
-        # Enhanced time windows (in seconds) for more comprehensive segment analysis
-        windows = {
-            'p_wave': (-0.15, -0.07),  # P wave
-            'pq': (-0.07, -0.03),      # PQ segment (baseline)
-            'qrs': (-0.03, 0.05),      # QRS complex
-            'stp': (0.05, 0.09),       # Early ST segment (ST point)
-            'st': (0.09, 0.16),        # ST segment
-            't_wave': (0.16, 0.35),    # T wave
-            'tp': (0.35, 0.45)         # TP segment (when available)
-        }
-        
-        # Convert windows to sample indices
-        indices = {name: (int(start * fs) + r_peak_idx, int(end * fs) + r_peak_idx) 
-                  for name, (start, end) in windows.items()}
-        
-        # Extract enhanced features from each segment
-        for name, (start_idx, end_idx) in indices.items():
-            if start_idx >= 0 and end_idx < len(beat):
-                segment = beat[start_idx:end_idx]
-                
-                # Basic statistical features
-                features[f'{name}_mean'] = np.mean(segment)
-                features[f'{name}_median'] = np.median(segment)
-                features[f'{name}_std'] = np.std(segment)
-                features[f'{name}_range'] = np.ptp(segment)
-                features[f'{name}_energy'] = np.sum(np.square(segment))
-                
-                # Morphology features
-                features[f'{name}_max'] = np.max(segment)
-                features[f'{name}_min'] = np.min(segment)
-                features[f'{name}_area'] = np.trapezoid(y=segment, dx=1/fs)
-                
-                if len(segment) > 2:
-                    # Slope features (using polyfit for robustness)
-                    x = np.arange(len(segment))
-                    slope, intercept = np.polyfit(x, segment, 1)
-                    features[f'{name}_slope'] = slope
-                    
-                    # Curvature features (2nd derivative approximation)
-                    if len(segment) > 4:
-                        diff2 = np.diff(np.diff(segment))
-                        features[f'{name}_curvature_mean'] = np.mean(np.abs(diff2))
-                        features[f'{name}_curvature_max'] = np.max(np.abs(diff2))
-        
-        # ST segment specific features (ST elevation/depression)
-        if 'pq_mean' in features and 'st_mean' in features:
-            features['st_deviation'] = features['st_mean'] - features['pq_mean']
-            features['st_deviation_normalized'] = features['st_deviation'] / features['qrs_range'] if features['qrs_range'] > 0 else 0
-        
-        # T wave features relative to baseline
-        if 'pq_mean' in features and 't_wave_max' in features:
-            features['t_wave_amplitude'] = features['t_wave_max'] - features['pq_mean']
-            features['t_wave_symmetry'] = features['t_wave_mean'] / features['t_wave_max'] if features['t_wave_max'] != 0 else 0
-        
-        # QT interval estimation (when both Q and T are visible)
-        if 'qrs_min' in features and 't_wave_max' in features:
-            qt_proxy = (end_idx - start_idx) / fs  # Approximate QT interval in seconds
-            features['qt_interval'] = qt_proxy
-        
-        # Frequency domain features using FFT
-        if len(beat) > 20:
-            fft_vals = np.abs(np.fft.rfft(beat))
-            freqs = np.fft.rfftfreq(len(beat), 1/fs)
-            if len(freqs) > 1:
-                # Limit to physiologically relevant frequencies (0.5-40Hz)
-                mask = (freqs >= 0.5) & (freqs <= 40)
-                if np.any(mask):
-                    fft_vals = fft_vals[mask]
-                    freqs = freqs[mask]
-                    
-                    # Dominant frequency
-                    dominant_freq_idx = np.argmax(fft_vals)
-                    features['dominant_frequency'] = freqs[dominant_freq_idx]
-                    features['spectral_power'] = np.sum(np.square(fft_vals))
-                    
-                    # Spectral entropy
-                    normalized_psd = fft_vals / np.sum(fft_vals)
-                    features['spectral_entropy'] = -np.sum(normalized_psd * np.log2(normalized_psd + 1e-10))
-        
-        return features
+        """Extract enhanced features from a single heartbeat (see beat_features.py)"""
+        return beat_segment_features(beat, fs, r_peak_idx)
 
     def process_record(self, record_name):
         """Process a single record to extract features"""
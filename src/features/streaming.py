@@ -0,0 +1,287 @@
+"""
+Streaming ECG feature pipeline for live device streams
+
+Samples arrive in small frames. Instead of re-running find_peaks and an FFT
+over every overlapping window, the pipeline carries its state from frame to
+frame:
+
+- StreamingRPeakDetector: Pan-Tompkins style band-pass, derivative, square
+  and moving-window integration with filter state carried across calls, and
+  adaptive signal/noise thresholds.
+- SlidingSpectrum: sliding DFT of the 0.5-40 Hz bins over the last few
+  seconds, updated in O(bins) per sample and re-synchronized with an exact
+  FFT once per window length to stop rounding drift.
+- StreamingFeaturePipeline: keeps a short raw buffer and, once the samples
+  after an R peak have arrived, computes that beat's segment features
+  (beat_features.py) and attaches RR interval and spectral features. Each
+  beat is featurized exactly once.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from src.features.beat_features import SPECTRAL_BAND, beat_segment_features, spectral_features
+from src.utils.ring_buffer import ECGRingBuffer
+
+
+class StreamingRPeakDetector:
+    """
+    Detect R peaks in a sample stream, one chunk at a time
+
+    Args:
+        sampling_rate: Samples per second
+        learning_seconds: Initial signal used to set the thresholds (no beats are reported meanwhile)
+        refractory_seconds: Minimum time between beats
+    """
+
+    def __init__(self, sampling_rate: int, learning_seconds: float = 2.0, refractory_seconds: float = 0.2):
+        from scipy.signal import butter, lfilter_zi  # Only needed once a stream is featurized
+
+        self.sampling_rate = sampling_rate
+        self._b, self._a = butter(2, [5.0, 15.0], btype='band', fs=sampling_rate)
+        self._band_zi = lfilter_zi(self._b, self._a) * 0.0
+        self.integration_width = max(1, int(0.15 * sampling_rate))
+        self._mwi_zi = np.zeros(self.integration_width - 1)
+        self._last_filtered = 0.0
+        self.learning_samples = int(learning_seconds * sampling_rate)
+        self.refractory = int(refractory_seconds * sampling_rate)
+        # Raw samples before the current chunk, kept to locate the R peak inside a detected QRS
+        self._raw = ECGRingBuffer(sampling_rate)
+        self.total_samples = 0
+        self.signal_level = 0.0  # Running estimate of QRS peak height in the integrated signal
+        self.noise_level = 0.0
+        self._learning_max = 0.0
+        self._learning_sum = 0.0
+        self._in_qrs = False
+        self._qrs_start = 0
+        self._qrs_peak = 0.0
+        self.last_peak: Optional[int] = None
+        self._last_threshold_decay = 0
+        self._chunk = np.empty(0)
+
+    @property
+    def threshold(self) -> float:
+        return self.noise_level + 0.25 * (self.signal_level - self.noise_level)
+
+    def _integrate(self, samples: np.ndarray) -> np.ndarray:
+        from scipy.signal import lfilter
+
+        filtered, self._band_zi = lfilter(self._b, self._a, samples, zi=self._band_zi)
+        derivative = np.diff(filtered, prepend=self._last_filtered)
+        self._last_filtered = filtered[-1]
+        integrated, self._mwi_zi = lfilter(np.full(self.integration_width, 1.0 / self.integration_width), [1.0],
+                                           np.square(derivative), zi=self._mwi_zi)
+        return integrated
+
+    def update(self, samples) -> List[int]:
+        """
+        Feed the next samples of the stream
+
+        Returns:
+            Positions (running sample index) of the R peaks confirmed by these samples
+        """
+        samples = np.asarray(samples, dtype=np.float64)
+        if not len(samples):
+            return []
+        start = self.total_samples
+        integrated = self._integrate(samples)
+        self.total_samples += len(samples)
+        self._chunk = samples
+
+        if start < self.learning_samples:
+            learning = integrated[:self.learning_samples - start]
+            self._learning_max = max(self._learning_max, float(learning.max()))
+            self._learning_sum += float(learning.sum())
+            if self.total_samples < self.learning_samples:
+                self._raw.extend(samples)
+                return []
+            self.signal_level = 0.5 * self._learning_max
+            self.noise_level = 0.5 * self._learning_sum / self.learning_samples
+            self._last_threshold_decay = self.total_samples
+            integrated = integrated[len(learning):]
+            start += len(learning)
+
+        peaks = []
+        position = 0
+        while position < len(integrated):
+            remaining = integrated[position:]
+            if not self._in_qrs:
+                above = np.flatnonzero(remaining > self.threshold)
+                if not len(above):
+                    break
+                position += above[0]
+                self._in_qrs = True
+                self._qrs_start = start + position
+                self._qrs_peak = 0.0
+            else:
+                below = np.flatnonzero(remaining <= self.threshold)
+                end = below[0] if len(below) else len(remaining)
+                if end:
+                    self._qrs_peak = max(self._qrs_peak, float(remaining[:end].max()))
+                position += end
+                if len(below):
+                    self._in_qrs = False
+                    peak = self._close_qrs(start + position)
+                    if peak is not None:
+                        peaks.append(peak)
+
+        # Lower the bar when no beat has been seen for a while (e.g. after a gain change)
+        since = self.total_samples - max(self.last_peak or 0, self._last_threshold_decay)
+        if not self._in_qrs and since > 1.5 * self.sampling_rate:
+            self.signal_level *= 0.5
+            self._last_threshold_decay = self.total_samples
+        self._raw.extend(samples)
+        return peaks
+
+    def _close_qrs(self, end: int) -> Optional[int]:
+        """Classify a finished above-threshold region and locate its R peak."""
+        # The integrated signal lags the raw QRS by up to the integration width
+        recent = np.concatenate([self._raw.window(), self._chunk])
+        recent_start = self.total_samples - len(recent)
+        search_start = max(self._qrs_start - self.integration_width, recent_start)
+        if end <= search_start:
+            return None
+        peak = search_start + int(np.argmax(recent[search_start - recent_start:end - recent_start]))
+        if self.last_peak is not None and peak - self.last_peak < self.refractory:
+            self.noise_level = 0.125 * self._qrs_peak + 0.875 * self.noise_level
+            return None
+        self.signal_level = 0.125 * self._qrs_peak + 0.875 * self.signal_level
+        self.last_peak = peak
+        return peak
+
+
+class SlidingSpectrum:
+    """
+    Spectrum of the last ``window`` samples, restricted to SPECTRAL_BAND
+
+    Args:
+        window: Samples in the analysed window
+        sampling_rate: Samples per second
+    """
+
+    def __init__(self, window: int, sampling_rate: int):
+        self.window = window
+        self.sampling_rate = sampling_rate
+        freqs = np.fft.rfftfreq(window, 1.0 / sampling_rate)
+        self.bins = np.flatnonzero((freqs >= SPECTRAL_BAND[0]) & (freqs <= SPECTRAL_BAND[1]))
+        self.freqs = freqs[self.bins]
+        self._twiddle = np.exp(2j * np.pi * self.bins / window)
+        self._buffer = ECGRingBuffer(window, dtype=np.float64)
+        self._spectrum: Optional[np.ndarray] = None
+        self._sum = 0.0
+        self._sum_squares = 0.0
+        self._since_exact = 0
+
+    @property
+    def ready(self) -> bool:
+        return self._spectrum is not None
+
+    def _resync(self):
+        values = self._buffer.window()
+        self._spectrum = np.fft.rfft(values)[self.bins]
+        self._sum = float(values.sum())
+        self._sum_squares = float(np.dot(values, values))
+        self._since_exact = 0
+
+    def update(self, samples):
+        samples = np.asarray(samples, dtype=np.float64)
+        m = len(samples)
+        if not m:
+            return
+        if self._spectrum is None or m >= self.window or self._since_exact + m >= self.window:
+            self._buffer.extend(samples)
+            if self._buffer.is_full:
+                self._resync()
+            return
+        dropped = self._buffer.window(m, end_offset=self.window - m).copy()
+        self._buffer.extend(samples)
+        delta = samples - dropped
+        # X' = X w^m + sum_i delta_i w^(m - i), w = exp(2j pi k / N)
+        powers = self._twiddle[:, None] ** np.arange(m, 0, -1)[None, :]
+        self._spectrum = self._spectrum * self._twiddle ** m + powers @ delta
+        self._sum += float(delta.sum())
+        self._sum_squares += float(np.dot(samples, samples) - np.dot(dropped, dropped))
+        self._since_exact += m
+
+    def features(self) -> Dict[str, float]:
+        """
+        Spectral features of the current window, as extract_features computes them
+        (on the z-scored window)
+        """
+        if self._spectrum is None:
+            return {}
+        mean = self._sum / self.window
+        variance = max(self._sum_squares / self.window - mean * mean, 0.0)
+        if variance == 0.0:
+            return {}
+        return spectral_features(np.abs(self._spectrum) / np.sqrt(variance), self.freqs)
+
+
+@dataclass
+class BeatFeatures:
+    """Features of one completed beat"""
+    r_peak: int  # Running sample index of the R peak
+    rr_interval: Optional[float]  # Seconds since the previous beat
+    heart_rate: Optional[float]  # Beats per minute from rr_interval
+    features: Dict[str, float] = field(default_factory=dict)
+
+
+class StreamingFeaturePipeline:
+    """
+    Per-beat features for one device stream
+
+    Args:
+        sampling_rate: Samples per second
+        before_seconds, after_seconds: Beat window around the R peak, as in MIFeatureExtractor.process_record
+        spectrum_seconds: Length of the window the spectral features describe
+    """
+
+    def __init__(self, sampling_rate: int, before_seconds: float = 0.3, after_seconds: float = 0.5,
+                 spectrum_seconds: float = 4.0):
+        self.sampling_rate = sampling_rate
+        self.before = int(before_seconds * sampling_rate)
+        self.after = int(after_seconds * sampling_rate)
+        self.detector = StreamingRPeakDetector(sampling_rate)
+        self.spectrum = SlidingSpectrum(int(spectrum_seconds * sampling_rate), sampling_rate)
+        # Detection lags the R peak by under a second, so 2 s covers every pending beat window
+        self._raw = ECGRingBuffer(self.before + self.after + 2 * sampling_rate)
+        self._pending: List[int] = []
+        self._previous_peak: Optional[int] = None
+
+    @property
+    def nbytes(self) -> int:
+        return self._raw.nbytes + self.spectrum._buffer.nbytes + self.detector._raw.nbytes
+
+    def update(self, samples) -> List[BeatFeatures]:
+        """
+        Feed the next samples of the stream
+
+        Returns:
+            Features of every beat whose window was completed by these samples
+        """
+        samples = np.asarray(samples, dtype=np.float64)
+        self._raw.extend(samples)
+        self.spectrum.update(samples)
+        self._pending.extend(self.detector.update(samples))
+
+        beats = []
+        total = self._raw.total_samples
+        while self._pending and self._pending[0] + self.after <= total:
+            peak = self._pending.pop(0)
+            rr_interval = (peak - self._previous_peak) / self.sampling_rate if self._previous_peak is not None else None
+            self._previous_peak = peak
+            start = peak - self.before
+            if start < total - len(self._raw) or start < 0:
+                continue  # Beat window no longer (or not yet) buffered
+            beat = self._raw.window(self.before + self.after, end_offset=total - (peak + self.after))
+            features = beat_segment_features(beat, self.sampling_rate, self.before)
+            # Spectrum of the last few seconds, alongside the beat's own spectral features
+            features.update({f'window_{name}': value for name, value in self.spectrum.features().items()})
+            beats.append(BeatFeatures(
+                r_peak=peak,
+                rr_interval=rr_interval,
+                heart_rate=60.0 / rr_interval if rr_interval else None,
+                features=features
+            ))
+        return beats
@@ -0,0 +1,205 @@
+"""
+Two-stage cascade: a cheap linear screen in front of the full ensemble
+
+Most windows are clearly normal. LinearScreen scores every window with one
+dot product; only windows at or above its threshold, calibrated on held-out
+training data to pass a target fraction of true anomalies, are escalated to
+the full model. Cleared windows keep the screen's probability, capped just
+below the decision threshold so a cleared window is never labelled anomalous.
+
+The screen is stored as a joblib dict (models/cascade_screen.joblib by
+default) holding the screen and its calibrated threshold; see
+calibrate_cascade in train_model.py.
+"""
+import time
+
+import numpy as np
+
+DEFAULT_SCREEN_FILE = 'cascade_screen.joblib'
+
+
+class LinearScreen:
+    """
+    Logistic-regression screen evaluated with NumPy, scaler folded in
+
+    P(anomaly) = sigmoid(X @ coef + intercept)
+    """
+
+    def __init__(self, coef, intercept):
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = float(intercept)
+        self.n_features_in_ = len(self.coef)
+        self.classes_ = np.array([0, 1])
+
+    def decision_function(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        return X @ self.coef + self.intercept
+
+    def predict_proba(self, X):
+        proba = 1.0 / (1.0 + np.exp(-self.decision_function(X)))
+        return np.column_stack([1.0 - proba, proba])
+
+
+def fit_screen(X, y, C=1.0):
+    """
+    Train a class-balanced logistic regression on standardized features
+
+    Returns:
+        LinearScreen taking raw features, with the StandardScaler folded in
+    """
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.preprocessing import StandardScaler
+
+    scaler = StandardScaler().fit(X)
+    classifier = LogisticRegression(C=C, class_weight='balanced', max_iter=1000)
+    classifier.fit(scaler.transform(X), y)
+    # w @ ((x - mean) / scale) + b == (w / scale) @ x + (b - (w / scale) @ mean)
+    coef = classifier.coef_[0] / scaler.scale_
+    return LinearScreen(coef, classifier.intercept_[0] - coef @ scaler.mean_)
+
+
+def calibrate_screen_threshold(screen, X, y, target_recall=0.99):
+    """
+    Highest screen threshold that still escalates target_recall of the anomalies in X
+
+    Args:
+        screen: Model exposing predict_proba
+        X, y: Calibration windows and labels (1 = anomaly)
+        target_recall: Fraction of anomalies that must reach the full model
+    """
+    anomaly_scores = np.sort(screen.predict_proba(X[np.asarray(y) == 1])[:, 1])
+    if not len(anomaly_scores):
+        raise ValueError("Calibration data has no anomalies")
+    # Windows at or above the threshold are escalated, so missing at most this many is allowed
+    allowed_misses = int(np.floor((1.0 - target_recall) * len(anomaly_scores)))
+    return float(anomaly_scores[allowed_misses])
+
+
+def fit_calibrated_screen(X, y, target_recall=0.99, calibration_fraction=0.2, random_state=42):
+    """
+    Fit a screen and calibrate its threshold on a held-out part of the training data
+
+    The test set is left for evaluate_cascade, so the recall and cost it
+    reports are out-of-sample.
+
+    Returns:
+        (screen, screen_threshold)
+    """
+    from sklearn.model_selection import train_test_split
+
+    X_fit, X_calibration, y_fit, y_calibration = train_test_split(
+        X, y, test_size=calibration_fraction, stratify=y, random_state=random_state
+    )
+    screen = fit_screen(X_fit, y_fit)
+    return screen, calibrate_screen_threshold(screen, X_calibration, y_calibration, target_recall)
+
+
+class CascadeModel:
+    """
+    Screen every window, score only the escalated ones with the full model
+
+    Args:
+        screen: Cheap model exposing predict_proba, e.g. a LinearScreen
+        model: Full model exposing predict_proba
+        screen_threshold: Screen P(anomaly) at or above which a window is escalated
+        threshold: Decision threshold applied to the cascade's probabilities
+    """
+
+    def __init__(self, screen, model, screen_threshold, threshold=0.5):
+        self.screen = screen
+        self.model = model
+        self.screen_threshold = screen_threshold
+        self.threshold = threshold
+        self.n_features_in_ = getattr(model, 'n_features_in_', screen.n_features_in_)
+        self.classes_ = np.array([0, 1])
+        self.windows = 0
+        self.escalated = 0
+
+    @property
+    def escalation_rate(self):
+        """Fraction of the windows scored so far that went to the full model"""
+        return self.escalated / self.windows if self.windows else 0.0
+
+    def predict_proba(self, X):
+        """
+        Predict class probabilities
+
+        Args:
+            X: Features (can be a single sample or batch)
+
+        Returns:
+            Array of class probabilities [P(normal), P(anomaly)]
+        """
+        X = np.asarray(X)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        proba = self.screen.predict_proba(X)[:, 1]
+        escalate = proba >= self.screen_threshold
+        self.windows += len(X)
+        self.escalated += int(np.count_nonzero(escalate))
+        if escalate.all():
+            proba = self.model.predict_proba(X)[:, 1]
+        else:
+            # Cleared windows stay below the decision threshold even when screen_threshold is above it
+            proba = np.minimum(proba, np.nextafter(self.threshold, -np.inf))
+            if escalate.any():
+                proba[escalate] = self.model.predict_proba(X[escalate])[:, 1]
+        return np.column_stack([1.0 - proba, proba])
+
+    def predict(self, X):
+        return (self.predict_proba(X)[:, 1] >= self.threshold).astype(int)
+
+
+def _seconds_per_window(model, X, repeats=3):
+    best = float('inf')
+    for _ in range(repeats):
+        started = time.perf_counter()
+        model.predict_proba(X)
+        best = min(best, time.perf_counter() - started)
+    return best / len(X)
+
+
+def evaluate_cascade(screen, model, screen_threshold, X, y, threshold=0.5):
+    """
+    Compare a cascade against the full model alone
+
+    Cost per window is timed on X as one batch, so it reflects batched scoring.
+
+    Returns:
+        Dict with the escalation rate, both recalls and the average cost per
+        window of the full model, the screen and the cascade
+    """
+    y = np.asarray(y)
+    full_proba = model.predict_proba(X)[:, 1]
+    cascade = CascadeModel(screen, model, screen_threshold, threshold)
+    cascade_proba = cascade.predict_proba(X)[:, 1]
+    anomalies = y == 1
+    full_cost = _seconds_per_window(model, X)
+    screen_cost = _seconds_per_window(screen, X)
+    cascade_cost = screen_cost + cascade.escalation_rate * full_cost
+    return {
+        'escalation_rate': cascade.escalation_rate,
+        'screen_recall': float(np.mean(screen.predict_proba(X[anomalies])[:, 1] >= screen_threshold)),
+        'full_recall': float(np.mean(full_proba[anomalies] >= threshold)),
+        'cascade_recall': float(np.mean(cascade_proba[anomalies] >= threshold)),
+        'full_seconds_per_window': full_cost,
+        'screen_seconds_per_window': screen_cost,
+        'cascade_seconds_per_window': cascade_cost,
+        'cost_saving': 1.0 - cascade_cost / full_cost,
+    }
+
+
+def save_screen(path, screen, screen_threshold, target_recall):
+    import joblib
+
+    joblib.dump({'screen': screen, 'threshold': screen_threshold, 'target_recall': target_recall}, path)
+
+
+def load_screen(path):
+    """Returns (screen, screen_threshold) saved by save_screen"""
+    import joblib
+
+    saved = joblib.load(path)
+    return saved['screen'], saved['threshold']
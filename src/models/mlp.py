@@ -0,0 +1,58 @@
+"""
+PyTorch MLP trained by train_model_deep.py
+
+Kept in its own module so checkpoints (models/best_model.pth) can be loaded
+and exported without re-running the training script.
+"""
+import torch
+import torch.nn as nn
+
+
+class MLPModel(nn.Module):
+    def __init__(self, input_dim):
+        super(MLPModel, self).__init__()
+        self.fc1 = nn.Linear(input_dim, 64)
+        self.relu = nn.ReLU()
+        self.fc2 = nn.Linear(64, 32)
+        self.fc3 = nn.Linear(32, 1)
+        self.sigmoid = nn.Sigmoid()
+
+    def forward(self, x):
+        x = self.relu(self.fc1(x))
+        x = self.relu(self.fc2(x))
+        x = self.sigmoid(self.fc3(x))
+        return x
+
+
+class MLPProbabilities(nn.Module):
+    """Wrap an MLPModel to return [P(normal), P(anomaly)] like predict_proba"""
+
+    def __init__(self, model):
+        super(MLPProbabilities, self).__init__()
+        self.model = model
+
+    def forward(self, x):
+        anomaly = self.model(x)
+        return torch.cat([1 - anomaly, anomaly], dim=1)
+
+
+def load_checkpoint(checkpoint_path):
+    """Rebuild an MLPModel in eval mode from a checkpoint saved by train_model_deep.py"""
+    checkpoint = torch.load(checkpoint_path, map_location='cpu')
+    model = MLPModel(checkpoint['input_dim'])
+    model.load_state_dict(checkpoint['model_state_dict'])
+    model.eval()
+    return model
+
+
+def fold_scaler(model, mean, scale):
+    """
+    Fold a StandardScaler into the first layer, so the model takes raw features
+
+    W @ ((x - mean) / scale) + b == (W / scale) @ x + (b - (W / scale) @ mean)
+    """
+    with torch.no_grad():
+        weight = model.fc1.weight / torch.as_tensor(scale, dtype=model.fc1.weight.dtype)
+        model.fc1.weight.copy_(weight)
+        model.fc1.bias.sub_(weight @ torch.as_tensor(mean, dtype=weight.dtype))
+    return model
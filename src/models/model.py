@@ -2,36 +2,79 @@ import os
 import joblib
 import numpy as np
 from sklearn.base import BaseEstimator, ClassifierMixin
+from src.models.cascade import CascadeModel, load_screen
+from src.models.prediction import DEFAULT_MEMORY_BUDGET, predict_with_proba, score_signal
+from src.models.runtime import COMPILED_RUNTIME, MMAP_RUNTIME, SKLEARN_RUNTIME, load_model_file, model_file_for
 import warnings
 warnings.filterwarnings('ignore')
 
 # Define the model class that will be used by the ECG server
 class ECGAnomalyDetector(BaseEstimator, ClassifierMixin):
-    def __init__(self, model_path=None, threshold=0.5):
+    def __init__(self, model_path=None, threshold=0.5, compiled=False, runtime=None, screen_path=None):
         """
         Initialize the ECG anomaly detector model
         
         Args:
             model_path: Path to the trained model file (.joblib)
             threshold: Classification threshold for anomaly detection
+            compiled: Compile tree ensembles to flat arrays (see compiled_trees.py)
+                for much faster scoring of small batches
+            runtime: 'sklearn', 'compiled', 'onnx' or 'mmap' (see runtime.py); 'onnx' scores
+                the .onnx export next to model_path with ONNX Runtime, 'mmap' a registry entry.
+                Overrides compiled when given.
+            screen_path: Cascade screen saved by train_model.py (cascade_screen.joblib);
+                when set, only windows the cheap screen cannot clear reach the model
         """
         self.model_path = model_path
         self.threshold = threshold
+        self.compiled = compiled
+        self.runtime = runtime
+        self.screen_path = screen_path
         self.model = None
         
-        if model_path and os.path.exists(model_path):
+        if model_path and os.path.exists(model_file_for(model_path, self._runtime())):
             self.load_model(model_path)
     
+    def _runtime(self):
+        if self.runtime is not None:
+            return self.runtime
+        return COMPILED_RUNTIME if self.compiled else SKLEARN_RUNTIME
+    
     def load_model(self, model_path):
         """Load a trained model from disk"""
         try:
-            self.model = joblib.load(model_path)
-            print(f"Successfully loaded model from {model_path}")
+            self.model = load_model_file(model_path, self._runtime())
+            if self.screen_path:
+                screen, screen_threshold = load_screen(self.screen_path)
+                self.model = CascadeModel(screen, self.model, screen_threshold, self.threshold)
+            print(f"Successfully loaded model from {model_file_for(model_path, self._runtime())}")
             return True
         except Exception as e:
             print(f"Error loading model: {e}")
             return False
     
+    def check_parity(self, X=None):
+        """
+        Check the loaded model reproduces the original joblib model at model_path
+        
+        Args:
+            X: Check inputs (default: random inputs shaped by the pipeline's scaler)
+        
+        Returns:
+            ParityReport with the largest probability difference
+        
+        Raises:
+            ParityError: If the probabilities differ on more than a few inputs
+        """
+        from src.models.onnx_export import check_parity, parity_inputs, scaler_statistics
+        
+        if self.model is None:
+            raise ValueError("Model not loaded. Call load_model() first.")
+        original = joblib.load(self.model_path)
+        if X is None:
+            X = parity_inputs(original.n_features_in_, *scaler_statistics(original))
+        return check_parity(original.predict_proba, self.model, X)
+    
     def predict(self, X):
         """
         Predict class labels for samples in X
@@ -42,18 +85,43 @@ class ECGAnomalyDetector(BaseEstimator, ClassifierMixin):
         Returns:
             Array of predicted class labels (0=normal, 1=anomaly)
         """
+        return self.predict_with_proba(X).labels
+    
+    def predict_with_proba(self, X):
+        """
+        Predict class labels and anomaly probabilities in a single model pass
+        
+        Args:
+            X: Features (can be a single sample or batch)
+        
+        Returns:
+            PredictionResult with labels, P(anomaly) and the applied threshold
+        """
         if self.model is None:
             raise ValueError("Model not loaded. Call load_model() first.")
-            
-        # Ensure X is 2D
-        if X.ndim == 1:
-            X = X.reshape(1, -1)
         
-        # Get probability predictions
-        probas = self.predict_proba(X)[:, 1]
+        return predict_with_proba(self.model, X, self.threshold)
+    
+    def score_signal(self, signal, window=None, hop=1, memory_budget=DEFAULT_MEMORY_BUDGET):
+        """
+        Score every window of a long signal, e.g. a recording, in one pass
         
-        # Apply threshold
-        return (probas >= self.threshold).astype(int)
+        Args:
+            signal: 1-D signal, or 2-D of shape (n_samples, n_leads) with each lead
+                scored separately; values are fed to the model as they are
+            window: Samples per window (defaults to the model's feature count)
+            hop: Samples between the starts of consecutive windows
+            memory_budget: Bytes of windows copied per model call
+        
+        Returns:
+            SignalScores with window offsets, labels and P(anomaly) per window
+        """
+        if self.model is None:
+            raise ValueError("Model not loaded. Call load_model() first.")
+        
+        if window is None:
+            window = self.model.n_features_in_
+        return score_signal(self.model, signal, window, hop, self.threshold, memory_budget)
     
     def predict_proba(self, X):
         """
@@ -116,6 +184,28 @@ def load_best_model(models_dir='models', model_name='randomforest_model.joblib')
     detector = ECGAnomalyDetector(model_path=model_path, threshold=threshold)
     return detector
 
+# Helper function to load a model from the registry
+def load_registered_model(registry_dir, name, version=None):
+    """
+    Load a model from the model registry, memory-mapped read-only
+    
+    Processes loading the same version share its memory (see registry.py).
+    
+    Args:
+        registry_dir: Registry root directory
+        name: Registered model name
+        version: Version number (default: latest)
+    
+    Returns:
+        ECGAnomalyDetector using the threshold stored with the model
+    """
+    from src.models.registry import ModelRegistry
+    
+    registry = ModelRegistry(registry_dir)
+    model_path = registry.path(name, version)
+    return ECGAnomalyDetector(model_path=model_path, threshold=registry.metadata(name, version)['threshold'],
+                              runtime=MMAP_RUNTIME)
+
 # Example usage
 if __name__ == "__main__":
     # Load the model
@@ -0,0 +1,215 @@
+"""
+Export trained models to ONNX for scoring with ONNX Runtime
+
+Pipelines saved by train_model.py are converted with skl2onnx and the
+MLPModel checkpoint saved by train_model_deep.py with torch.onnx. Every
+export takes a float32 ``input`` of shape (batch, n_features), returns a
+``probabilities`` output of shape (batch, 2) like predict_proba, and is only
+kept if ONNX Runtime reproduces the original model's probabilities.
+
+    python -m src.models.onnx_export --models-dir models
+"""
+import argparse
+import glob
+import io
+import os
+from dataclasses import dataclass
+
+import numpy as np
+
+from src.models.onnx_runtime import OnnxModel
+
+DEFAULT_OPSET = 17
+
+
+class ParityError(ValueError):
+    """Raised when an exported model does not reproduce the original model."""
+
+
+@dataclass
+class ParityReport:
+    """How closely an exported model matches the original on the check inputs"""
+    rows: int
+    max_abs_diff: float
+    mismatch_fraction: float  # Rows whose P(anomaly) differs by more than atol
+
+
+def check_parity(reference_proba, exported, X, atol=1e-4, max_mismatch=0.001):
+    """
+    Compare P(anomaly) of an exported model against the original
+
+    ONNX tree ensembles compare float32 features against float32 thresholds,
+    so a window lying exactly on a split can take the other branch; a small
+    fraction of rows (max_mismatch) may therefore differ by more than atol.
+
+    Args:
+        reference_proba: Callable returning the original model's predict_proba for X
+        exported: Model exposing predict_proba, e.g. an OnnxModel
+        X: Check inputs, shape (n_samples, n_features)
+
+    Returns:
+        ParityReport
+
+    Raises:
+        ParityError: If more than max_mismatch of the rows differ by more than atol
+    """
+    expected = np.asarray(reference_proba(X))[:, 1]
+    actual = np.asarray(exported.predict_proba(X))[:, 1]
+    diff = np.abs(expected.astype(np.float64) - actual.astype(np.float64))
+    report = ParityReport(len(X), float(diff.max()), float(np.mean(diff > atol)))
+    if report.mismatch_fraction > max_mismatch:
+        raise ParityError(
+            f"Exported model differs from the original on {report.mismatch_fraction:.2%} of "
+            f"{report.rows} rows (max |dP| = {report.max_abs_diff:.3g})"
+        )
+    return report
+
+
+def parity_inputs(n_features, mean=None, scale=None, rows=2000, seed=0):
+    """Random check inputs spread like the training data when scaler statistics are known"""
+    rng = np.random.default_rng(seed)
+    X = rng.standard_normal((rows, n_features))
+    if scale is not None:
+        X = X * scale
+    if mean is not None:
+        X = X + mean
+    return X.astype(np.float32)
+
+
+def scaler_statistics(model):
+    """mean_ and scale_ of a Pipeline's leading StandardScaler, if it has one"""
+    from sklearn.preprocessing import StandardScaler
+
+    first = model.steps[0][1] if hasattr(model, 'steps') else None
+    if isinstance(first, StandardScaler):
+        return first.mean_, first.scale_
+    return None, None
+
+
+def _write_checked(onnx_bytes, onnx_path, reference_proba, X):
+    """Write to a temporary file, check parity and only then replace onnx_path"""
+    tmp_path = f"{onnx_path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(onnx_bytes)
+    try:
+        report = check_parity(reference_proba, OnnxModel(tmp_path), X)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    os.replace(tmp_path, onnx_path)
+    return report
+
+
+def export_pipeline(model, onnx_path, X=None, opset=DEFAULT_OPSET):
+    """
+    Convert a fitted classifier or Pipeline to ONNX with skl2onnx
+
+    Args:
+        model: Fitted estimator, e.g. a model loaded from models/*.joblib
+        onnx_path: Output file
+        X: Parity check inputs (default: random inputs shaped by the scaler)
+
+    Returns:
+        ParityReport of the export
+    """
+    try:
+        from skl2onnx import to_onnx
+        from skl2onnx.common.data_types import FloatTensorType
+    except ImportError as e:
+        raise ImportError("Exporting pipelines requires skl2onnx (pip install skl2onnx)") from e
+
+    n_features = model.n_features_in_
+    onnx_model = to_onnx(
+        model,
+        initial_types=[('input', FloatTensorType([None, n_features]))],
+        # Plain (batch, 2) probabilities instead of a list of {class: probability} maps
+        options={'zipmap': False},
+        target_opset=opset
+    )
+    if X is None:
+        X = parity_inputs(n_features, *scaler_statistics(model))
+    return _write_checked(onnx_model.SerializeToString(), onnx_path, model.predict_proba, X)
+
+
+def export_mlp_checkpoint(checkpoint_path, onnx_path, scaler=None, X=None, opset=DEFAULT_OPSET):
+    """
+    Convert an MLPModel checkpoint to ONNX with torch.onnx
+
+    Args:
+        checkpoint_path: Checkpoint saved by train_model_deep.py (models/best_model.pth)
+        onnx_path: Output file
+        scaler: StandardScaler the MLP was trained behind; it is folded into the
+            first layer so the export takes raw features like the pipelines
+        X: Parity check inputs (default: random inputs shaped by the scaler)
+
+    Returns:
+        ParityReport of the export
+    """
+    try:
+        import torch
+        from src.models.mlp import MLPProbabilities, fold_scaler, load_checkpoint
+    except ImportError as e:
+        raise ImportError("Exporting the MLP requires torch (pip install torch)") from e
+
+    reference = load_checkpoint(checkpoint_path)
+    model = load_checkpoint(checkpoint_path)
+    n_features = model.fc1.in_features
+    mean, scale = (scaler.mean_, scaler.scale_) if scaler is not None else (None, None)
+    if scaler is not None:
+        fold_scaler(model, mean, scale)
+
+    def reference_proba(X):
+        if scaler is not None:
+            X = scaler.transform(X)
+        with torch.no_grad():
+            return MLPProbabilities(reference)(torch.as_tensor(X, dtype=torch.float32)).numpy()
+
+    buffer = io.BytesIO()
+    torch.onnx.export(
+        MLPProbabilities(model), torch.zeros(1, n_features), buffer,
+        input_names=['input'], output_names=['probabilities'],
+        dynamic_axes={'input': {0: 'batch'}, 'probabilities': {0: 'batch'}},
+        opset_version=opset
+    )
+    if X is None:
+        X = parity_inputs(n_features, mean, scale)
+    return _write_checked(buffer.getvalue(), onnx_path, reference_proba, X)
+
+
+def export_models(models_dir, scaler_path=None):
+    """
+    Export every pipeline in models_dir, and best_model.pth if present, next to the original
+
+    Parity is checked on models_dir/X_test.joblib when train_model.py saved it.
+
+    Returns:
+        Dict mapping each written .onnx path to its ParityReport
+    """
+    import joblib
+
+    X_test_path = os.path.join(models_dir, 'X_test.joblib')
+    X = np.asarray(joblib.load(X_test_path), dtype=np.float32) if os.path.exists(X_test_path) else None
+    reports = {}
+    for model_path in sorted(glob.glob(os.path.join(models_dir, '*_model.joblib'))):
+        onnx_path = os.path.splitext(model_path)[0] + '.onnx'
+        reports[onnx_path] = export_pipeline(joblib.load(model_path), onnx_path, X)
+    checkpoint_path = os.path.join(models_dir, 'best_model.pth')
+    if os.path.exists(checkpoint_path):
+        scaler = joblib.load(scaler_path) if scaler_path and os.path.exists(scaler_path) else None
+        onnx_path = os.path.join(models_dir, 'best_model.onnx')
+        reports[onnx_path] = export_mlp_checkpoint(checkpoint_path, onnx_path, scaler)
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export trained models to ONNX")
+    parser.add_argument('--models-dir', default='models')
+    parser.add_argument('--scaler', default='scaler.joblib',
+                        help="Scaler saved by train_model_deep.py, folded into the MLP export")
+    args = parser.parse_args()
+    for onnx_path, report in export_models(args.models_dir, args.scaler).items():
+        print(f"Exported {onnx_path}: max |dP| = {report.max_abs_diff:.2e} over {report.rows} rows")
+
+
+if __name__ == "__main__":
+    main()
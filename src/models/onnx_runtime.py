@@ -0,0 +1,85 @@
+"""
+Score ONNX exports of the detection models with ONNX Runtime
+
+The session is tuned for the server's workload: many small batches scored
+concurrently from several threads or processes. Each call therefore runs on
+a single thread without spinning, and parallelism comes from the inference
+backend rather than from inside ONNX Runtime.
+"""
+import numpy as np
+
+PROBABILITIES_OUTPUT = 'probabilities'
+
+
+def _import_onnxruntime():
+    try:
+        import onnxruntime
+    except ImportError as e:
+        raise ImportError("The onnx runtime requires onnxruntime (pip install onnxruntime)") from e
+    return onnxruntime
+
+
+def session_options(intra_op_threads=1, inter_op_threads=1):
+    """SessionOptions for low-latency CPU scoring of small batches"""
+    ort = _import_onnxruntime()
+    options = ort.SessionOptions()
+    options.intra_op_num_threads = intra_op_threads
+    options.inter_op_num_threads = inter_op_threads
+    options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    # Idle threads would otherwise busy-wait between the server's short calls
+    options.add_session_config_entry('session.intra_op.allow_spinning', '0')
+    options.add_session_config_entry('session.inter_op.allow_spinning', '0')
+    return options
+
+
+class OnnxModel:
+    """
+    ONNX Runtime session with a predict_proba compatible with sklearn classifiers
+
+    Args:
+        onnx_path: Model exported by src/models/onnx_export.py
+        intra_op_threads: Threads used within one operator
+        inter_op_threads: Threads used across independent operators
+    """
+
+    def __init__(self, onnx_path, intra_op_threads=1, inter_op_threads=1):
+        ort = _import_onnxruntime()
+        self.onnx_path = str(onnx_path)
+        self.threads = (intra_op_threads, inter_op_threads)
+        self.session = ort.InferenceSession(
+            self.onnx_path, session_options(intra_op_threads, inter_op_threads),
+            providers=['CPUExecutionProvider']
+        )
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        outputs = [output.name for output in self.session.get_outputs()]
+        self.output_name = PROBABILITIES_OUTPUT if PROBABILITIES_OUTPUT in outputs else outputs[-1]
+        n_features = model_input.shape[-1]
+        self.n_features_in_ = n_features if isinstance(n_features, int) else None
+        self.classes_ = np.array([0, 1])
+
+    def predict_proba(self, X):
+        """
+        Predict class probabilities
+
+        Args:
+            X: Features (can be a single sample or batch)
+
+        Returns:
+            Array of class probabilities [P(normal), P(anomaly)]
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        return self.session.run([self.output_name], {self.input_name: X})[0]
+
+    def predict(self, X):
+        return (self.predict_proba(X)[:, 1] >= 0.5).astype(int)
+
+    def __getstate__(self):
+        # Sessions cannot be pickled; rebuild from the file instead
+        return {'onnx_path': self.onnx_path, 'threads': self.threads}
+
+    def __setstate__(self, state):
+        self.__init__(state['onnx_path'], *state['threads'])
@@ -0,0 +1,109 @@
+"""
+Prediction helpers shared by the models and the ECG server
+
+Only numpy is imported here, so the server can score windows without
+importing scikit-learn until a model is actually loaded.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from typing import NamedTuple
+
+
+class PredictionResult(NamedTuple):
+    """Labels and anomaly probabilities produced by a single model pass"""
+    labels: np.ndarray
+    probabilities: np.ndarray
+    threshold: float
+
+
+def predict_with_proba(model, X, threshold=0.5):
+    """
+    Predict labels and anomaly probabilities with one call to the model
+    
+    Labels are derived from the probabilities instead of calling
+    model.predict, which would traverse every tree of an ensemble again.
+    
+    Args:
+        model: Fitted estimator exposing predict_proba
+        X: Features (can be a single sample or batch)
+        threshold: Probability at or above which a sample is an anomaly
+    
+    Returns:
+        PredictionResult with labels (0=normal, 1=anomaly), P(anomaly) and the threshold used
+    """
+    X = np.asarray(X)
+    if X.ndim == 1:
+        X = X.reshape(1, -1)
+    probabilities = model.predict_proba(X)[:, 1]
+    labels = (probabilities >= threshold).astype(int)
+    return PredictionResult(labels=labels, probabilities=probabilities, threshold=threshold)
+
+
+class SignalScores(NamedTuple):
+    """Scores of the sliding windows of a signal, one entry per window (and lead)"""
+    offsets: np.ndarray  # Index of the first sample of each window
+    labels: np.ndarray
+    probabilities: np.ndarray
+    threshold: float
+
+
+DEFAULT_MEMORY_BUDGET = 64 * 1024 * 1024  # Bytes of windows materialized per model call
+
+
+def sliding_windows(signal, window, hop=1):
+    """
+    Windows of a signal as a strided view, without copying any samples
+    
+    Args:
+        signal: 1-D signal, or 2-D of shape (n_samples, n_leads)
+        window: Samples per window
+        hop: Samples between the starts of consecutive windows
+    
+    Returns:
+        View of shape (n_windows, window), or (n_windows, n_leads, window) for multi-lead signals
+    """
+    signal = np.asarray(signal)
+    if signal.ndim not in (1, 2):
+        raise ValueError(f"Expected a 1-D or (n_samples, n_leads) signal, got shape {signal.shape}")
+    if window < 1 or hop < 1:
+        raise ValueError("window and hop must be positive")
+    if len(signal) < window:
+        return np.empty((0,) + signal.shape[1:] + (window,), dtype=signal.dtype)
+    return sliding_window_view(signal, window, axis=0)[::hop]
+
+
+def score_signal(model, signal, window, hop=1, threshold=0.5, memory_budget=DEFAULT_MEMORY_BUDGET):
+    """
+    Score every window of a long signal in one pass
+    
+    Windows are taken as strided views and only copied a chunk at a time,
+    each chunk holding at most memory_budget bytes of float64 windows, so
+    hours of signal can be scored with a handful of model calls. Each lead
+    of a multi-lead signal is scored separately.
+    
+    Args:
+        model: Fitted estimator exposing predict_proba over window-sized feature rows
+        signal: 1-D signal, or 2-D of shape (n_samples, n_leads), preprocessed like the training windows
+        window: Samples per window (the model's feature count)
+        hop: Samples between the starts of consecutive windows
+        threshold: Probability at or above which a window is an anomaly
+        memory_budget: Bytes of windows copied per model call
+    
+    Returns:
+        SignalScores with labels and probabilities of shape (n_windows,) or (n_windows, n_leads)
+    """
+    windows = sliding_windows(signal, window, hop)
+    leads = windows.shape[1:-1]
+    rows_per_window = int(np.prod(leads, dtype=int))
+    chunk = max(1, memory_budget // (window * rows_per_window * np.dtype(np.float64).itemsize))
+    probabilities = np.empty(len(windows) * rows_per_window)
+    for start in range(0, len(windows), chunk):
+        X = windows[start:start + chunk].reshape(-1, window)  # The only copy of these samples
+        probabilities[start * rows_per_window:start * rows_per_window + len(X)] = model.predict_proba(X)[:, 1]
+    probabilities = probabilities.reshape((len(windows),) + leads)
+    return SignalScores(
+        offsets=np.arange(len(windows)) * hop,
+        labels=(probabilities >= threshold).astype(int),
+        probabilities=probabilities,
+        threshold=threshold
+    )
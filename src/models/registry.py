@@ -0,0 +1,230 @@
+"""
+Versioned model registry whose models are memory-mapped read-only
+
+joblib.load gives every process its own copy of a forest's node arrays.
+The registry instead stores each model compiled to flat arrays
+(compiled_trees.py), one .npy file per array, and loads them with
+np.load(mmap_mode='r'). Every process that loads the same version maps the
+same page-cache pages, so an extra inference worker costs almost no memory.
+
+Layout::
+
+    <root>/<name>/<version>/metadata.json
+    <root>/<name>/<version>/<array>.npy   (feature, threshold, left, right, value, roots)
+
+Versions are integers starting at 1. A version directory is written under a
+temporary name and renamed into place, so readers never see half a model.
+
+    python -m src.models.registry register models/registry randomforest models/randomforest_combined_model.joblib
+    python -m src.models.registry list models/registry
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from src.models.compiled_trees import CompiledTreeEnsemble, compile_model
+
+METADATA_FILE = 'metadata.json'
+ARRAY_NAMES = ('feature', 'threshold', 'left', 'right', 'value', 'roots')
+_ARRAY_DTYPES = {'feature': np.intp, 'left': np.intp, 'right': np.intp, 'roots': np.intp,
+                 'threshold': np.float64, 'value': np.float64}
+
+
+def _checksum(directory):
+    """SHA-256 over the array files, in a fixed order"""
+    digest = hashlib.sha256()
+    for name in ARRAY_NAMES:
+        with open(os.path.join(directory, f'{name}.npy'), 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def is_model_entry(path):
+    """Whether path is a registry version directory"""
+    return os.path.isfile(os.path.join(path, METADATA_FILE))
+
+
+def load_entry(path, verify=False):
+    """
+    Memory-map a registry version directory
+
+    Args:
+        path: <root>/<name>/<version>, or <root>/<name> for its latest version
+        verify: Re-compute the checksum first (reads every page once)
+
+    Returns:
+        (CompiledTreeEnsemble over read-only memory maps, metadata dict)
+    """
+    path = os.fspath(path)
+    if not is_model_entry(path):
+        versions = _versions_in(path)
+        if not versions:
+            raise FileNotFoundError(f"No registered model at {path}")
+        path = os.path.join(path, str(versions[-1]))
+    with open(os.path.join(path, METADATA_FILE)) as f:
+        metadata = json.load(f)
+    if verify and _checksum(path) != metadata['checksum']:
+        raise ValueError(f"Checksum mismatch for {path}")
+    arrays = {name: np.load(os.path.join(path, f'{name}.npy'), mmap_mode='r') for name in ARRAY_NAMES}
+    model = CompiledTreeEnsemble(
+        **arrays, depth=metadata['depth'], kind=metadata['kind'], n_features=metadata['n_features'],
+        init_score=metadata['init_score'], learning_rate=metadata['learning_rate']
+    )
+    return model, metadata
+
+
+def _versions_in(directory):
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    return sorted(int(name) for name in names
+                  if name.isdigit() and is_model_entry(os.path.join(directory, name)))
+
+
+class ModelRegistry:
+    """
+    Models stored by name and version under a root directory
+
+    Args:
+        root: Registry directory (created on first registration)
+    """
+
+    def __init__(self, root):
+        self.root = os.fspath(root)
+
+    def path(self, name, version=None):
+        """Directory of a model version (the latest when version is None)"""
+        if version is None:
+            version = self.latest_version(name)
+        return os.path.join(self.root, name, str(version))
+
+    def names(self):
+        try:
+            return sorted(name for name in os.listdir(self.root) if self.versions(name))
+        except FileNotFoundError:
+            return []
+
+    def versions(self, name):
+        return _versions_in(os.path.join(self.root, name))
+
+    def latest_version(self, name):
+        versions = self.versions(name)
+        if not versions:
+            raise KeyError(f"No registered model named {name!r}")
+        return versions[-1]
+
+    def metadata(self, name, version=None):
+        """Metadata of a model version: threshold, n_features, checksum, ..."""
+        with open(os.path.join(self.path(name, version), METADATA_FILE)) as f:
+            return json.load(f)
+
+    def register(self, name, model, threshold=0.5, version=None, source=None):
+        """
+        Store a model as a new version
+
+        Args:
+            name: Model name, e.g. 'randomforest'
+            model: Fitted tree-ensemble classifier or Pipeline, or a CompiledTreeEnsemble
+            threshold: Classification threshold stored with the model
+            version: Version number (default: one after the latest)
+            source: Where the model came from, e.g. the joblib file
+
+        Returns:
+            Metadata of the registered version
+        """
+        if os.sep in name or name.startswith('.'):
+            raise ValueError(f"Invalid model name: {name!r}")
+        if not isinstance(model, CompiledTreeEnsemble):
+            model = compile_model(model)
+        versions = self.versions(name)
+        if version is None:
+            version = versions[-1] + 1 if versions else 1
+        elif version in versions:
+            raise ValueError(f"{name} version {version} is already registered")
+
+        model_dir = os.path.join(self.root, name)
+        os.makedirs(model_dir, exist_ok=True)
+        staging = tempfile.mkdtemp(prefix=f'.{version}-', dir=model_dir)
+        try:
+            os.chmod(staging, 0o755)  # mkdtemp creates it private
+            arrays = model.arrays()
+            for array_name in ARRAY_NAMES:
+                array = np.ascontiguousarray(arrays[array_name], dtype=_ARRAY_DTYPES[array_name])
+                np.save(os.path.join(staging, f'{array_name}.npy'), array)
+            metadata = {
+                'name': name,
+                'version': int(version),
+                'threshold': float(threshold),
+                'n_features': model.n_features_in_,
+                'n_trees': model.n_trees,
+                'n_nodes': len(model.feature),
+                'kind': model.kind,
+                'depth': model.depth,
+                'init_score': model.init_score,
+                'learning_rate': model.learning_rate,
+                'checksum': _checksum(staging),
+                'source': os.fspath(source) if source is not None else None,
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            }
+            with open(os.path.join(staging, METADATA_FILE), 'w') as f:
+                json.dump(metadata, f, indent=2)
+            os.rename(staging, os.path.join(model_dir, str(version)))
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+        return metadata
+
+    def load(self, name, version=None, verify=False):
+        """
+        Memory-map a model version read-only
+
+        Returns:
+            (CompiledTreeEnsemble, metadata dict)
+        """
+        return load_entry(self.path(name, version), verify)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the memory-mapped model registry")
+    commands = parser.add_subparsers(dest='command', required=True)
+    register = commands.add_parser('register', help="Compile a joblib model and store it as a new version")
+    register.add_argument('root')
+    register.add_argument('name')
+    register.add_argument('model', help="joblib file saved by train_model.py")
+    register.add_argument('--threshold', type=float, default=None,
+                          help="Classification threshold (default: optimal_threshold.txt next to the model, else 0.5)")
+    listing = commands.add_parser('list', help="Show registered models and versions")
+    listing.add_argument('root')
+    args = parser.parse_args()
+
+    registry = ModelRegistry(args.root)
+    if args.command == 'register':
+        import joblib
+
+        threshold = args.threshold
+        threshold_path = os.path.join(os.path.dirname(args.model), 'optimal_threshold.txt')
+        if threshold is None and os.path.exists(threshold_path):
+            with open(threshold_path) as f:
+                threshold = float(f.read().strip())
+        metadata = registry.register(args.name, joblib.load(args.model),
+                                     threshold if threshold is not None else 0.5, source=args.model)
+        print(f"Registered {metadata['name']} version {metadata['version']} ({metadata['checksum'][:12]})")
+    else:
+        for name in registry.names():
+            for version in registry.versions(name):
+                metadata = registry.metadata(name, version)
+                print(f"{name} v{version}: {metadata['kind']}, {metadata['n_trees']} trees, "
+                      f"{metadata['n_features']} features, threshold {metadata['threshold']}, "
+                      f"{metadata['checksum'][:12]}")
+
+
+if __name__ == "__main__":
+    main()
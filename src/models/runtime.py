@@ -0,0 +1,56 @@
+"""
+Model runtimes: how a trained model file is loaded for scoring
+
+    sklearn   the joblib file as saved by train_model.py
+    compiled  the same file compiled to flat arrays (compiled_trees.py)
+    onnx      the ONNX export next to it (onnx_export.py), run by ONNX Runtime
+    mmap      a registry entry (registry.py): compiled arrays memory-mapped
+              read-only and shared between processes; the model path is
+              <root>/<name>/<version>, or <root>/<name> for the latest version
+
+Like prediction.py this module only imports numpy; each runtime's
+libraries are imported when a model is loaded with it.
+"""
+import os
+
+SKLEARN_RUNTIME = 'sklearn'
+COMPILED_RUNTIME = 'compiled'
+ONNX_RUNTIME = 'onnx'
+MMAP_RUNTIME = 'mmap'
+MODEL_RUNTIMES = (SKLEARN_RUNTIME, COMPILED_RUNTIME, ONNX_RUNTIME, MMAP_RUNTIME)
+
+
+def model_file_for(model_path, runtime=SKLEARN_RUNTIME):
+    """
+    File a runtime actually loads for a model path
+
+    The onnx runtime reads models/<name>.onnx when given models/<name>.joblib,
+    so the same --model argument works for every runtime.
+    """
+    model_path = os.fspath(model_path)
+    if runtime == ONNX_RUNTIME and not model_path.endswith('.onnx'):
+        return os.path.splitext(model_path)[0] + '.onnx'
+    return model_path
+
+
+def load_model_file(model_path, runtime=SKLEARN_RUNTIME):
+    """
+    Load a model file for the given runtime
+
+    Returns:
+        Model exposing predict_proba and n_features_in_
+    """
+    if runtime not in MODEL_RUNTIMES:
+        raise ValueError(f"Unknown model runtime: {runtime}")
+    if runtime == ONNX_RUNTIME:
+        from src.models.onnx_runtime import OnnxModel
+        return OnnxModel(model_file_for(model_path, runtime))
+    if runtime == MMAP_RUNTIME:
+        from src.models.registry import load_entry
+        return load_entry(model_path)[0]
+    import joblib  # Deferred with the model's own libraries (sklearn) until a model is loaded
+    model = joblib.load(model_path)
+    if runtime == COMPILED_RUNTIME:
+        from src.models.compiled_trees import compile_model
+        model = compile_model(model)
+    return model
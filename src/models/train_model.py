@@ -26,6 +26,9 @@ PROCESSED_DIR = os.path.join(DATA_DIR, 'processed')  # Directory for balanced da
 MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(BASE_DIR)), 'models')
 FIGURES_DIR = os.path.join(os.path.dirname(os.path.dirname(BASE_DIR)), 'figures')
 
+# Fraction of held-out anomalies the cascade screen must pass on to the full model
+CASCADE_TARGET_RECALL = 0.99
+
 # Create directories if they don't exist
 for directory in [MODELS_DIR, FIGURES_DIR]:
     os.makedirs(directory, exist_ok=True)
@@ -179,6 +182,7 @@ def train_and_evaluate(balancing_method='combined'):
         model_path = os.path.join(MODELS_DIR, f"{name.lower().replace(' ', '_')}_{balancing_method}_model.joblib")
         joblib.dump(model_info['model'], model_path)
         print(f"Saved {name} model to {model_path}")
+        export_onnx(model_info['model'], model_path, X_test)
     
     # Create and save visualizations
     plot_model_performance(models, y_test, balancing_method)
@@ -187,8 +191,27 @@ def train_and_evaluate(balancing_method='combined'):
     best_model = max(models.items(), key=lambda x: x[1]['pr_auc'])[0]
     print(f"\nBest performing model: {best_model}")
     
+    try:
+        calibrate_cascade(models[best_model]['model'], X_train, y_train, X_test, y_test)
+    except ImportError as e:
+        print(f"Skipping cascade calibration (run as python -m src.models.train_model): {e}")
+    
     return models[best_model]['model']
 
+def export_onnx(model, model_path, X_test):
+    """Save an ONNX version of a model next to it, for the server's onnx runtime"""
+    onnx_path = os.path.splitext(model_path)[0] + '.onnx'
+    try:
+        from src.models.onnx_export import export_pipeline
+        report = export_pipeline(model, onnx_path, np.asarray(X_test, dtype=np.float32))
+        print(f"Exported ONNX model to {onnx_path} (max probability difference {report.max_abs_diff:.2e})")
+    except ImportError as e:
+        print(f"Skipping ONNX export: {e}")
+    except Exception as e:
+        print(f"ONNX export failed, skipping {onnx_path}: {e}")
+        if os.path.exists(onnx_path):
+            os.remove(onnx_path)  # Stale export of an earlier model
+
 def plot_model_performance(models, y_test, balancing_method):
     """Generate and save performance visualization plots."""
     plt.figure(figsize=(15, 12))
@@ -253,6 +276,38 @@ def find_optimal_threshold(model, X_test, y_test):
     print(f"Optimal threshold: {optimal_threshold:.3f}")
     return optimal_threshold
 
+def calibrate_cascade(model, X_train, y_train, X_test, y_test, target_recall=CASCADE_TARGET_RECALL):
+    """
+    Train the cheap stage-1 screen for cascade inference and calibrate its threshold.
+    
+    The screen is fitted on part of the training data and its threshold set to the
+    highest that still escalates target_recall of the anomalies in the rest; the
+    test set is only used to evaluate the cascade. The screen is saved to
+    models/cascade_screen.joblib.
+    
+    Returns:
+    --------
+    report : dict
+        Escalation rate, recalls and average cost per window (see cascade.evaluate_cascade).
+    """
+    from src.models.cascade import DEFAULT_SCREEN_FILE, evaluate_cascade, fit_calibrated_screen, save_screen
+    
+    screen, screen_threshold = fit_calibrated_screen(X_train, y_train, target_recall)
+    report = evaluate_cascade(screen, model, screen_threshold, X_test, y_test)
+    
+    print(f"\nCascade screen threshold for {target_recall:.1%} recall: {screen_threshold:.4f}")
+    print(f"Test anomalies escalated by the screen: {report['screen_recall']:.1%}")
+    print(f"Windows escalated to the full model: {report['escalation_rate']:.1%}")
+    print(f"Recall: full model {report['full_recall']:.4f}, cascade {report['cascade_recall']:.4f}")
+    print(f"Average cost per window: full model {report['full_seconds_per_window'] * 1e6:.1f} us, "
+          f"cascade {report['cascade_seconds_per_window'] * 1e6:.1f} us "
+          f"({report['cost_saving']:.1%} saving)")
+    
+    screen_path = os.path.join(MODELS_DIR, DEFAULT_SCREEN_FILE)
+    save_screen(screen_path, screen, screen_threshold, target_recall)
+    print(f"Saved cascade screen to {screen_path}")
+    return report
+
 def evaluate_model(model, X_test, y_test, name):
     """Perform detailed evaluation of a model."""
     y_pred = model.predict(X_test)
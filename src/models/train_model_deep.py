@@ -11,6 +11,11 @@ from imblearn.over_sampling import SMOTE
 from joblib import dump
 from collections import Counter
 import os
+try:
+    from src.models.mlp import MLPModel
+except ImportError:
+    # Run as a script (python src/models/train_model_deep.py), this directory is on sys.path instead
+    from mlp import MLPModel
 
 # Device Configuration
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
@@ -53,23 +58,7 @@ y_test_tensor = torch.FloatTensor(y_test).to(device)
 train_dataset = TensorDataset(X_train_tensor, y_train_tensor)
 train_loader = DataLoader(dataset=train_dataset, batch_size=64, shuffle=True)
 
-# Define Model Architecture
-class MLPModel(nn.Module):
-    def __init__(self, input_dim):
-        super(MLPModel, self).__init__()
-        self.fc1 = nn.Linear(input_dim, 64)
-        self.relu = nn.ReLU()
-        self.fc2 = nn.Linear(64, 32)
-        self.fc3 = nn.Linear(32, 1)
-        self.sigmoid = nn.Sigmoid()
-
-    def forward(self, x):
-        x = self.relu(self.fc1(x))
-        x = self.relu(self.fc2(x))
-        x = self.sigmoid(self.fc3(x))
-        return x
-
-# Initialize Model
+# Initialize Model (architecture in src/models/mlp.py)
 model = MLPModel(input_dim=X_train.shape[1]).to(device)
 
 # Handle class imbalance
@@ -148,4 +137,17 @@ for epoch in range(num_epochs):
 
 print("\nTraining Summary:")
 print(f"Best validation F1: {best_f1:.4f}")
-print("Model saved at: models/")
\ No newline at end of file
+print("Model saved at: models/")
+
+# Export the best checkpoint for the server's onnx runtime, with the scaler folded in
+try:
+    from src.models.onnx_export import export_mlp_checkpoint
+    report = export_mlp_checkpoint("models/best_model.pth", "models/best_model.onnx", scaler)
+    print(f"Exported ONNX model to models/best_model.onnx (max probability difference {report.max_abs_diff:.2e})")
+except ImportError as e:
+    print(f"Skipping ONNX export (run as python -m src.models.train_model_deep): {e}")
+except Exception as e:
+    # The checkpoint is still usable; only the ONNX artifact is skipped
+    print(f"ONNX export failed, skipping models/best_model.onnx: {e}")
+    if os.path.exists("models/best_model.onnx"):
+        os.remove("models/best_model.onnx")  # Stale export of an earlier checkpoint
\ No newline at end of file
@@ -0,0 +1,147 @@
+"""
+Cross-device dynamic batching in front of an inference backend.
+
+Each device session scores only the few windows that became due in its own
+frame, so with many devices the model sees a stream of tiny calls whose
+fixed per-call overhead dominates. ``BatchingInferenceService`` collects the
+windows of all sessions and scores them with one backend call once either
+``max_batch_size`` windows are waiting or the oldest has waited
+``max_wait`` seconds, then hands every caller its own rows of the result.
+
+At most ``max_in_flight`` batches run at once (one per inference worker by
+default). While they are all busy, due windows keep collecting into the next
+batch instead of queueing as separate calls, so batches grow with load.
+The deadline is a timer on the event loop, so a busy loop adds its
+scheduling delay (``ecg_event_loop_lag_seconds``) on top of ``max_wait``.
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Callable, List, Optional, Set
+
+import numpy as np
+
+from src.models.prediction import PredictionResult
+
+
+@dataclass
+class _Request:
+    X: np.ndarray
+    threshold: float
+    future: asyncio.Future
+    submitted: float  # time.monotonic() at submission
+
+
+class BatchingInferenceService:
+    """
+    Merge predict calls from many sessions into batched backend calls.
+
+    Args:
+        backend: Inference backend (see src/server/inference.py)
+        max_batch_size: Windows at which a batch is dispatched without waiting
+        max_wait: Seconds the oldest waiting window may wait for others to join it
+        max_in_flight: Batches scored concurrently (defaults to the backend's workers)
+    """
+
+    def __init__(self, backend, max_batch_size: int = 64, max_wait: float = 0.005,
+                 max_in_flight: Optional[int] = None):
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.max_in_flight = max_in_flight or getattr(backend, 'workers', 1)
+        # Called with the windows in each dispatched batch
+        self.batch_size_observer: Optional[Callable[[int], None]] = None
+        # Called with the seconds each request waited before its batch was dispatched
+        self.batch_wait_observer: Optional[Callable[[float], None]] = None
+        self.batches = 0
+        self.windows = 0
+        self._pending: List[_Request] = []
+        self._pending_rows = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._in_flight: Set[asyncio.Task] = set()
+
+    @property
+    def pending_windows(self) -> int:
+        return self._pending_rows
+
+    async def predict(self, X: np.ndarray, threshold: float) -> PredictionResult:
+        """Score windows as part of the next batch; same contract as the backend's predict."""
+        if self._pending and self._pending[0].threshold != threshold:
+            self._dispatch()  # A batch is scored with a single threshold
+        request = _Request(X, threshold, asyncio.get_running_loop().create_future(), time.monotonic())
+        self._pending.append(request)
+        self._pending_rows += len(X)
+        self._maybe_dispatch()
+        return await request.future
+
+    def _maybe_dispatch(self):
+        if not self._pending:
+            return
+        waited = time.monotonic() - self._pending[0].submitted
+        if self._pending_rows >= self.max_batch_size:
+            self._dispatch()
+        elif waited >= self.max_wait:
+            # Past the deadline: go as soon as a batch slot is free (_batch_done retries)
+            if len(self._in_flight) < self.max_in_flight:
+                self._dispatch()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait - waited, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        self._maybe_dispatch()
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        requests, self._pending, self._pending_rows = self._pending, [], 0
+        if not requests:
+            return
+        task = asyncio.create_task(self._run_batch(requests))
+        self._in_flight.add(task)
+        task.add_done_callback(self._batch_done)
+
+    def _batch_done(self, task: asyncio.Task):
+        self._in_flight.discard(task)
+        self._maybe_dispatch()
+
+    async def _run_batch(self, requests: List[_Request]):
+        dispatched = time.monotonic()
+        X = requests[0].X if len(requests) == 1 else np.concatenate([request.X for request in requests])
+        self.batches += 1
+        self.windows += len(X)
+        if self.batch_size_observer is not None:
+            self.batch_size_observer(len(X))
+        if self.batch_wait_observer is not None:
+            for request in requests:
+                self.batch_wait_observer(dispatched - request.submitted)
+        try:
+            result = await self.backend.predict(X, requests[0].threshold)
+        except asyncio.CancelledError:
+            # Callers must not wait forever on a batch that will never finish
+            for request in requests:
+                request.future.cancel()
+            raise
+        except Exception as e:
+            for request in requests:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+        offset = 0
+        for request in requests:
+            rows = slice(offset, offset + len(request.X))
+            offset += len(request.X)
+            if not request.future.done():  # The caller may have been cancelled meanwhile
+                request.future.set_result(PredictionResult(
+                    labels=result.labels[rows], probabilities=result.probabilities[rows],
+                    threshold=result.threshold
+                ))
+
+    async def close(self):
+        """Score anything still waiting and wait for running batches."""
+        self._dispatch()
+        if self._in_flight:
+            await asyncio.gather(*list(self._in_flight), return_exceptions=True)
@@ -0,0 +1,432 @@
+"""
+Run several ECGServer shards behind one listening port.
+
+    python -m src.server.cluster --model models/gradientboosting_combined_model.joblib --shards 4
+
+The front process accepts every websocket connection, reads the HTTP upgrade
+request and proxies the raw TCP stream to one shard process:
+
+* ESP connections are pinned to ``crc32(device_id) % shards`` using the
+  ``?device_id=`` query parameter, so a device always reconnects to the same
+  shard. Devices that only announce themselves in a hello message are pinned
+  to shard 0.
+* Frontend connections go to the shard with the fewest open connections.
+
+Shards publish processed samples and device status messages to a broker in
+the front process over loopback TCP; the broker forwards each one to the
+shards whose dashboards follow that device, so any shard can serve any
+dashboard. Each device's history-rate points (see history.py) go to every
+shard, so a dashboard gets a device's recent trace on connect whichever
+shard it lands on.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import struct
+import time
+import zlib
+from typing import Dict, Iterable, List, Optional, Set
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from src.models.runtime import MODEL_RUNTIMES
+from src.server.protocol import decode_frontend_frame, encode_frontend_frame
+
+logger = logging.getLogger(__name__)
+
+# Bus frame: payload length (topic + body), kind, topic length; then topic (utf-8) and body
+BUS_HEADER = struct.Struct('<IBB')
+BUS_SAMPLES = 1    # topic: device id; body: frontend sample frame (see protocol.py)
+BUS_MESSAGE = 2    # topic: device id or empty for all; body: JSON frontend message
+BUS_TIMEOUTS = 3   # body: JSON list of timed-out device ids
+BUS_DEVICES = 4    # topic: shard id; body: JSON list of devices connected to that shard
+BUS_INTEREST = 5   # topic: shard id; body: JSON list of followed devices, or null for all
+BUS_HISTORY = 6    # topic: device id; body: frontend frame of history-rate points, sent to every shard
+
+DEFAULT_MAX_BUS_BUFFER = 4 * 1024 * 1024  # Bytes queued on a bus link before sample frames are dropped
+
+
+def encode_bus_frame(kind: int, topic: str, body: bytes) -> bytes:
+    topic_bytes = topic.encode('utf-8')[:255]
+    return BUS_HEADER.pack(len(topic_bytes) + len(body), kind, len(topic_bytes)) + topic_bytes + body
+
+
+async def read_bus_frame(reader: asyncio.StreamReader):
+    """Read one bus frame; returns (kind, topic, body)."""
+    length, kind, topic_length = BUS_HEADER.unpack(await reader.readexactly(BUS_HEADER.size))
+    data = await reader.readexactly(length)
+    return kind, data[:topic_length].decode('utf-8'), data[topic_length:]
+
+
+def shard_for_device(device_id: str, shards: int) -> int:
+    """Stable shard assignment for a device id (the same in every process)."""
+    return zlib.crc32(device_id.encode('utf-8')) % shards
+
+
+class _BrokerLink:
+    """Broker-side state for one connected shard."""
+
+    def __init__(self, writer: asyncio.StreamWriter):
+        self.writer = writer
+        self.task = asyncio.current_task()
+        self.shard_id: Optional[str] = None
+        self.devices: List[str] = []
+        self.interest: Optional[Set[str]] = set()  # None follows every device
+        self.dropped = 0
+
+    def follows(self, device_id: str) -> bool:
+        return not device_id or self.interest is None or device_id in self.interest
+
+    def send(self, frame: bytes, droppable: bool, max_buffer: int):
+        if droppable and self.writer.transport.get_write_buffer_size() > max_buffer:
+            self.dropped += 1
+            return
+        self.writer.write(frame)
+
+
+class MessageBroker:
+    """Forward what each shard publishes to the other shards that need it."""
+
+    def __init__(self, max_buffer: int = DEFAULT_MAX_BUS_BUFFER):
+        self.max_buffer = max_buffer
+        self.links: List[_BrokerLink] = []
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        link = _BrokerLink(writer)
+        # Tell the new shard which devices the others already hold
+        for other in self.links:
+            if other.shard_id is not None:
+                writer.write(encode_bus_frame(BUS_DEVICES, other.shard_id, json.dumps(other.devices).encode()))
+        self.links.append(link)
+        try:
+            while True:
+                kind, topic, body = await read_bus_frame(reader)
+                if kind == BUS_INTEREST:
+                    interest = json.loads(body)
+                    link.interest = None if interest is None else set(interest)
+                    continue
+                if kind == BUS_DEVICES:
+                    link.shard_id = topic
+                    link.devices = json.loads(body)
+                frame = encode_bus_frame(kind, topic, body)
+                routed = kind in (BUS_SAMPLES, BUS_MESSAGE)
+                for other in self.links:
+                    if other is not link and (not routed or other.follows(topic)):
+                        other.send(frame, kind in (BUS_SAMPLES, BUS_HISTORY), self.max_buffer)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.links.remove(link)
+            if link.shard_id is not None:
+                logger.warning(f"Shard {link.shard_id} left the bus ({link.dropped} sample frames dropped)")
+                frame = encode_bus_frame(BUS_DEVICES, link.shard_id, b'[]')
+                for other in self.links:
+                    other.send(frame, False, self.max_buffer)
+            writer.close()
+
+    async def close(self):
+        """Disconnect every shard and wait for the link handlers to finish."""
+        tasks = [link.task for link in self.links]
+        for link in self.links:
+            link.writer.transport.abort()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class ClusterBus:
+    """
+    A shard's connection to the broker.
+
+    Publishing only writes to the socket buffer, so it is safe on the
+    ingestion path; sample frames are dropped rather than buffered without
+    bound if the broker falls behind.
+    """
+
+    def __init__(self, server, shard_id: int, host: str, port: int,
+                 max_buffer: int = DEFAULT_MAX_BUS_BUFFER):
+        self.server = server
+        self.shard_id = str(shard_id)
+        self.host = host
+        self.port = port
+        self.max_buffer = max_buffer
+        self.dropped = 0
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._reader_task: Optional[asyncio.Task] = None
+        self._interest: Optional[Set[str]] = set()
+        self._shard_devices: Dict[str, Set[str]] = {}
+
+    async def start(self, timeout: float = 30.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                reader, self._writer = await asyncio.open_connection(self.host, self.port)
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise
+                await asyncio.sleep(0.2)
+        self._send(BUS_INTEREST, self.shard_id, json.dumps(None if self._interest is None
+                                                           else sorted(self._interest)).encode())
+        self.publish_devices(list(self.server.sessions))
+        self._reader_task = asyncio.create_task(self._read_loop(reader))
+
+    def _send(self, kind: int, topic: str, body: bytes, droppable: bool = False):
+        if self._writer is None or self._writer.is_closing():
+            return
+        if droppable and self._writer.transport.get_write_buffer_size() > self.max_buffer:
+            self.dropped += 1
+            return
+        self._writer.write(encode_bus_frame(kind, topic, body))
+
+    def publish_samples(self, device_id: str, samples: np.ndarray, flags: np.ndarray):
+        period = 1.0 / self.server.SAMPLING_RATE
+        frame = encode_frontend_frame(device_id, time.time() - period * (len(samples) - 1), period, samples, flags)
+        self._send(BUS_SAMPLES, device_id, frame, droppable=True)
+
+    def publish_history(self, device_id: str, values: np.ndarray, anomalies: np.ndarray, rate: float):
+        period = 1.0 / rate
+        frame = encode_frontend_frame(device_id, time.time() - period * (len(values) - 1), period, values, anomalies)
+        self._send(BUS_HISTORY, device_id, frame, droppable=True)
+
+    def publish_message(self, data: dict, device_id: Optional[str] = None):
+        self._send(BUS_MESSAGE, device_id or '', json.dumps(data).encode())
+
+    def publish_timeouts(self, device_ids: List[str]):
+        self._send(BUS_TIMEOUTS, '', json.dumps(list(device_ids)).encode())
+
+    def publish_devices(self, device_ids: List[str]):
+        self._send(BUS_DEVICES, self.shard_id, json.dumps(sorted(device_ids)).encode())
+
+    def update_interest(self, clients: Iterable):
+        """Tell the broker which devices this shard's frontend clients follow."""
+        interest: Optional[Set[str]] = set()
+        for client in clients:
+            if client.devices is None:
+                interest = None
+                break
+            interest |= client.devices
+        if interest != self._interest:
+            self._interest = interest
+            self._send(BUS_INTEREST, self.shard_id,
+                       json.dumps(None if interest is None else sorted(interest)).encode())
+
+    async def _read_loop(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                kind, topic, body = await read_bus_frame(reader)
+                if kind == BUS_SAMPLES:
+                    frame = decode_frontend_frame(body)
+                    self.server.deliver_remote_samples(frame.device_id, frame.values, frame.anomalies)
+                elif kind == BUS_HISTORY:
+                    frame = decode_frontend_frame(body)
+                    self.server.deliver_remote_history(frame.device_id, frame.values, frame.anomalies)
+                elif kind == BUS_MESSAGE:
+                    self.server.broadcast_to_frontend(json.loads(body), topic or None, publish=False)
+                elif kind == BUS_TIMEOUTS:
+                    self.server.report_timeouts(json.loads(body), publish=False)
+                elif kind == BUS_DEVICES:
+                    self._shard_devices[topic] = set(json.loads(body))
+                    self.server.set_remote_devices(set().union(*self._shard_devices.values()))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            logger.error("Lost connection to the cluster bus")
+        except Exception as e:
+            logger.error(f"Cluster bus error: {e}")
+
+    async def close(self):
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+            await asyncio.gather(self._reader_task, return_exceptions=True)
+        if self._writer is not None:
+            self._writer.close()
+
+
+class ShardRouter:
+    """Proxy each incoming websocket connection to the shard that should serve it."""
+
+    def __init__(self, shard_ports: List[int], shard_host: str = '127.0.0.1'):
+        self.shard_ports = shard_ports
+        self.shard_host = shard_host
+        self.connections = [0] * len(shard_ports)
+        self._open: Dict[asyncio.Task, List[asyncio.StreamWriter]] = {}
+
+    def choose_shard(self, path: str, protocols: List[str]) -> int:
+        if 'esp' in protocols:
+            device_ids = parse_qs(urlsplit(path).query).get('device_id')
+            return shard_for_device(device_ids[0], len(self.shard_ports)) if device_ids else 0
+        return min(range(len(self.shard_ports)), key=self.connections.__getitem__)
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            return
+        lines = head.decode('latin-1').split('\r\n')
+        request = lines[0].split()
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        protocols = [protocol.strip() for protocol in headers.get('sec-websocket-protocol', '').split(',')]
+        shard = self.choose_shard(request[1] if len(request) > 1 else '/', protocols)
+
+        try:
+            upstream_reader, upstream_writer = await asyncio.open_connection(
+                self.shard_host, self.shard_ports[shard]
+            )
+        except OSError as e:
+            logger.error(f"Shard {shard} unavailable: {e}")
+            writer.write(b'HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+            writer.close()
+            return
+
+        self.connections[shard] += 1
+        task = asyncio.current_task()
+        self._open[task] = [writer, upstream_writer]
+        try:
+            upstream_writer.write(head)
+            await asyncio.gather(
+                self._pipe(reader, upstream_writer),
+                self._pipe(upstream_reader, writer)
+            )
+        finally:
+            self.connections[shard] -= 1
+            del self._open[task]
+
+    async def close(self):
+        """Drop every proxied connection and wait for the handlers to finish."""
+        tasks = list(self._open)
+        for writers in self._open.values():
+            for writer in writers:
+                writer.transport.abort()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    @staticmethod
+    async def _pipe(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                data = await reader.read(65536)
+                if not data:
+                    break
+                writer.write(data)
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def _serve_shard(shard_id: int, model_path: str, port: int, broker_port: int, server_options: dict):
+    from src.server.ecg_server import ECGServer
+
+    server = ECGServer(model_path, **server_options)
+    server.bus = ClusterBus(server, shard_id, '127.0.0.1', broker_port)
+    await server.bus.start()
+    try:
+        await server.start_server('127.0.0.1', port)
+    finally:
+        await server.bus.close()
+
+
+def run_shard(shard_id: int, model_path: str, port: int, broker_port: int, server_options: dict):
+    """Process entry point for one shard."""
+    from src.server.logging_setup import configure_queue_logging
+
+    configure_queue_logging()
+    try:
+        asyncio.run(_serve_shard(shard_id, model_path, port, broker_port, server_options))
+    except KeyboardInterrupt:
+        pass
+
+
+async def run_cluster(model_path: str, host: str = '0.0.0.0', port: int = 8765, shards: Optional[int] = None,
+                      shard_base_port: int = 18765, broker_port: int = 18764,
+                      metrics_port: Optional[int] = None, server_options: Optional[dict] = None,
+                      startup_grace: float = 10.0):
+    """
+    Start the broker, ``shards`` ECGServer processes and the routing front end.
+
+    Shard i listens on 127.0.0.1:shard_base_port+i and, if ``metrics_port`` is
+    set, serves its metrics on metrics_port+i. Shards that exit are restarted;
+    a shard exiting within ``startup_grace`` seconds of starting stops the cluster.
+    """
+    shards = shards or multiprocessing.cpu_count()
+    context = multiprocessing.get_context('spawn')
+    broker = MessageBroker()
+    broker_server = await asyncio.start_server(broker.handle, '127.0.0.1', broker_port)
+
+    def start_shard(shard_id: int):
+        options = dict(server_options or {})
+        if metrics_port is not None:
+            options['metrics_port'] = metrics_port + shard_id
+        process = context.Process(
+            target=run_shard, name=f'ecg-shard-{shard_id}', daemon=True,
+            args=(shard_id, str(model_path), shard_base_port + shard_id, broker_port, options)
+        )
+        process.start()
+        return process, time.monotonic()
+
+    processes = [start_shard(shard_id) for shard_id in range(shards)]
+    router = ShardRouter([shard_base_port + shard_id for shard_id in range(shards)])
+    router_server = await asyncio.start_server(router.handle, host, port)
+    logger.info(f"Cluster of {shards} shards running on ws://{host}:{port}")
+    try:
+        while True:
+            await asyncio.sleep(1.0)
+            for shard_id, (process, started) in enumerate(processes):
+                if process.is_alive():
+                    continue
+                if time.monotonic() - started < startup_grace:
+                    raise RuntimeError(f"Shard {shard_id} exited during startup (exit code {process.exitcode})")
+                logger.error(f"Shard {shard_id} exited with code {process.exitcode}; restarting")
+                processes[shard_id] = start_shard(shard_id)
+    finally:
+        router_server.close()
+        await router.close()
+        broker_server.close()
+        await broker.close()
+        for process, _ in processes:
+            process.terminate()
+        for process, _ in processes:
+            process.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run ECGServer shards behind one port")
+    parser.add_argument('--model', required=True)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--shards', type=int, default=None, help="Shard processes (default: CPU count)")
+    parser.add_argument('--shard-base-port', type=int, default=18765)
+    parser.add_argument('--broker-port', type=int, default=18764)
+    parser.add_argument('--metrics-port', type=int, default=None, help="Shard i serves metrics on this port + i")
+    parser.add_argument('--hop', type=int, default=25, help="Inference hop in samples")
+    parser.add_argument('--runtime', choices=MODEL_RUNTIMES, default='sklearn',
+                        help="How the model file is loaded (see src/models/runtime.py)")
+    parser.add_argument('--model-watch-interval', type=float, default=None,
+                        help="Seconds between checks of the model file for hot reload")
+    parser.add_argument('--beat-features', action='store_true',
+                        help="Detect beats and send their features to the frontend")
+    args = parser.parse_args(argv)
+
+    from src.server.logging_setup import configure_queue_logging
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    configure_queue_logging()
+    try:
+        asyncio.run(run_cluster(
+            args.model, args.host, args.port, args.shards,
+            shard_base_port=args.shard_base_port, broker_port=args.broker_port,
+            metrics_port=args.metrics_port, server_options={
+                'inference_hop': args.hop, 'model_watch_interval': args.model_watch_interval,
+                'model_runtime': args.runtime, 'beat_features': args.beat_features
+            }
+        ))
+    except KeyboardInterrupt:
+        logger.info("Cluster shutdown requested")
+
+
+if __name__ == "__main__":
+    main()
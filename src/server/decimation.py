@@ -0,0 +1,60 @@
+from typing import Tuple
+
+import numpy as np
+
+
+class MinMaxDecimator:
+    """
+    Downsample a sample stream for display while keeping peaks visible.
+
+    Incoming samples are grouped into buckets; each bucket is reduced to its
+    minimum and maximum, emitted in the order they occurred, so a QRS spike
+    survives decimation instead of being averaged or skipped. ``output_rate``
+    is the number of output points per second (two per bucket).
+    """
+
+    def __init__(self, input_rate: float, output_rate: float):
+        if not 0 < output_rate < input_rate:
+            raise ValueError(f"Display rate must be between 0 and {input_rate} Hz, got {output_rate}")
+        self.input_rate = input_rate
+        self.output_rate = output_rate
+        self.bucket_size = max(2, int(round(2 * input_rate / output_rate)))
+        self._pending = np.empty(0, dtype=np.float32)
+        self._pending_flags = np.empty(0, dtype=bool)
+
+    def push(self, samples: np.ndarray, flags: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Add samples and return the decimated points of every completed bucket.
+
+        Args:
+            samples: New samples in arrival order
+            flags: Per-sample anomaly flags
+
+        Returns:
+            (values, anomalies): two points per completed bucket; a point is
+            flagged if any sample in its bucket was anomalous
+        """
+        if len(self._pending):
+            samples = np.concatenate([self._pending, samples])
+            flags = np.concatenate([self._pending_flags, flags])
+        n_buckets = len(samples) // self.bucket_size
+        used = n_buckets * self.bucket_size
+        self._pending = np.asarray(samples[used:], dtype=np.float32).copy()
+        self._pending_flags = np.asarray(flags[used:], dtype=bool).copy()
+        if n_buckets == 0:
+            return np.empty(0, dtype=np.float32), np.empty(0, dtype=bool)
+
+        buckets = np.asarray(samples[:used], dtype=np.float32).reshape(n_buckets, self.bucket_size)
+        rows = np.arange(n_buckets)
+        min_idx = buckets.argmin(axis=1)
+        max_idx = buckets.argmax(axis=1)
+        first = np.minimum(min_idx, max_idx)
+        second = np.maximum(min_idx, max_idx)
+
+        values = np.empty(2 * n_buckets, dtype=np.float32)
+        values[0::2] = buckets[rows, first]
+        values[1::2] = buckets[rows, second]
+        anomalies = np.repeat(
+            np.asarray(flags[:used], dtype=bool).reshape(n_buckets, self.bucket_size).any(axis=1), 2
+        )
+        return values, anomalies
@@ -1,17 +1,36 @@
+import argparse
 import asyncio
 import websockets
 import json
+import signal
+import time
 import numpy as np
 from datetime import datetime
 import logging
 from pathlib import Path
-import joblib
-from typing import Optional, Dict, Any, Set
+from typing import Optional, Dict, Any, List, Sequence, Union
 from dataclasses import dataclass
 import dataclasses
 from websockets.legacy.server import WebSocketServerProtocol
 from websockets.exceptions import ConnectionClosed
 
+from src.features.streaming import StreamingFeaturePipeline
+from src.server.batching import BatchingInferenceService
+from src.server.decimation import MinMaxDecimator
+from src.server.fanout import DROP_OLDEST, OVERFLOW_POLICIES, FrontendClient
+from src.server.heartbeat import HeartbeatTracker
+from src.server.history import DeviceHistory
+from src.server.logging_setup import RateLimitedLog, configure_queue_logging
+from src.server.metrics import MetricsRegistry, serve_metrics
+from src.server.inference import (
+    PROCESS_BACKEND, SKLEARN_RUNTIME, THREAD_BACKEND, ProcessInferenceBackend, ThreadInferenceBackend,
+    load_model_file
+)
+from src.models.runtime import MODEL_RUNTIMES, model_file_for
+from src.server.recording import RecordingStore
+from src.server.protocol import FrameError, decode_esp_frame, encode_frontend_frame, valid_sample_mask
+from src.server.session import DEFAULT_DEVICE_ID, DeviceSession, RemoteDevice, query_param
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -25,206 +44,851 @@ class ECGDataPoint:
     timestamp: str
     value: float
     is_anomaly: bool = False
+    device_id: Optional[str] = None
 
 class ECGServer:
-    def __init__(self, model_path: str):
+    def __init__(self, model_path: str, inference_hop: Optional[int] = 25,
+                 inference_interval_ms: Optional[float] = None,
+                 client_queue_size: int = 1024, client_overflow_policy: str = DROP_OLDEST,
+                 inference_backend: str = THREAD_BACKEND, inference_workers: Optional[int] = None,
+                 metrics_port: Optional[int] = None, diagnostic_log_interval: float = 1.0,
+                 recording_dir: Optional[str] = None, model_watch_interval: Optional[float] = None,
+                 history_seconds: float = 60.0, history_rate: float = 50.0,
+                 warmup_batch_sizes: Sequence[int] = (1, 2, 8, 32), model_runtime: str = SKLEARN_RUNTIME,
+                 batch_max_size: int = 64, batch_max_wait: Optional[float] = 0.005,
+                 beat_features: bool = False):
+        self._created = time.perf_counter()
+        self.startup_timings: Dict[str, float] = {}  # Seconds per startup phase
         self.model_path = Path(model_path)
-        self.model = self._load_model()
-        self.clients: Set[WebSocketServerProtocol] = set()
-        self.esp_client: Optional[WebSocketServerProtocol] = None
-        self.data_buffer: list[float] = []
+        # 'sklearn' runs the pipeline as loaded; 'compiled' flattens tree ensembles (src/models/compiled_trees.py)
+        self.model_runtime = model_runtime
         self.BUFFER_SIZE = 95  # Expect 95 consecutive ADC readings per sample
-        self.last_esp_heartbeat: Optional[float] = None
+        if inference_backend == PROCESS_BACKEND:
+            # Worker processes load the model themselves; the server process only checks it exists
+            if not self.model_path.exists():
+                logger.error(f"Critical error loading model: Model file not found: {self.model_path}")
+                raise SystemExit(1)
+            self.model = None
+            self.backend = ProcessInferenceBackend(self.model_path, inference_workers, self.BUFFER_SIZE,
+                                                   runtime=model_runtime)
+        elif inference_backend == THREAD_BACKEND:
+            started = time.perf_counter()
+            self.model = self._load_model()  # Shared by every device session
+            self.startup_timings['model_load'] = time.perf_counter() - started
+            self.backend = ThreadInferenceBackend(self.model, model_runtime)
+        else:
+            raise ValueError(f"Unknown inference backend: {inference_backend}")
+        # Windows due on all devices are scored together, waiting at most `batch_max_wait` seconds
+        # for up to `batch_max_size` windows (src/server/batching.py); None scores each device's call alone
+        self.batcher = (BatchingInferenceService(self.backend, batch_max_size, batch_max_wait)
+                        if batch_max_wait is not None else None)
+        self.threshold = 0.5  # P(anomaly) at or above which a window is anomalous
+        # Dummy batches scored before accepting connections, so the first real window is not slow
+        self.warmup_batch_sizes = warmup_batch_sizes
+        # Poll the model file every `model_watch_interval` seconds and hot-reload it when it changes
+        self.model_watch_interval = model_watch_interval
+        self._reload_lock = asyncio.Lock()
+        self.clients: Dict[WebSocketServerProtocol, FrontendClient] = {}
+        # Each frontend client gets a bounded outgoing queue; see src/server/fanout.py for policies
+        self.client_queue_size = client_queue_size
+        self.client_overflow_policy = client_overflow_policy
+        self.sessions: Dict[str, DeviceSession] = {}
+        # Set by src/server/cluster.py when this server is one shard of several
+        self.bus = None
+        self.remote_devices: Dict[str, RemoteDevice] = {}  # Devices connected to other shards
+        self.SAMPLING_RATE = 250  # ESP sampling rate in Hz
+        self.BUFFER_HISTORY = 1024  # Extra samples kept so every window due in a batch can be scored
+        # Each device keeps its last `history_seconds` at `history_rate` points/s for new dashboards
+        self.history_seconds = history_seconds
+        self.history_rate = history_rate
+        # Score a window every `inference_hop` samples, or every `inference_interval_ms` if set
+        self.inference_hop = inference_hop
+        self.inference_interval_ms = inference_interval_ms
         self.ESP_TIMEOUT = 10.0
+        self.heartbeats = HeartbeatTracker(self.ESP_TIMEOUT)  # Deadlines keyed by device id
         self.MIN_VALID_SIGNALS = 10
-        self.consecutive_anomalies = 0
-        self.ANOMALY_THRESHOLD = 3  # Number of consecutive anomalies before alerting
+        # Consecutive anomalous samples before alerting. A scored window stands for every sample since the
+        # previous one (one hop), so with the default hop a single anomalous window is enough, as it was
+        # when every sample was scored.
+        self.ANOMALY_THRESHOLD = 3
+        self.metrics_port = metrics_port  # Prometheus endpoint is only served when a port is set
+        # Per-sample/per-window diagnostics are logged at most once per interval per message
+        self.diagnostics = RateLimitedLog(logger, diagnostic_log_interval)
+        # Raw streams are persisted per device when a recording directory is set
+        self.recorder = RecordingStore(recording_dir, self.SAMPLING_RATE) if recording_dir is not None else None
+        # Detect beats in each stream and publish their features (src/features/streaming.py)
+        self.beat_features = beat_features
+        self._init_metrics()
+
+    def _init_metrics(self):
+        self.metrics = MetricsRegistry()
+        self.stage_latency = {
+            stage: self.metrics.histogram(
+                'ecg_stage_latency_seconds', 'Time spent per processing stage', {'stage': stage}
+            )
+            for stage in ('decode', 'buffer', 'features', 'batch_wait', 'queue_wait', 'inference', 'alert', 'broadcast')
+        }
+        self.backend.queue_wait_observer = self.stage_latency['queue_wait'].observe
+        if self.batcher is not None:
+            self.batcher.batch_wait_observer = self.stage_latency['batch_wait'].observe
+            self.batcher.batch_size_observer = self.metrics.histogram(
+                'ecg_inference_batch_windows', 'Windows per batched model call',
+                buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256)
+            ).observe
+            self.metrics.gauge('ecg_inference_pending_windows', 'Windows waiting to join a batch',
+                               callback=lambda: self.batcher.pending_windows)
+        self.samples_counter = self.metrics.counter('ecg_samples_total', 'Valid ECG samples ingested')
+        self.invalid_samples_counter = self.metrics.counter('ecg_invalid_samples_total', 'ECG samples rejected by validation')
+        self.windows_counter = self.metrics.counter('ecg_windows_scored_total', 'Detection windows scored by the model')
+        self.skipped_windows_counter = self.metrics.counter('ecg_windows_skipped_total', 'Due windows that left the buffer unscored')
+        self.alerts_counter = self.metrics.counter('ecg_alerts_total', 'Anomaly alerts sent')
+        self.beats_counter = self.metrics.counter('ecg_beats_total', 'Beats detected and featurized')
+        self.dropped_counter = self.metrics.counter('ecg_dropped_messages_total', 'Frontend messages dropped on queue overflow')
+        self.reload_counters = {
+            result: self.metrics.counter('ecg_model_reloads_total', 'Model hot reloads attempted', {'result': result})
+            for result in ('success', 'failure')
+        }
+        self.loop_lag = self.metrics.histogram('ecg_event_loop_lag_seconds', 'Event loop scheduling delay')
+        self.metrics.gauge('ecg_frontend_clients', 'Connected frontend clients', callback=lambda: len(self.clients))
+        self.metrics.gauge('ecg_device_sessions', 'Connected ESP devices', callback=lambda: len(self.sessions))
+        self.metrics.gauge('ecg_frontend_queued_messages', 'Messages waiting in frontend send queues',
+                           callback=lambda: sum(len(client) for client in self.clients.values()))
 
     def _load_model(self):
         try:
-            logger.info(f"Loading model from: {self.model_path}")
-            if not self.model_path.exists():
-                raise FileNotFoundError(f"Model file not found: {self.model_path}")
-            return joblib.load(self.model_path)
+            model_file = Path(model_file_for(self.model_path, self.model_runtime))
+            logger.info(f"Loading model from: {model_file} ({self.model_runtime} runtime)")
+            if not model_file.exists():
+                raise FileNotFoundError(f"Model file not found: {model_file}")
+            return load_model_file(self.model_path, self.model_runtime)
         except Exception as e:
             logger.error(f"Critical error loading model: {e}")
             raise SystemExit(1)
 
+    async def warm_up(self):
+        """Score dummy batches at the expected batch sizes on every inference worker."""
+        observer, self.backend.queue_wait_observer = self.backend.queue_wait_observer, None
+        try:
+            rng = np.random.default_rng(0)
+            concurrency = getattr(self.backend, 'workers', 1)
+            for rows in self.warmup_batch_sizes:
+                X = rng.uniform(0.3, 0.7, (rows, self.BUFFER_SIZE)).astype(np.float32)
+                await asyncio.gather(*[self.backend.predict(X, self.threshold) for _ in range(concurrency)])
+        finally:
+            self.backend.queue_wait_observer = observer
+
+    def _record_startup_phase(self, phase: str, seconds: float):
+        self.startup_timings[phase] = seconds
+        self.metrics.gauge('ecg_startup_phase_seconds', 'Time spent per server startup phase',
+                           {'phase': phase}).set(seconds)
+
+    def canary_windows(self, limit: int = 8) -> np.ndarray:
+        """Normalized windows used to validate a model before it is swapped in."""
+        windows = [
+            session.data_buffer.window(self.BUFFER_SIZE)
+            for session in list(self.sessions.values())[:limit]
+            if len(session.data_buffer) >= self.BUFFER_SIZE
+        ]
+        windows.append(np.full(self.BUFFER_SIZE, 512, dtype=np.float32))  # Mid-scale window, always available
+        return np.stack(windows).astype(np.float32) / 1023.0
+
+    async def reload_model(self, model_path: Optional[str] = None) -> bool:
+        """
+        Load, warm up and validate a model in the background, then swap it in.
+
+        Live connections are untouched: windows already submitted finish on
+        the old model, and the old model keeps serving if the new one fails
+        to load or validate.
+
+        Returns:
+            True if the new model is now serving
+        """
+        if self._reload_lock.locked():
+            logger.warning("Model reload already in progress")
+            return False
+        async with self._reload_lock:
+            model_path = Path(model_path) if model_path is not None else self.model_path
+            started = time.perf_counter()
+            logger.info(f"Reloading model from: {model_path}")
+            try:
+                await self.backend.reload(model_path, self.canary_windows(), self.threshold)
+            except Exception as e:
+                self.reload_counters['failure'].inc()
+                logger.error(f"Model reload rejected, keeping the current model: {e}")
+                return False
+            self.model_path = model_path
+            if isinstance(self.backend, ThreadInferenceBackend):
+                self.model = self.backend.model
+            self.reload_counters['success'].inc()
+            logger.info(f"Model reloaded in {time.perf_counter() - started:.2f}s")
+            return True
+
+    def _model_file_signature(self):
+        try:
+            stat = Path(model_file_for(self.model_path, self.model_runtime)).stat()
+        except OSError:
+            return None  # Missing while being replaced
+        return stat.st_mtime_ns, stat.st_size
+
+    async def monitor_model_file(self):
+        """Reload the model when its file changes, once the new file has stopped changing."""
+        current = self._model_file_signature()
+        pending = None
+        while True:
+            await asyncio.sleep(self.model_watch_interval)
+            signature = self._model_file_signature()
+            if signature is None or signature == current:
+                pending = None
+                continue
+            if signature != pending:
+                pending = signature  # Wait one more interval in case the file is still being written
+                continue
+            # Remember the file even if it is rejected, so a bad model is not retried every interval
+            current = signature
+            await self.reload_model()
+
+    def create_session(self, device_id: str, websocket=None) -> DeviceSession:
+        return DeviceSession(
+            device_id,
+            websocket,
+            window_size=self.BUFFER_SIZE,
+            history_size=self.BUFFER_HISTORY,
+            hop_size=self.inference_hop,
+            interval_ms=self.inference_interval_ms,
+            history=self._new_history(),
+            features=StreamingFeaturePipeline(self.SAMPLING_RATE) if self.beat_features else None
+        )
+
+    def _new_history(self) -> DeviceHistory:
+        return DeviceHistory(self.SAMPLING_RATE, self.history_rate, self.history_seconds)
+
+    def touch_session(self, session: DeviceSession):
+        """Record a heartbeat for a registered device session."""
+        session.touch()
+        if self.sessions.get(session.device_id) is session:
+            self.heartbeats.touch(session.device_id, session.last_heartbeat)
+
     def validate_ecg_data(self, value: Any) -> Optional[float]:
         try:
             value = float(value)
             # Ensure the raw value is in the ADC range (0-1023)
             if not 0 <= value <= 1023:
-                logger.warning(f"ECG value out of range: {value}")
+                self.diagnostics.warning("ECG value out of range: %s", value)
                 return None
             return value
         except (ValueError, TypeError) as e:
-            logger.warning(f"Invalid ECG value: {e}")
+            self.diagnostics.warning("Invalid ECG value: %s", e)
             return None
 
-    async def detect_anomaly(self) -> bool:
+    def validate_ecg_batch(self, samples: np.ndarray) -> np.ndarray:
+        """Bulk-validate a batch of raw ADC samples, dropping out-of-range values."""
+        mask = valid_sample_mask(samples)
+        if mask.all():
+            return samples
+        invalid = int(np.count_nonzero(~mask))
+        self.invalid_samples_counter.inc(invalid)
+        self.diagnostics.warning("Dropping %d/%d out-of-range ECG values", invalid, len(samples))
+        return samples[mask]
+
+    async def detect_anomalies(self, session: DeviceSession, window_ends: List[int]) -> List[bool]:
+        """
+        Score several windows of a device's buffer in a single model call.
+
+        Args:
+            session: Device whose buffer holds the windows
+            window_ends: Window end positions (running sample counts) to score
+
+        Returns:
+            Anomaly flag per window, in the same order
+        """
+        total = session.data_buffer.total_samples
+        windows = np.stack([
+            session.data_buffer.window(self.BUFFER_SIZE, end_offset=total - end)
+            for end in window_ends
+        ])
+        return await self._score_windows(windows)
+
+    async def _score_windows(self, windows: np.ndarray) -> List[bool]:
+        results = [False] * len(windows)
         try:
-            # Ensure we have exactly BUFFER_SIZE values; pad with zeros if necessary
-            if len(self.data_buffer) < self.BUFFER_SIZE:
-                padded_buffer = self.data_buffer + [0] * (self.BUFFER_SIZE - len(self.data_buffer))
-            else:
-                padded_buffer = self.data_buffer[-self.BUFFER_SIZE:]
-            
-            # Convert the list to a numpy array of shape (1, BUFFER_SIZE)
-            X = np.array(padded_buffer).reshape(1, -1)
             # Normalize the data (assuming your model was trained on normalized values)
-            X = X / 1023.0
-            
-            # Check for a sufficient number of non-zero values
-            non_zero_count = np.count_nonzero(X)
-            if non_zero_count < self.MIN_VALID_SIGNALS:
-                logger.warning(f"Insufficient valid signals: {non_zero_count}/{self.BUFFER_SIZE}")
-                return False
-            
-            # Run prediction asynchronously
-            prediction = await asyncio.get_event_loop().run_in_executor(None, self.model.predict, X)
-            proba = await asyncio.get_event_loop().run_in_executor(None, self.model.predict_proba, X)
-            
-            logger.info(f"Anomaly detection input: {X} -> Prediction: {prediction} with probability: {proba[0][1]:.3f}")
-            return bool(prediction[0])
+            X = windows / 1023.0
+
+            # Check for a sufficient number of non-zero values per window
+            non_zero_counts = np.count_nonzero(X, axis=1)
+            valid = non_zero_counts >= self.MIN_VALID_SIGNALS
+            if not valid.all():
+                self.diagnostics.warning("Insufficient valid signals in %d/%d windows",
+                                         int(np.count_nonzero(~valid)), len(X))
+                if not valid.any():
+                    return results
+                X = X[valid]
+
+            # Run prediction on the inference backend (labels and probabilities from one model pass),
+            # batched with the windows of other devices when batching is enabled
+            started = time.perf_counter()
+            inference = self.batcher if self.batcher is not None else self.backend
+            request = asyncio.ensure_future(inference.predict(X, self.threshold))
+            try:
+                # asyncio.wait raises CancelledError only if this task is cancelled,
+                # not when the backend cancels the request itself
+                await asyncio.wait({request})
+            except asyncio.CancelledError:
+                request.cancel()
+                raise
+            if request.cancelled():
+                logger.error("Anomaly detection cancelled by the inference backend")
+                return results
+            result = request.result()
+            self.stage_latency['inference'].observe(time.perf_counter() - started)
+            self.windows_counter.inc(len(X))
+
+            self.diagnostics.debug("Anomaly detection input: %s -> Prediction: %s with probability: %s",
+                                   X, result.labels, result.probabilities)
+            for index, label in zip(np.flatnonzero(valid), result.labels):
+                results[index] = bool(label)
+            return results
         except Exception as e:
             logger.error(f"Anomaly detection error: {e}")
-            return False
+            return results
 
-    async def send_anomaly_alert(self):
-        """Send an anomaly alert to all frontend clients."""
+    def send_anomaly_alert(self, session: DeviceSession):
+        """Send an anomaly alert to the frontend clients following a device."""
+        started = time.perf_counter()
         alert_message = {
             'type': 'alert',
             'message': 'ECG Anomaly Detected!',
             'severity': 'high',
+            'device_id': session.device_id,
             'timestamp': datetime.now().isoformat()
         }
-        await self.broadcast_to_frontend(alert_message)
-        logger.warning("Anomaly alert sent to frontend clients")
+        self.broadcast_to_frontend(alert_message, session.device_id)
+        self.alerts_counter.inc()
+        self.stage_latency['alert'].observe(time.perf_counter() - started)
+        logger.warning("Anomaly alert for device %s sent to frontend clients", session.device_id)
 
-    async def process_esp_data(self, message: str):
+    def send_beats(self, session: DeviceSession, beats):
+        """Send the features of newly completed beats to the frontend clients following a device."""
+        self.beats_counter.inc(len(beats))
+        for beat in beats:
+            st_deviation = beat.features.get('st_deviation')
+            self.broadcast_to_frontend({
+                'type': 'beat',
+                'device_id': session.device_id,
+                'timestamp': datetime.now().isoformat(),
+                'heart_rate': beat.heart_rate,
+                'rr_interval': beat.rr_interval,
+                'st_deviation': float(st_deviation) if st_deviation is not None else None
+            }, session.device_id)
+
+    async def process_esp_frame(self, session: DeviceSession, payload: bytes):
+        """Handle a binary multi-sample frame from an ESP device."""
+        started = time.perf_counter()
         try:
-            logger.debug(f"Raw message received: {message}")
+            frame = decode_esp_frame(payload)
+        except FrameError as e:
+            logger.error(f"Invalid ESP frame received from {session.device_id}: {e}")
+            return
+
+        self.touch_session(session)
+        if session.last_frame_sequence is not None:
+            expected = (session.last_frame_sequence + 1) & 0xFFFFFFFF
+            if frame.sequence != expected:
+                self.diagnostics.warning("ESP frame sequence gap on %s: expected %d, got %d",
+                                         session.device_id, expected, frame.sequence)
+        session.last_frame_sequence = frame.sequence
+
+        samples = self.validate_ecg_batch(frame.samples)
+        self.stage_latency['decode'].observe(time.perf_counter() - started)
+        if len(samples):
+            await self.process_samples(session, samples)
+
+    async def process_samples(self, session: DeviceSession, samples: np.ndarray):
+        """Run a batch of validated ADC samples through a device's processing pipeline."""
+        started = time.perf_counter()
+        self.samples_counter.inc(len(samples))
+        data_buffer = session.data_buffer
+        data_buffer.extend(samples)
+        if self.recorder is not None:
+            self.recorder.append(session.device_id, samples, time.time())
+        total = data_buffer.total_samples
+        batch_start = total - len(samples)
+
+        window_ends = session.scheduler.due_windows(total)
+        oldest_end = total - len(data_buffer) + self.BUFFER_SIZE
+        if window_ends and window_ends[0] < oldest_end:
+            skipped = sum(end < oldest_end for end in window_ends)
+            self.skipped_windows_counter.inc(skipped)
+            self.diagnostics.warning("Skipping %d windows that left the buffer", skipped)
+            window_ends = [end for end in window_ends if end >= oldest_end]
+        self.stage_latency['buffer'].observe(time.perf_counter() - started)
+
+        if session.features is not None:
+            started = time.perf_counter()
+            beats = session.features.update(samples)
+            self.stage_latency['features'].observe(time.perf_counter() - started)
+            if beats:
+                self.send_beats(session, beats)
+
+        # Every sample carries the result of the latest window scored at or before it
+        flags = np.full(len(samples), session.last_window_anomaly)
+        if window_ends:
+            results = await self.detect_anomalies(session, window_ends)
+            for end, is_anomaly in zip(window_ends, results):
+                flags[end - batch_start - 1:] = is_anomaly
+                # A window stands for the samples since the previous scored window; the first one for one hop
+                previous_end = session.last_window_end
+                if previous_end is None:
+                    scheduler = session.scheduler
+                    previous_end = end - (scheduler.hop_size if scheduler.interval_ms is None else 1)
+                session.last_window_end = end
+
+                # Handle consecutive anomalies; every window at or over the threshold alerts
+                if is_anomaly:
+                    session.consecutive_anomalies += end - previous_end
+                    if session.consecutive_anomalies >= self.ANOMALY_THRESHOLD:
+                        self.send_anomaly_alert(session)
+                else:
+                    session.consecutive_anomalies = 0
+            session.last_window_anomaly = results[-1]
+
+        started = time.perf_counter()
+        self.broadcast_samples(session, samples, flags)
+        self.stage_latency['broadcast'].observe(time.perf_counter() - started)
+
+    async def process_sample(self, session: DeviceSession, ecg_value: float):
+        """
+        Queue one sample from a JSON message.
+
+        Samples that arrive while the device's earlier samples are being scored
+        are processed as one batch, so their due windows share a model call.
+        """
+        session.pending_samples.append(ecg_value)
+        if session.drain_task is None or session.drain_task.done():
+            session.drain_task = asyncio.ensure_future(self._drain_samples(session))
+
+    async def _drain_samples(self, session: DeviceSession):
+        while session.pending_samples:
+            samples = np.array(session.pending_samples)
+            session.pending_samples = []
+            try:
+                await self.process_samples(session, samples)
+            except Exception as e:
+                logger.error(f"Error processing ESP data: {e}")
+
+    async def _finish_pending_samples(self, session: DeviceSession):
+        """Process the JSON samples still queued for a device that is going away."""
+        if session.drain_task is not None:
+            await asyncio.gather(session.drain_task, return_exceptions=True)
+
+    async def process_esp_data(self, session: DeviceSession, message):
+        if isinstance(message, (bytes, bytearray, memoryview)):
+            await self.process_esp_frame(session, message)
+            return
+        started = time.perf_counter()
+        try:
+            self.diagnostics.debug("Raw message received: %s", message)
             data = json.loads(message)
             message_type = data.get('type')
 
             if message_type == 'ping':
-                self.last_esp_heartbeat = datetime.now().timestamp()
+                self.touch_session(session)
                 return
 
             if message_type == 'error':
-                await self.broadcast_to_frontend({
+                self.broadcast_to_frontend({
                     'type': 'warning',
-                    'message': data.get('message', 'ECG leads disconnected')
-                })
+                    'message': data.get('message', 'ECG leads disconnected'),
+                    'device_id': session.device_id
+                }, session.device_id)
                 return
 
             if message_type == 'data':
                 raw_value = data.get('value')
-                logger.debug(f"Raw value before validation: {raw_value}")
                 ecg_value = self.validate_ecg_data(raw_value)
+                self.stage_latency['decode'].observe(time.perf_counter() - started)
                 if ecg_value is None:
+                    self.invalid_samples_counter.inc()
                     return
 
-                logger.info(f"Processed ECG data: {ecg_value}")
-                self.data_buffer.append(ecg_value)
-                while len(self.data_buffer) > self.BUFFER_SIZE:
-                    self.data_buffer.pop(0)
-
-                is_anomaly = False
-                if len(self.data_buffer) == self.BUFFER_SIZE:
-                    is_anomaly = await self.detect_anomaly()
-                    
-                    # Handle consecutive anomalies
-                    if is_anomaly:
-                        self.consecutive_anomalies += 1
-                        if self.consecutive_anomalies >= self.ANOMALY_THRESHOLD:
-                            await self.send_anomaly_alert()
-                    else:
-                        self.consecutive_anomalies = 0
+                self.diagnostics.debug("Processed ECG data: %s", ecg_value)
+                await self.process_sample(session, ecg_value)
 
-                data_point = ECGDataPoint(
-                    timestamp=datetime.now().isoformat(),
-                    value=ecg_value,
-                    is_anomaly=is_anomaly
-                )
-                await self.broadcast_to_frontend(dataclasses.asdict(data_point))
-                
         except json.JSONDecodeError as e:
             logger.error(f"Invalid JSON received: {e}")
         except Exception as e:
             logger.error(f"Error processing ESP data: {e}")
 
+    @staticmethod
+    def _parse_hello(message) -> Optional[str]:
+        """Return the device id announced by a handshake message, or None if it is not one."""
+        if not isinstance(message, str):
+            return None
+        try:
+            data = json.loads(message)
+        except json.JSONDecodeError:
+            return None
+        if not isinstance(data, dict) or data.get('type') != 'hello':
+            return None
+        return str(data.get('device_id') or DEFAULT_DEVICE_ID)
+
     async def handle_esp_connection(self, websocket: WebSocketServerProtocol):
-        if self.esp_client:
-            logger.warning("Rejecting duplicate ESP connection")
+        # Devices identify themselves with ?device_id=... on the URL or a
+        # {"type": "hello", "device_id": ...} first message; legacy firmware
+        # that sends neither is treated as the single default device.
+        pending_message = None
+        device_id = query_param(websocket, 'device_id')
+        if device_id is None:
+            try:
+                first_message = await asyncio.wait_for(websocket.recv(), timeout=self.ESP_TIMEOUT)
+            except (asyncio.TimeoutError, ConnectionClosed):
+                logger.warning("ESP connection closed before handshake")
+                await websocket.close(1008, "Handshake timeout")
+                return
+            device_id = self._parse_hello(first_message)
+            if device_id is None:
+                device_id = DEFAULT_DEVICE_ID
+                pending_message = first_message
+
+        if device_id in self.sessions:
+            logger.warning(f"Rejecting duplicate ESP connection for device {device_id}")
             await websocket.close(1008, "Another ESP device already connected")
             return
 
-        logger.info("ESP8266 connected")
-        self.esp_client = websocket
-        self.last_esp_heartbeat = datetime.now().timestamp()
-        
+        session = self.create_session(device_id, websocket)
+        self.sessions[device_id] = session
+        self.heartbeats.touch(device_id, session.last_heartbeat)
+        self.devices_changed()
+        logger.info(f"ESP8266 {device_id} connected (sample buffer: {session.nbytes} bytes, "
+                    f"{len(self.sessions)} devices)")
+
         try:
-            await self.broadcast_to_frontend({
+            if self.recorder is not None:
+                await asyncio.get_running_loop().run_in_executor(None, self.recorder.open, device_id)
+            self.broadcast_to_frontend({
                 'type': 'status',
-                'message': 'ESP8266 connected'
-            })
+                'message': 'ESP8266 connected',
+                'device_id': device_id
+            }, device_id)
+            if pending_message is not None:
+                await self.process_esp_data(session, pending_message)
             async for message in websocket:
-                await self.process_esp_data(message)
+                await self.process_esp_data(session, message)
         except ConnectionClosed:
-            logger.info("ESP8266 disconnected normally")
+            logger.info(f"ESP8266 {device_id} disconnected normally")
         except Exception as e:
-            logger.error(f"ESP connection error: {e}")
+            logger.error(f"ESP connection error on {device_id}: {e}")
         finally:
-            self.esp_client = None
-            self.last_esp_heartbeat = None
-            await self.broadcast_to_frontend({
+            await self._finish_pending_samples(session)
+            if self.sessions.get(device_id) is session:
+                del self.sessions[device_id]
+                self.heartbeats.remove(device_id)
+                self.devices_changed()
+            if self.recorder is not None:
+                self.recorder.flush(device_id)
+            self.broadcast_to_frontend({
                 'type': 'status',
-                'message': 'ESP8266 disconnected'
-            })
+                'message': 'ESP8266 disconnected',
+                'device_id': device_id
+            }, device_id)
 
-    async def handle_frontend_connection(self, websocket: WebSocketServerProtocol):
-        logger.info("Frontend client connected")
-        self.clients.add(websocket)
-        await websocket.send(json.dumps({
+    @staticmethod
+    def _subscribe(client: FrontendClient, devices):
+        """Restrict a frontend client to a list of devices ('*' or None for all)."""
+        if devices is None or devices == '*':
+            client.devices = None
+        else:
+            if isinstance(devices, str):
+                devices = devices.split(',')
+            client.devices = {str(device) for device in devices if device}
+
+    def _set_display_rate(self, client: FrontendClient, display_rate):
+        """Switch a client between raw samples (None/0) and a decimated display stream."""
+        try:
+            display_rate = float(display_rate) if display_rate else None
+        except (TypeError, ValueError):
+            logger.warning(f"Ignoring invalid display rate: {display_rate}")
+            return
+        if display_rate is not None and not 0 < display_rate < self.SAMPLING_RATE:
+            logger.warning(f"Ignoring display rate outside (0, {self.SAMPLING_RATE}) Hz: {display_rate}")
+            return
+        client.display_rate = display_rate
+
+    def handle_frontend_message(self, client: FrontendClient, message):
+        try:
+            data = json.loads(message)
+        except (json.JSONDecodeError, TypeError):
+            logger.warning("Invalid message from frontend client")
+            return
+        message_type = data.get('type')
+        followed = {device_id for device_id in self.known_devices() if client.is_subscribed(device_id)}
+        if message_type == 'subscribe':
+            self._subscribe(client, data.get('devices'))
+            if 'display_rate' in data:
+                self._set_display_rate(client, data['display_rate'])
+        elif message_type == 'unsubscribe':
+            subscribed = client.devices if client.devices is not None else set(self.known_devices())
+            client.devices = subscribed - set(data.get('devices', []))
+        else:
+            return
+        self.subscriptions_changed()
+        client.enqueue(json.dumps({
+            'type': 'status',
+            'message': 'Subscriptions updated',
+            'devices': sorted(client.devices) if client.devices is not None else self.known_devices(),
+            'display_rate': client.display_rate
+        }))
+        self._send_history(client, [device_id for device_id in self.known_devices() if device_id not in followed])
+
+    async def handle_frontend_connection(self, websocket: WebSocketServerProtocol, binary: bool = False):
+        logger.info(f"Frontend client connected ({'binary' if binary else 'JSON'} samples)")
+        client = FrontendClient(websocket, self.client_queue_size, self.client_overflow_policy, binary)
+        client.on_drop = self.dropped_counter.inc
+        # Dashboards can subscribe up front with ?devices=a,b&rate=50
+        devices = query_param(websocket, 'devices')
+        if devices is not None:
+            self._subscribe(client, devices)
+        display_rate = query_param(websocket, 'rate')
+        if display_rate is not None:
+            self._set_display_rate(client, display_rate)
+        client.enqueue(json.dumps({
             'type': 'status',
             'message': 'Connected to server',
-            'esp_connected': bool(self.esp_client)
+            'esp_connected': bool(self.sessions or self.remote_devices),
+            'devices': self.known_devices()
         }))
+        # Queued before the client is registered, so live batches follow the snapshot without a gap
+        self._send_history(client, self.known_devices())
+        client.start()
+        self.clients[websocket] = client
+        self.subscriptions_changed()
         try:
-            await websocket.wait_closed()
+            async for message in websocket:
+                self.handle_frontend_message(client, message)
+        except ConnectionClosed:
+            pass
         except Exception as e:
             logger.error(f"Frontend client error: {e}")
         finally:
-            self.clients.remove(websocket)
-            logger.info("Frontend client disconnected")
+            self.clients.pop(websocket, None)
+            self.subscriptions_changed()
+            await client.stop()
+            logger.info(f"Frontend client disconnected ({client.dropped} messages dropped)")
+
+    def _send_history(self, client: FrontendClient, device_ids: List[str]):
+        """Queue the recent trace of each device the client follows, one batch per device."""
+        for device_id in device_ids:
+            device = self.sessions.get(device_id) or self.remote_devices.get(device_id)
+            if device is None or device.history is None or not len(device.history) \
+                    or not client.is_subscribed(device_id):
+                continue
+            start_timestamp, values, anomalies = device.history.snapshot()
+            rate = device.history.output_rate
+            if client.binary:
+                client.enqueue(encode_frontend_frame(device_id, start_timestamp, 1.0 / rate, values, anomalies,
+                                                     history=True))
+            else:
+                client.enqueue(json.dumps({
+                    'type': 'history',
+                    'device_id': device_id,
+                    'start_timestamp': start_timestamp,
+                    'display_rate': rate,
+                    'values': values.tolist(),
+                    'anomalies': anomalies.tolist()
+                }))
+
+    def known_devices(self) -> List[str]:
+        """Every connected device, including those on other shards."""
+        return sorted(set(self.sessions) | set(self.remote_devices))
+
+    def devices_changed(self):
+        if self.bus is not None:
+            self.bus.publish_devices(list(self.sessions))
+
+    def subscriptions_changed(self):
+        if self.bus is not None:
+            self.bus.update_interest(self.clients.values())
 
-    async def broadcast_to_frontend(self, data: Dict[str, Any]):
+    def set_remote_devices(self, device_ids):
+        """Track the devices connected to other shards."""
+        for device_id in list(self.remote_devices):
+            if device_id not in device_ids:
+                del self.remote_devices[device_id]
+        for device_id in device_ids:
+            if device_id not in self.remote_devices:
+                self.remote_devices[device_id] = RemoteDevice(device_id, self._new_history())
+
+    def _remote_device(self, device_id: str) -> RemoteDevice:
+        device = self.remote_devices.get(device_id)
+        if device is None:
+            device = self.remote_devices[device_id] = RemoteDevice(device_id, self._new_history())
+        return device
+
+    def deliver_remote_samples(self, device_id: str, samples: np.ndarray, flags: np.ndarray):
+        """Fan out a processed batch published by the shard that owns ``device_id``."""
+        self.broadcast_samples(self._remote_device(device_id), samples, flags, publish=False)
+
+    def deliver_remote_history(self, device_id: str, values: np.ndarray, anomalies: np.ndarray):
+        """
+        Add history-rate points published by the shard that owns ``device_id``.
+
+        Every shard receives them, followed or not, so a dashboard connecting
+        here gets the device's recent trace. They are also the live stream for
+        this shard's clients at the history rate.
+        """
+        device = self._remote_device(device_id)
+        now = time.time()
+        device.history.append(values, anomalies, now)
+        followers = [client for client in self.clients.values()
+                     if client.is_subscribed(device_id) and client.display_rate == device.history.output_rate]
+        self._send_display_batch(followers, device_id, device.history.output_rate, values, anomalies, now)
+
+    def _fan_out(self, clients: List[FrontendClient], message, key=None):
+        for client in clients:
+            if not client.enqueue(message, key):
+                self.clients.pop(client.websocket, None)
+
+    def broadcast_to_frontend(self, data: Dict[str, Any], device_id: Optional[str] = None,
+                              publish: bool = True):
+        """
+        Queue a message for every frontend client following ``device_id`` (all clients if None).
+
+        The message is serialized once and handed to each client's queue without
+        waiting on any socket. In a cluster it is also published to the other
+        shards unless ``publish`` is False.
+        """
+        if publish and self.bus is not None:
+            self.bus.publish_message(data, device_id)
         if not self.clients:
             return
-        message = json.dumps(data)
-        dead_clients = set()
-        for client in self.clients:
-            try:
-                await client.send(message)
-            except Exception as e:
-                logger.error(f"Error broadcasting to client: {e}")
-                dead_clients.add(client)
-        self.clients -= dead_clients
+        followers = [client for client in self.clients.values() if client.is_subscribed(device_id)]
+        # Per-device messages supersede each other when a coalescing client falls behind
+        self._fan_out(followers, json.dumps(data), (data.get('type', 'data'), device_id))
+
+    def broadcast_samples(self, session: Union[DeviceSession, RemoteDevice], samples: np.ndarray, flags: np.ndarray,
+                          publish: bool = True):
+        """
+        Send a processed batch to the device's subscribers.
+
+        Each (display rate, encoding) stream is serialized once and shared by
+        every client on it. Raw JSON subscribers get one message per sample;
+        binary subscribers get one typed-array frame per batch; display-rate
+        subscribers get one min/max-decimated batch per rate.
+        """
+        device_id = session.device_id
+        if publish and self.bus is not None:
+            self.bus.publish_samples(device_id, samples, flags)
+        followers = [client for client in self.clients.values() if client.is_subscribed(device_id)]
+        now = time.time()
+
+        raw_clients = [client for client in followers if client.display_rate is None]
+        json_clients = [client for client in raw_clients if not client.binary]
+        if json_clients:
+            for ecg_value, is_anomaly in zip(samples.tolist(), flags.tolist()):
+                data_point = ECGDataPoint(
+                    timestamp=datetime.now().isoformat(),
+                    value=float(ecg_value),
+                    is_anomaly=is_anomaly,
+                    device_id=device_id
+                )
+                self._fan_out(json_clients, json.dumps(dataclasses.asdict(data_point)), ('data', device_id))
+        binary_clients = [client for client in raw_clients if client.binary]
+        if binary_clients:
+            period = 1.0 / self.SAMPLING_RATE
+            frame = encode_frontend_frame(device_id, now - period * (len(samples) - 1), period, samples, flags)
+            self._fan_out(binary_clients, frame, ('frame', device_id))
+
+        # A remote device's history is fed by its owning shard instead (deliver_remote_history)
+        history = session.history if isinstance(session, DeviceSession) else None
+        history_points = history.push(samples, flags, now) if history is not None else None
+        if publish and self.bus is not None and history_points is not None and len(history_points[0]):
+            self.bus.publish_history(device_id, *history_points, history.output_rate)
+        rates = {client.display_rate for client in followers if client.display_rate is not None}
+        if isinstance(session, RemoteDevice) and session.history is not None:
+            rates.discard(session.history.output_rate)
+        for rate in list(session.decimators):
+            if rate not in rates:
+                del session.decimators[rate]
+        for rate in rates:
+            if history is not None and rate == history.output_rate:
+                # Clients at the history rate share its points, so snapshots and live data line up
+                values, anomalies = history_points
+            else:
+                decimator = session.decimators.get(rate)
+                if decimator is None:
+                    decimator = session.decimators[rate] = MinMaxDecimator(self.SAMPLING_RATE, rate)
+                values, anomalies = decimator.push(samples, flags)
+            rate_clients = [client for client in followers if client.display_rate == rate]
+            self._send_display_batch(rate_clients, device_id, rate, values, anomalies, now)
+
+    def _send_display_batch(self, clients: List[FrontendClient], device_id: str, rate: float,
+                            values: np.ndarray, anomalies: np.ndarray, now: float):
+        """Send decimated points to the clients following a device at display rate ``rate``."""
+        if not len(values):
+            return
+        json_clients = [client for client in clients if not client.binary]
+        if json_clients:
+            message = json.dumps({
+                'type': 'data_batch',
+                'device_id': device_id,
+                'timestamp': datetime.now().isoformat(),
+                'display_rate': rate,
+                'values': values.tolist(),
+                'anomalies': anomalies.tolist()
+            })
+            self._fan_out(json_clients, message, ('data_batch', device_id))
+        binary_clients = [client for client in clients if client.binary]
+        if binary_clients:
+            period = 1.0 / rate
+            frame = encode_frontend_frame(device_id, now - period * (len(values) - 1), period, values, anomalies)
+            self._fan_out(binary_clients, frame, ('frame', device_id))
+
+    def report_timeouts(self, device_ids: List[str], publish: bool = True):
+        """Tell each frontend client, in one message, which of its devices timed out."""
+        if publish and self.bus is not None:
+            self.bus.publish_timeouts(device_ids)
+        groups: Dict[tuple, List[FrontendClient]] = {}
+        for client in self.clients.values():
+            followed = tuple(device_id for device_id in device_ids if client.is_subscribed(device_id))
+            if followed:
+                groups.setdefault(followed, []).append(client)
+        for followed, clients in groups.items():
+            message = {
+                'type': 'status',
+                'message': 'ESP8266 connection timeout',
+                'device_ids': list(followed)
+            }
+            if len(followed) == 1:
+                message['device_id'] = followed[0]
+            self._fan_out(clients, json.dumps(message), ('timeout', followed))
 
     async def monitor_esp_connection(self):
+        """Expire devices whose heartbeat deadline passed, sleeping until the next deadline."""
+        while True:
+            expired = self.heartbeats.expired()
+            if expired:
+                logger.warning("ESP8266 heartbeat timeout for %d devices: %s", len(expired), ', '.join(expired))
+                sessions = [self.sessions.pop(device_id) for device_id in expired if device_id in self.sessions]
+                self.devices_changed()
+                self.report_timeouts(expired)
+                # End each connection's receive loop; its handler flushes the recording, and a device
+                # reconnecting with the same id meanwhile keeps its new session
+                await asyncio.gather(*[
+                    session.websocket.close(1001, 'heartbeat timeout')
+                    for session in sessions if session.websocket is not None
+                ], return_exceptions=True)
+            next_deadline = self.heartbeats.next_deadline()
+            delay = self.ESP_TIMEOUT if next_deadline is None else next_deadline - time.monotonic()
+            # Never wake more often than every 50 ms, so deadlines close together are handled as one batch
+            await asyncio.sleep(max(delay, 0.05))
+
+    async def monitor_event_loop(self, interval: float = 0.1):
+        """Record how late the event loop wakes a sleeping task."""
+        loop = asyncio.get_running_loop()
         while True:
-            await asyncio.sleep(1)
-            if (self.esp_client and self.last_esp_heartbeat and 
-                (datetime.now().timestamp() - self.last_esp_heartbeat > self.ESP_TIMEOUT)):
-                logger.warning("ESP8266 heartbeat timeout")
-                await self.broadcast_to_frontend({
-                    'type': 'status',
-                    'message': 'ESP8266 connection timeout'
-                })
-                self.esp_client = None
-                self.last_esp_heartbeat = None
+            expected = loop.time() + interval
+            await asyncio.sleep(interval)
+            self.loop_lag.observe(max(loop.time() - expected, 0.0))
 
     async def start_server(self, host: str = '0.0.0.0', port: int = 8765):
         async def handler(websocket):
@@ -235,6 +899,8 @@ class ECGServer:
                     await self.handle_esp_connection(websocket)
                 elif protocol == 'frontend':
                     await self.handle_frontend_connection(websocket)
+                elif protocol == 'frontend.bin':
+                    await self.handle_frontend_connection(websocket, binary=True)
                 else:
                     # Default to frontend connection if no protocol specified
                     logger.info("No protocol specified, handling as frontend connection")
@@ -243,32 +909,133 @@ class ECGServer:
                 logger.error(f"Error handling connection: {e}")
                 await websocket.close(1011, "Internal server error")
 
-        # Update server to accept both 'esp' and 'frontend' protocols
+        for phase, seconds in list(self.startup_timings.items()):
+            self._record_startup_phase(phase, seconds)
+        metrics_server = None
+        if self.metrics_port is not None:
+            metrics_server = await serve_metrics(self.metrics, host, self.metrics_port)
+        started = time.perf_counter()
+        await self.backend.start()
+        self._record_startup_phase('backend_start', time.perf_counter() - started)
+        started = time.perf_counter()
+        await self.warm_up()
+        self._record_startup_phase('warm_up', time.perf_counter() - started)
+        started = time.perf_counter()
+
+        # Accept 'esp', 'frontend' (JSON) and 'frontend.bin' (binary sample frames) protocols
         server = await websockets.serve(
             handler, 
             host, 
             port, 
-            subprotocols=['esp', 'frontend']  # Now accepting both protocols
+            subprotocols=['esp', 'frontend.bin', 'frontend']  # Binary preferred when a client offers both
         )
-        logger.info(f"Server running on ws://{host}:{port}")
-        monitor_task = asyncio.create_task(self.monitor_esp_connection())
+        self._record_startup_phase('listen', time.perf_counter() - started)
+        logger.info(f"Server running on ws://{host}:{port}, ready {time.perf_counter() - self._created:.2f}s after construction "
+                    f"({', '.join(f'{phase} {seconds:.2f}s' for phase, seconds in self.startup_timings.items())})")
+        monitor_tasks = [
+            asyncio.create_task(self.monitor_esp_connection()),
+            asyncio.create_task(self.monitor_event_loop())
+        ]
+        if self.model_watch_interval:
+            monitor_tasks.append(asyncio.create_task(self.monitor_model_file()))
+        try:
+            # `kill -HUP` reloads the model from its current path
+            asyncio.get_running_loop().add_signal_handler(
+                signal.SIGHUP, lambda: asyncio.ensure_future(self.reload_model())
+            )
+        except (AttributeError, NotImplementedError, RuntimeError):
+            pass  # No SIGHUP on Windows, or not running in the main thread
         try:
             await asyncio.Future()  # run forever
         except asyncio.CancelledError:
-            monitor_task.cancel()
-            try:
-                await monitor_task
-            except asyncio.CancelledError:
-                pass
+            for task in monitor_tasks:
+                task.cancel()
+            await asyncio.gather(*monitor_tasks, return_exceptions=True)
         finally:
             server.close()
             await server.wait_closed()
+            if metrics_server is not None:
+                metrics_server.close()
+                await metrics_server.wait_closed()
+            if self.batcher is not None:
+                await self.batcher.close()
+            await self.backend.close()
+            if self.recorder is not None:
+                await asyncio.get_running_loop().run_in_executor(None, self.recorder.close)
 
-def main():
-    model_path = Path(r"C:\Users\moksh\classroom\test_ML_deepalert\test\models\gradientboosting_combined_model.joblib")
-    server = ECGServer(model_path)
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve ECG anomaly detection to ESP devices and dashboards")
+    parser.add_argument('--model', default='models/gradientboosting_combined_model.joblib', help="Trained model file")
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--metrics-port', type=int, default=None,
+                        help="Serve Prometheus metrics on this port (with --shards, shard i uses this port + i)")
+    parser.add_argument('--hop', type=int, default=25, help="Inference hop in samples")
+    parser.add_argument('--interval-ms', type=float, default=None,
+                        help="Score the newest window at most once per interval instead of every hop")
+    parser.add_argument('--backend', choices=(THREAD_BACKEND, PROCESS_BACKEND), default=THREAD_BACKEND,
+                        help="Score windows on threads or in worker processes")
+    parser.add_argument('--workers', type=int, default=None, help="Inference worker processes (default: CPU count)")
+    parser.add_argument('--runtime', choices=MODEL_RUNTIMES, default=SKLEARN_RUNTIME,
+                        help="How the model file is loaded (see src/models/runtime.py)")
+    parser.add_argument('--batch-max-size', type=int, default=64, help="Windows per batched model call")
+    parser.add_argument('--batch-wait-ms', type=float, default=5.0,
+                        help="Longest a window waits to join a batch (negative disables batching)")
+    parser.add_argument('--warmup-batch-sizes', type=int, nargs='*', default=[1, 2, 8, 32],
+                        help="Batch sizes scored before accepting connections")
+    parser.add_argument('--client-queue-size', type=int, default=1024, help="Messages queued per frontend client")
+    parser.add_argument('--overflow-policy', choices=OVERFLOW_POLICIES, default=DROP_OLDEST,
+                        help="What to do when a frontend client's queue is full")
+    parser.add_argument('--history-seconds', type=float, default=60.0, help="Trace sent to newly connected dashboards")
+    parser.add_argument('--history-rate', type=float, default=50.0, help="Points per second kept in that trace")
+    parser.add_argument('--recording-dir', default=None, help="Persist each device's raw stream in this directory")
+    parser.add_argument('--model-watch-interval', type=float, default=None,
+                        help="Seconds between checks of the model file for hot reload")
+    parser.add_argument('--diagnostic-log-interval', type=float, default=1.0,
+                        help="Seconds between repeats of the same per-sample diagnostic")
+    parser.add_argument('--beat-features', action='store_true',
+                        help="Detect beats and send their features to the frontend")
+    parser.add_argument('--shards', type=int, default=None,
+                        help="Run this many server processes behind the port (see src/server/cluster.py)")
+    parser.add_argument('--shard-base-port', type=int, default=18765)
+    parser.add_argument('--broker-port', type=int, default=18764)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    # Keep log formatting and I/O off the event loop
+    configure_queue_logging()
+    options = dict(
+        inference_hop=args.hop,
+        inference_interval_ms=args.interval_ms,
+        client_queue_size=args.client_queue_size,
+        client_overflow_policy=args.overflow_policy,
+        inference_backend=args.backend,
+        inference_workers=args.workers,
+        diagnostic_log_interval=args.diagnostic_log_interval,
+        recording_dir=args.recording_dir,
+        model_watch_interval=args.model_watch_interval,
+        history_seconds=args.history_seconds,
+        history_rate=args.history_rate,
+        warmup_batch_sizes=tuple(args.warmup_batch_sizes),
+        model_runtime=args.runtime,
+        batch_max_size=args.batch_max_size,
+        batch_max_wait=args.batch_wait_ms / 1000.0 if args.batch_wait_ms >= 0 else None,
+        beat_features=args.beat_features
+    )
     try:
-        asyncio.run(server.start_server())
+        if args.shards is not None:
+            from src.server.cluster import run_cluster
+
+            asyncio.run(run_cluster(
+                args.model, args.host, args.port, args.shards,
+                shard_base_port=args.shard_base_port, broker_port=args.broker_port,
+                metrics_port=args.metrics_port, server_options=options
+            ))
+        else:
+            server = ECGServer(args.model, metrics_port=args.metrics_port, **options)
+            asyncio.run(server.start_server(args.host, args.port))
     except KeyboardInterrupt:
         logger.info("Server shutdown requested")
     except Exception as e:
@@ -276,4 +1043,4 @@ def main():
         raise
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
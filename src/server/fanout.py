@@ -0,0 +1,121 @@
+import asyncio
+import logging
+from collections import deque
+from typing import Callable, Deque, Hashable, Optional, Set, Tuple
+
+from websockets.exceptions import ConnectionClosed
+
+logger = logging.getLogger(__name__)
+
+# What to do when a client's outgoing queue is full
+DROP_OLDEST = 'drop_oldest'  # Discard the oldest queued message
+COALESCE = 'coalesce'  # Replace the oldest queued message with the same key, else drop oldest
+DISCONNECT = 'disconnect'  # Close the connection of a client that cannot keep up
+OVERFLOW_POLICIES = (DROP_OLDEST, COALESCE, DISCONNECT)
+
+
+class FrontendClient:
+    """
+    A frontend connection with its own bounded outgoing queue and writer task.
+
+    ``enqueue`` never blocks, so producers (the ESP ingestion path) are never
+    held up by a slow dashboard; the writer task drains the queue into the
+    socket at whatever rate the client accepts.
+    """
+
+    def __init__(self, websocket, max_queue: int = 1024, overflow_policy: str = DROP_OLDEST,
+                 binary: bool = False):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow_policy}")
+        self.websocket = websocket
+        self.max_queue = max_queue
+        self.overflow_policy = overflow_policy
+        self.devices: Optional[Set[str]] = None  # Subscribed devices; None follows every device
+        self.display_rate: Optional[float] = None  # Decimated points per second; None for raw samples
+        self.binary = binary  # Receives sample batches as binary frames instead of JSON
+        self.dropped = 0
+        self.on_drop: Optional[Callable[[int], None]] = None  # Called with the number of messages dropped
+        self.closed = False
+        self._queue: Deque[Tuple[Optional[Hashable], object]] = deque()
+        self._ready = asyncio.Event()
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._queue)
+
+    def start(self):
+        self._task = asyncio.create_task(self._writer())
+
+    def is_subscribed(self, device_id: Optional[str]) -> bool:
+        return self.devices is None or device_id is None or device_id in self.devices
+
+    def enqueue(self, payload, key: Optional[Hashable] = None) -> bool:
+        """
+        Queue an already serialized message without waiting.
+
+        Args:
+            payload: str or bytes to send
+            key: Messages with the same key supersede each other under the coalesce policy
+
+        Returns:
+            False if the client is closed (or was disconnected by this call)
+        """
+        if self.closed:
+            return False
+        if len(self._queue) >= self.max_queue:
+            if self.overflow_policy == DISCONNECT:
+                logger.warning("Disconnecting frontend client that cannot keep up")
+                self._count_drops(len(self._queue) + 1)
+                self.close(1008, "Client too slow")
+                return False
+            self._count_drops(1)
+            if self.overflow_policy == COALESCE and key is not None:
+                for index, (queued_key, _) in enumerate(self._queue):
+                    if queued_key == key:
+                        del self._queue[index]
+                        break
+                else:
+                    self._queue.popleft()
+            else:
+                self._queue.popleft()
+        self._queue.append((key, payload))
+        self._ready.set()
+        return True
+
+    def _count_drops(self, count: int):
+        self.dropped += count
+        if self.on_drop is not None:
+            self.on_drop(count)
+
+    async def _writer(self):
+        try:
+            while True:
+                while not self._queue:
+                    self._ready.clear()
+                    await self._ready.wait()
+                _, payload = self._queue.popleft()
+                await self.websocket.send(payload)
+        except (ConnectionClosed, asyncio.CancelledError):
+            pass
+        except Exception as e:
+            logger.error(f"Error sending to frontend client: {e}")
+        finally:
+            self.closed = True
+            self._queue.clear()
+
+    def close(self, code: int = 1000, reason: str = ''):
+        """Stop sending and close the underlying connection in the background."""
+        if self.closed:
+            return
+        self.closed = True
+        self._queue.clear()
+        if self._task is not None:
+            self._task.cancel()
+        asyncio.ensure_future(self.websocket.close(code, reason))
+
+    async def stop(self):
+        """Cancel the writer task and wait for it to finish."""
+        self.closed = True
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
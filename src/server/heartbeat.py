@@ -0,0 +1,62 @@
+import heapq
+import time
+from typing import Dict, Hashable, List, Optional, Tuple
+
+
+class HeartbeatTracker:
+    """
+    Per-device heartbeat deadlines on monotonic time, kept in a min-heap.
+
+    ``touch`` is O(1) for a device that is already tracked: only its deadline
+    in the dictionary moves forward, and its heap entry is rescheduled lazily
+    when it reaches the top. Finding timeouts therefore costs O(log n) per
+    expired or rescheduled device instead of a scan over every session.
+    """
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self._deadlines: Dict[Hashable, float] = {}
+        self._heap: List[Tuple[float, int, Hashable]] = []
+        self._counter = 0  # Tie-breaker so keys never need to be comparable
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._deadlines
+
+    def _push(self, deadline: float, key: Hashable):
+        self._counter += 1
+        heapq.heappush(self._heap, (deadline, self._counter, key))
+
+    def touch(self, key: Hashable, now: Optional[float] = None):
+        """Record a heartbeat, pushing the key's deadline to now + timeout."""
+        now = time.monotonic() if now is None else now
+        tracked = key in self._deadlines
+        self._deadlines[key] = now + self.timeout
+        if not tracked:
+            self._push(now + self.timeout, key)
+
+    def remove(self, key: Hashable):
+        """Stop tracking a key; its heap entry is discarded when it surfaces."""
+        self._deadlines.pop(key, None)
+
+    def expired(self, now: Optional[float] = None) -> List[Hashable]:
+        """Remove and return every key whose deadline has passed."""
+        now = time.monotonic() if now is None else now
+        expired = []
+        while self._heap and self._heap[0][0] <= now:
+            deadline, _, key = heapq.heappop(self._heap)
+            current = self._deadlines.get(key)
+            if current is None:
+                continue  # Removed, or an older entry for a re-added key
+            if current > deadline:
+                self._push(current, key)  # Touched since this entry was queued
+                continue
+            del self._deadlines[key]
+            expired.append(key)
+        return expired
+
+    def next_deadline(self) -> Optional[float]:
+        """Earliest queued deadline (may be stale, i.e. earlier than the real one)."""
+        return self._heap[0][0] if self._heap else None
@@ -0,0 +1,60 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+from src.server.decimation import MinMaxDecimator
+from src.utils.ring_buffer import ECGRingBuffer
+
+
+class DeviceHistory:
+    """
+    Rolling display-resolution history of one device stream.
+
+    Samples are min/max-decimated to ``output_rate`` points per second and the
+    last ``seconds`` worth of points are kept, so a newly connected dashboard
+    can be sent the recent trace as a single batch. The decimated points are
+    also the live stream for clients at ``output_rate``, so a snapshot and the
+    batches that follow it join up without a gap or overlap.
+    """
+
+    def __init__(self, input_rate: float, output_rate: float, seconds: float):
+        self.decimator = MinMaxDecimator(input_rate, output_rate)
+        self.output_rate = output_rate
+        capacity = max(1, int(round(seconds * output_rate)))
+        self.values = ECGRingBuffer(capacity)
+        self.anomalies = ECGRingBuffer(capacity, dtype=bool)
+        self.last_timestamp: Optional[float] = None  # Time of the newest point
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    @property
+    def nbytes(self) -> int:
+        return self.values.nbytes + self.anomalies.nbytes
+
+    def push(self, samples: np.ndarray, flags: np.ndarray, now: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Decimate a batch into the history; returns the new points."""
+        values, anomalies = self.decimator.push(samples, flags)
+        self.append(values, anomalies, now)
+        return values, anomalies
+
+    def append(self, values: np.ndarray, anomalies: np.ndarray, now: float):
+        """Add points that are already decimated, e.g. another shard's history points."""
+        if len(values):
+            self.values.extend(values)
+            self.anomalies.extend(anomalies)
+            self.last_timestamp = now
+
+    def snapshot(self) -> Tuple[float, np.ndarray, np.ndarray]:
+        """
+        Copy out the held history.
+
+        Returns:
+            (start_timestamp, values, anomalies): unix time of the oldest point
+            and the points, oldest first
+        """
+        values = self.values.window().copy()
+        anomalies = self.anomalies.window().copy()
+        if not len(values):
+            return 0.0, values, anomalies
+        return self.last_timestamp - (len(values) - 1) / self.output_rate, values, anomalies
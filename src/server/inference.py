@@ -0,0 +1,369 @@
+"""
+Inference backends used by ECGServer to score detection windows.
+
+``ThreadInferenceBackend`` keeps the original behaviour (the event loop's
+default thread pool). ``ProcessInferenceBackend`` runs a pool of worker
+processes that each load the model once, so sklearn's GIL-bound per-call
+overhead is spread across cores. Windows are handed to workers through
+preallocated shared-memory slots instead of being pickled.
+
+Both backends can swap in a new model while serving (``reload``): the new
+model is loaded, warmed up and checked on canary windows first, and
+requests already submitted finish on the model they started with.
+
+Models run as loaded (``SKLEARN_RUNTIME``), compiled to flat arrays by
+src/models/compiled_trees.py (``COMPILED_RUNTIME``) or from their ONNX
+export (``ONNX_RUNTIME``); see src/models/runtime.py.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import resource_tracker, shared_memory, util
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from src.models.prediction import PredictionResult, predict_with_proba
+from src.models.runtime import SKLEARN_RUNTIME, load_model_file
+
+logger = logging.getLogger(__name__)
+
+THREAD_BACKEND = 'thread'
+PROCESS_BACKEND = 'process'
+
+def validate_model(model, canary: np.ndarray, threshold: float) -> PredictionResult:
+    """
+    Warm a freshly loaded model up and check it gives usable results on canary windows.
+
+    Raises:
+        ValueError: If the model expects a different window size or returns
+            probabilities of the wrong shape or outside [0, 1].
+    """
+    expected = getattr(model, 'n_features_in_', None)
+    if expected is not None and expected != canary.shape[1]:
+        raise ValueError(f"Model expects {expected} values per window, server sends {canary.shape[1]}")
+    # Run both the single-window and the batch path once so their first real call is not slow
+    predict_with_proba(model, canary[:1], threshold)
+    result = predict_with_proba(model, canary, threshold)
+    probabilities = np.asarray(result.probabilities)
+    if probabilities.shape != (len(canary),):
+        raise ValueError(f"Expected {len(canary)} probabilities, got shape {probabilities.shape}")
+    if not np.all(np.isfinite(probabilities)) or probabilities.min() < 0 or probabilities.max() > 1:
+        raise ValueError("Model returned probabilities outside [0, 1]")
+    return result
+
+
+def load_validated_model(model_path, canary: np.ndarray, threshold: float, runtime: str = SKLEARN_RUNTIME):
+    """Load a model file and validate it with validate_model."""
+    model = load_model_file(model_path, runtime)
+    validate_model(model, canary, threshold)
+    return model
+
+
+def _timed_predict(model, X, threshold) -> Tuple[float, PredictionResult]:
+    """Predict and report the monotonic time at which the work actually started."""
+    return time.monotonic(), predict_with_proba(model, X, threshold)
+
+
+class ThreadInferenceBackend:
+    """Score windows with an in-process model on the default executor."""
+
+    def __init__(self, model, runtime: str = SKLEARN_RUNTIME):
+        self.model = model
+        self.runtime = runtime  # Used to load replacement models
+        # Called with the seconds each request waited before a thread picked it up
+        self.queue_wait_observer: Optional[Callable[[float], None]] = None
+
+    async def start(self):
+        pass
+
+    async def predict(self, X: np.ndarray, threshold: float) -> PredictionResult:
+        submitted = time.monotonic()
+        started, result = await asyncio.get_running_loop().run_in_executor(
+            None, _timed_predict, self.model, X, threshold
+        )
+        if self.queue_wait_observer is not None:
+            self.queue_wait_observer(started - submitted)
+        return result
+
+    async def reload(self, model_path, canary: np.ndarray, threshold: float):
+        """Load and validate a model on a worker thread, then swap it in."""
+        model = await asyncio.get_running_loop().run_in_executor(
+            None, load_validated_model, model_path, canary, threshold, self.runtime
+        )
+        # Requests already handed to the executor keep the model they were given
+        self.model = model
+
+    async def close(self):
+        pass
+
+
+# Worker-process state: the model is loaded once per worker by _init_worker
+_worker_model = None
+_worker_segments: Dict[str, shared_memory.SharedMemory] = {}
+
+
+def _init_worker(model_path: str, runtime: str):
+    global _worker_model
+    _worker_model = load_model_file(model_path, runtime)
+    # Runs when the worker exits (pool shutdown, restart or reload)
+    util.Finalize(None, _close_worker_segments, exitpriority=10)
+
+
+def _attach_segment(name: str) -> shared_memory.SharedMemory:
+    """
+    Attach to a slot created by the parent without registering it with the resource tracker.
+
+    Workers share the parent's tracker, which would otherwise report the
+    parent's own slots as leaked; only the parent creates and unlinks them.
+    """
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def _close_worker_segments():
+    for segment in _worker_segments.values():
+        try:
+            segment.close()
+        except BufferError:
+            pass  # Still viewed by an array; the mapping goes away with the process
+    _worker_segments.clear()
+
+
+def _worker_ping() -> int:
+    return os.getpid()
+
+
+def _worker_validate(canary: np.ndarray, threshold: float) -> int:
+    validate_model(_worker_model, canary, threshold)
+    return os.getpid()
+
+
+def _worker_predict(segment_name: str, rows: int, cols: int,
+                    threshold: float) -> Tuple[float, PredictionResult]:
+    started = time.monotonic()
+    segment = _worker_segments.get(segment_name)
+    if segment is None:
+        segment = _worker_segments[segment_name] = _attach_segment(segment_name)
+    X = np.ndarray((rows, cols), dtype=np.float32, buffer=segment.buf)
+    return started, predict_with_proba(_worker_model, X, threshold)
+
+
+class _PoolRestarted(Exception):
+    """A call was still queued on a worker pool when the pool was restarted."""
+
+
+async def _run_in_pool(executor: ProcessPoolExecutor, fn, *args):
+    """
+    Await ``fn(*args)`` on a worker pool.
+
+    Unlike ``loop.run_in_executor``, a call cancelled by shutting the pool down
+    raises _PoolRestarted rather than CancelledError, so it cannot be mistaken
+    for the caller being cancelled.
+    """
+    loop = asyncio.get_running_loop()
+    waiter = loop.create_future()
+
+    def transfer(done):
+        if waiter.done():
+            return
+        if done.cancelled():
+            waiter.set_exception(_PoolRestarted())
+        elif done.exception() is not None:
+            waiter.set_exception(done.exception())
+        else:
+            waiter.set_result(done.result())
+
+    def on_done(done):
+        if not loop.is_closed():
+            loop.call_soon_threadsafe(transfer, done)
+
+    future = executor.submit(fn, *args)
+    future.add_done_callback(on_done)
+    try:
+        return await waiter
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+
+
+class ProcessInferenceBackend:
+    """
+    Score windows in a pool of worker processes.
+
+    Args:
+        model_path: Model file each worker loads at start-up
+        workers: Number of worker processes (defaults to the CPU count)
+        feature_count: Values per window
+        max_rows: Windows per shared-memory slot; larger batches are split
+        health_interval: Seconds between worker health checks
+        health_timeout: Seconds a health check may take before the pool is restarted; while windows
+            are being scored, seconds without any window completing
+        reload_timeout: Seconds a replacement pool may take to load and validate a model
+        runtime: One of MODEL_RUNTIMES
+    """
+
+    def __init__(self, model_path, workers: Optional[int] = None, feature_count: int = 95,
+                 max_rows: int = 256, health_interval: float = 5.0, health_timeout: float = 10.0,
+                 reload_timeout: float = 120.0, runtime: str = SKLEARN_RUNTIME):
+        self.model_path = str(model_path)
+        self.workers = workers or os.cpu_count() or 1
+        self.feature_count = feature_count
+        self.max_rows = max_rows
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.reload_timeout = reload_timeout
+        self.runtime = runtime
+        self.restarts = 0
+        # Called with the seconds each request waited for a slot and a free worker
+        self.queue_wait_observer: Optional[Callable[[float], None]] = None
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._segments: List[shared_memory.SharedMemory] = []
+        self._free_slots: Optional[asyncio.Queue] = None
+        self._health_task: Optional[asyncio.Task] = None
+        self._in_flight = 0  # Chunks submitted to the pool and not finished yet
+        self._last_progress = time.monotonic()  # When a chunk last finished, or the pool last went busy
+
+    def _new_executor(self, model_path: Optional[str] = None) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(model_path or self.model_path, self.runtime)
+        )
+
+    async def start(self):
+        slot_bytes = self.max_rows * self.feature_count * np.dtype(np.float32).itemsize
+        self._free_slots = asyncio.Queue()
+        # Two slots per worker keeps every worker busy while the next batch is copied in
+        for _ in range(2 * self.workers):
+            segment = shared_memory.SharedMemory(create=True, size=slot_bytes)
+            self._segments.append(segment)
+            self._free_slots.put_nowait(segment)
+        self._executor = self._new_executor()
+        await self._ping_workers()
+        self._health_task = asyncio.create_task(self._monitor_health())
+        logger.info(f"Started {self.workers} inference worker processes")
+
+    async def _ping_workers(self):
+        loop = asyncio.get_running_loop()
+        await asyncio.wait_for(
+            asyncio.gather(*[loop.run_in_executor(self._executor, _worker_ping) for _ in range(self.workers)]),
+            self.health_timeout
+        )
+
+    def _restart(self, reason: str):
+        logger.error(f"Restarting inference workers: {reason}")
+        self.restarts += 1
+        self._last_progress = time.monotonic()
+        old_executor, self._executor = self._executor, self._new_executor()
+        # Windows still queued on the old pool are cancelled there and resubmitted by _predict_chunk
+        old_executor.shutdown(wait=False, cancel_futures=True)
+
+    async def reload(self, model_path, canary: np.ndarray, threshold: float):
+        """
+        Start a pool on the new model, validate it in the workers, then swap pools.
+
+        The old pool is shut down without cancelling anything, so windows
+        already submitted to it finish on the old model.
+        """
+        model_path = str(model_path)
+        executor = self._new_executor(model_path)
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.wait_for(asyncio.gather(*[
+                loop.run_in_executor(executor, _worker_validate, canary, threshold)
+                for _ in range(self.workers)
+            ]), self.reload_timeout)
+        except BrokenProcessPool as e:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise RuntimeError(f"Inference workers could not load {model_path} (see worker log)") from e
+        except BaseException:
+            executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        old_executor, self._executor = self._executor, executor
+        self.model_path = model_path
+        old_executor.shutdown(wait=False)
+
+    async def _monitor_health(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await self._check_health()
+
+    async def _check_health(self):
+        if self._in_flight:
+            # A ping would queue behind the windows, so judge a busy pool by whether windows complete
+            if time.monotonic() - self._last_progress > self.health_timeout:
+                self._restart(f"no window scored for {self.health_timeout:.0f}s")
+            return
+        try:
+            await self._ping_workers()
+        except (BrokenProcessPool, asyncio.TimeoutError) as e:
+            self._restart(f"health check failed ({type(e).__name__})")
+
+    async def _predict_chunk(self, X: np.ndarray, threshold: float) -> PredictionResult:
+        submitted = time.monotonic()
+        segment = await self._free_slots.get()
+        try:
+            rows, cols = X.shape
+            np.ndarray((rows, cols), dtype=np.float32, buffer=segment.buf)[:] = X
+            crashed = False
+            while True:
+                executor = self._executor
+                if not self._in_flight:
+                    self._last_progress = time.monotonic()
+                self._in_flight += 1
+                try:
+                    started, result = await _run_in_pool(
+                        executor, _worker_predict, segment.name, rows, cols, threshold
+                    )
+                    self._last_progress = time.monotonic()
+                except _PoolRestarted:
+                    continue
+                except BrokenProcessPool:
+                    if crashed:
+                        raise
+                    crashed = True
+                    if executor is self._executor:  # Concurrent failures restart the pool only once
+                        self._restart("worker crashed")
+                    continue
+                finally:
+                    self._in_flight -= 1
+                if self.queue_wait_observer is not None:
+                    self.queue_wait_observer(started - submitted)
+                return result
+        finally:
+            self._free_slots.put_nowait(segment)
+
+    async def predict(self, X: np.ndarray, threshold: float) -> PredictionResult:
+        X = np.asarray(X, dtype=np.float32)
+        if X.shape[1] != self.feature_count:
+            raise ValueError(f"Expected {self.feature_count} values per window, got {X.shape[1]}")
+        chunks = await asyncio.gather(*[
+            self._predict_chunk(X[start:start + self.max_rows], threshold)
+            for start in range(0, len(X), self.max_rows)
+        ])
+        return PredictionResult(
+            labels=np.concatenate([chunk.labels for chunk in chunks]),
+            probabilities=np.concatenate([chunk.probabilities for chunk in chunks]),
+            threshold=threshold
+        )
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+        for segment in self._segments:
+            segment.close()
+            segment.unlink()
+        self._segments.clear()
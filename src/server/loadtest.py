@@ -0,0 +1,381 @@
+"""
+Load-test harness for ECGServer.
+
+Starts a server (as a subprocess by default, so client load does not skew
+its event loop) and drives it with N synthetic ESP devices replaying
+MISimulator signals, plus M frontend subscribers. Server-side figures come
+from the Prometheus endpoint, scraped before and after the measured period.
+
+Run from the repository root:
+
+    python -m src.server.loadtest --model models/gradientboosting_combined_model.joblib \\
+        --devices 50 --frontends 5 --speed 4 --duration 30
+"""
+import argparse
+import asyncio
+import json
+import logging
+import random
+import re
+import signal
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import websockets
+
+from mi_simulator import MISimulator
+from src.models.runtime import MODEL_RUNTIMES
+from src.server.metrics import Histogram
+from src.server.protocol import decode_frontend_frame, encode_esp_frame
+
+logger = logging.getLogger(__name__)
+
+_SAMPLE_LINE = re.compile(r'^([a-zA-Z_:][\w:]*)(?:\{(.*)\})?\s+(\S+)$')
+_LABEL = re.compile(r'(\w+)="([^"]*)"')
+
+Scrape = Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float]
+
+
+def parse_prometheus(text: str) -> Scrape:
+    """Parse Prometheus text format into {(name, sorted labels): value}."""
+    values = {}
+    for line in text.splitlines():
+        match = _SAMPLE_LINE.match(line)
+        if match is None:
+            continue
+        name, labels, value = match.groups()
+        values[(name, tuple(sorted(_LABEL.findall(labels or ''))))] = float(value)
+    return values
+
+
+def _counter_delta(before: Scrape, after: Scrape, name: str) -> float:
+    return sum(value - before.get(key, 0.0) for key, value in after.items() if key[0] == name)
+
+
+def histogram_delta(before: Scrape, after: Scrape, name: str, **labels) -> Histogram:
+    """Rebuild the histogram of observations made between two scrapes."""
+    wanted = set(labels.items())
+    cumulative = {}
+    for key, value in after.items():
+        if key[0] != f'{name}_bucket' or not wanted <= set(key[1]):
+            continue
+        bound = float(dict(key[1])['le'])
+        cumulative[bound] = cumulative.get(bound, 0.0) + value - before.get(key, 0.0)
+    bounds = sorted(cumulative)
+    histogram = Histogram([bound for bound in bounds if bound != float('inf')])
+    previous = 0.0
+    for slot, bound in enumerate(bounds):
+        histogram.counts[slot] = int(cumulative[bound] - previous)
+        previous = cumulative[bound]
+    histogram.count = int(previous)
+    return histogram
+
+
+async def scrape_metrics(host: str, port: int) -> Scrape:
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f'GET /metrics HTTP/1.1\r\nHost: {host}\r\nConnection: close\r\n\r\n'.encode('latin-1'))
+    response = await reader.read()
+    writer.close()
+    return parse_prometheus(response.split(b'\r\n\r\n', 1)[1].decode('utf-8'))
+
+
+def simulate_traces(count: int, seconds: float, sampling_rate: int, mi_fraction: float) -> List[np.ndarray]:
+    """Pre-generate ADC traces so replaying them costs no simulation time."""
+    traces = []
+    for number in range(count):
+        simulator = MISimulator(sampling_rate)
+        length = int(seconds * sampling_rate)
+        with_mi = number < round(count * mi_fraction)
+        signal = np.empty(length)
+        for i in range(length):
+            if with_mi and i == length // 2:
+                simulator.start_mi_episode()
+            signal[i] = simulator.generate_ecg_sample()
+        # Map the simulator's millivolt-scale output into the 10-bit ADC range
+        traces.append(np.clip(np.rint(512 + 200 * signal), 0, 1023).astype(np.uint16))
+    return traces
+
+
+class LoadStats:
+    """Client-side counters shared by every simulated connection."""
+
+    def __init__(self):
+        self.sent_samples = 0
+        self.late_sends = 0
+        self.frames_received = 0
+        self.samples_received = 0
+        self.messages_received = defaultdict(int)
+        self.delivery_latency: List[float] = []
+        self.connection_errors = 0
+
+
+async def run_device(url: str, device_id: str, trace: np.ndarray, batch: int, period: float,
+                     encoding: str, stop_at: float, stats: LoadStats):
+    """Replay a trace as one ESP device, on an absolute schedule so slow sends show up as lateness."""
+    try:
+        async with websockets.connect(f'{url}/?device_id={device_id}', subprotocols=['esp']) as websocket:
+            position = random.randrange(len(trace))
+            sequence = 0
+            started = time.monotonic()
+            while True:
+                due = started + sequence * period
+                now = time.monotonic()
+                if now >= stop_at:
+                    break
+                if due > now:
+                    await asyncio.sleep(due - now)
+                elif now - due > period:
+                    stats.late_sends += 1
+                samples = np.take(trace, range(position, position + batch), mode='wrap')
+                position = (position + batch) % len(trace)
+                if encoding == 'binary':
+                    await websocket.send(encode_esp_frame(samples, sequence, int(due * 1000)))
+                else:
+                    for value in samples.tolist():
+                        await websocket.send(json.dumps({'type': 'data', 'value': value}))
+                stats.sent_samples += batch
+                sequence += 1
+    except Exception as e:
+        stats.connection_errors += 1
+        logger.error(f"Device {device_id} failed: {e}")
+
+
+async def run_frontend(url: str, display_rate, stop_at: float, stats: LoadStats):
+    """Subscribe to every device and time how long each binary frame took to arrive."""
+    query = f'/?rate={display_rate}' if display_rate else '/'
+    try:
+        async with websockets.connect(f'{url}{query}', subprotocols=['frontend.bin'], max_queue=None) as websocket:
+            while True:
+                remaining = stop_at - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    message = await asyncio.wait_for(websocket.recv(), remaining)
+                except asyncio.TimeoutError:
+                    break
+                received = time.time()
+                if isinstance(message, bytes):
+                    frame = decode_frontend_frame(message)
+                    stats.frames_received += 1
+                    stats.samples_received += len(frame.values)
+                    # Frames are stamped with the server clock when they were queued
+                    sent = frame.start_timestamp + frame.sample_period * (len(frame.values) - 1)
+                    stats.delivery_latency.append(received - sent)
+                else:
+                    stats.messages_received[json.loads(message).get('type')] += 1
+    except Exception as e:
+        stats.connection_errors += 1
+        logger.error(f"Frontend client failed: {e}")
+
+
+def serve(args):
+    """Entry point for the server subprocess."""
+    from src.server.ecg_server import ECGServer
+    from src.server.logging_setup import configure_queue_logging
+
+    configure_queue_logging()
+    logging.getLogger().setLevel(logging.WARNING)
+    server = ECGServer(
+        args.model,
+        inference_hop=args.hop,
+        inference_backend=args.backend,
+        inference_workers=args.workers,
+        metrics_port=args.metrics_port,
+        model_runtime=args.runtime,
+        batch_max_size=args.batch_max_size,
+        batch_max_wait=_batch_max_wait(args),
+    )
+    try:
+        asyncio.run(server.start_server(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+def _batch_max_wait(args) -> Optional[float]:
+    return args.batch_wait_ms / 1000.0 if args.batch_wait_ms >= 0 else None
+
+
+async def wait_for_port(host: str, port: int, timeout: float):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            _, writer = await asyncio.open_connection(host, port)
+            writer.close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Server did not start listening on {host}:{port}")
+            await asyncio.sleep(0.2)
+
+
+def _percentiles(values, quantiles=(50, 95, 99)) -> Dict[str, float]:
+    if not len(values):
+        return {f'p{q}': 0.0 for q in quantiles}
+    return {f'p{q}': float(v) for q, v in zip(quantiles, np.percentile(values, quantiles))}
+
+
+def _histogram_percentiles(histogram: Histogram, quantiles=(50, 95, 99)) -> Dict[str, float]:
+    return {f'p{q}': histogram.quantile(q / 100) for q in quantiles}
+
+
+async def run_load(args) -> dict:
+    url = f'ws://{args.host}:{args.port}'
+    server_process = None
+    server_task = None
+    if args.in_process:
+        from src.server.ecg_server import ECGServer
+        server = ECGServer(args.model, inference_hop=args.hop, inference_backend=args.backend,
+                           inference_workers=args.workers, metrics_port=args.metrics_port,
+                           model_runtime=args.runtime, batch_max_size=args.batch_max_size,
+                           batch_max_wait=_batch_max_wait(args))
+        server_task = asyncio.create_task(server.start_server(args.host, args.port))
+    else:
+        server_process = subprocess.Popen([
+            sys.executable, '-m', 'src.server.loadtest', '--serve',
+            '--model', args.model, '--host', args.host, '--port', str(args.port),
+            '--metrics-port', str(args.metrics_port), '--hop', str(args.hop),
+            '--backend', args.backend, '--runtime', args.runtime,
+            '--batch-max-size', str(args.batch_max_size), '--batch-wait-ms', str(args.batch_wait_ms),
+        ] + (['--workers', str(args.workers)] if args.workers else []))
+
+    try:
+        await wait_for_port(args.host, args.metrics_port, args.startup_timeout)
+        await wait_for_port(args.host, args.port, args.startup_timeout)
+
+        traces = simulate_traces(min(args.devices, args.traces), args.trace_seconds,
+                                 args.sampling_rate, args.mi_fraction)
+        stats = LoadStats()
+        period = args.batch / (args.sampling_rate * args.speed)
+        stop_at = time.monotonic() + args.warmup + args.duration
+        tasks = [asyncio.create_task(run_frontend(url, args.display_rate, stop_at, stats))
+                 for _ in range(args.frontends)]
+        for number in range(args.devices):
+            tasks.append(asyncio.create_task(run_device(
+                url, f'load-{number}', traces[number % len(traces)], args.batch, period,
+                args.encoding, stop_at, stats
+            )))
+
+        await asyncio.sleep(args.warmup)
+        before = await scrape_metrics(args.host, args.metrics_port)
+        sent_before, received_before = stats.sent_samples, stats.samples_received
+        latency_before = len(stats.delivery_latency)
+        measured_from = time.monotonic()
+        await asyncio.sleep(max(stop_at - measured_from - 0.1, 0))
+        after = await scrape_metrics(args.host, args.metrics_port)
+        elapsed = time.monotonic() - measured_from
+        await asyncio.gather(*tasks)
+    finally:
+        if server_task is not None:
+            server_task.cancel()
+            await asyncio.gather(server_task, return_exceptions=True)
+        if server_process is not None:
+            # SIGINT lets the server shut its inference worker processes down; SIGTERM would orphan them
+            server_process.send_signal(signal.SIGINT)
+            try:
+                server_process.wait(timeout=30)
+            except subprocess.TimeoutExpired:
+                server_process.kill()
+                server_process.wait()
+
+    def rate(name):
+        return _counter_delta(before, after, name) / elapsed
+
+    return {
+        'config': {key: value for key, value in vars(args).items() if key != 'serve'},
+        'elapsed_seconds': elapsed,
+        'offered_samples_per_second': (stats.sent_samples - sent_before) / elapsed,
+        'ingested_samples_per_second': rate('ecg_samples_total'),
+        'delivered_samples_per_second': (stats.samples_received - received_before) / elapsed,
+        'windows_scored_per_second': rate('ecg_windows_scored_total'),
+        'windows_skipped': _counter_delta(before, after, 'ecg_windows_skipped_total'),
+        'dropped_messages': _counter_delta(before, after, 'ecg_dropped_messages_total'),
+        'alerts': _counter_delta(before, after, 'ecg_alerts_total'),
+        'late_sends': stats.late_sends,
+        'connection_errors': stats.connection_errors,
+        'event_loop_lag_seconds': _histogram_percentiles(
+            histogram_delta(before, after, 'ecg_event_loop_lag_seconds')),
+        'inference_latency_seconds': _histogram_percentiles(
+            histogram_delta(before, after, 'ecg_stage_latency_seconds', stage='inference')),
+        'queue_wait_seconds': _histogram_percentiles(
+            histogram_delta(before, after, 'ecg_stage_latency_seconds', stage='queue_wait')),
+        'batch_wait_seconds': _histogram_percentiles(
+            histogram_delta(before, after, 'ecg_stage_latency_seconds', stage='batch_wait')),
+        'batch_windows': _histogram_percentiles(histogram_delta(before, after, 'ecg_inference_batch_windows')),
+        'delivery_latency_seconds': _percentiles(stats.delivery_latency[latency_before:]),
+    }
+
+
+def print_report(results: dict):
+    config = results['config']
+    print(f"\n{config['devices']} devices x {config['speed']}x real time, {config['frontends']} frontends, "
+          f"{config['backend']} backend, {config['runtime']} runtime, {results['elapsed_seconds']:.1f}s measured")
+    for key in ('offered_samples_per_second', 'ingested_samples_per_second',
+                'delivered_samples_per_second', 'windows_scored_per_second'):
+        print(f"  {key.replace('_', ' '):<32} {results[key]:>12.1f}")
+    for key in ('windows_skipped', 'dropped_messages', 'alerts', 'late_sends', 'connection_errors'):
+        print(f"  {key.replace('_', ' '):<32} {results[key]:>12.0f}")
+    for key in ('event_loop_lag_seconds', 'inference_latency_seconds', 'batch_wait_seconds',
+                'queue_wait_seconds', 'delivery_latency_seconds'):
+        percentiles = '  '.join(f"{name} {value * 1000:8.2f} ms" for name, value in results[key].items())
+        print(f"  {key.replace('_seconds', '').replace('_', ' '):<32} {percentiles}")
+    percentiles = '  '.join(f"{name} {value:8.0f}   " for name, value in results['batch_windows'].items())
+    print(f"  {'batch windows':<32} {percentiles}")
+    print("  (server-side percentiles are histogram bucket upper bounds)")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Drive ECGServer with synthetic ESP devices and frontends")
+    parser.add_argument('--model', required=True, help="Model file passed to ECGServer")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--metrics-port', type=int, default=9100)
+    parser.add_argument('--devices', type=int, default=10, help="Simulated ESP connections")
+    parser.add_argument('--frontends', type=int, default=1, help="Frontend subscribers to every device")
+    parser.add_argument('--display-rate', type=float, default=None,
+                        help="Frontend display rate in Hz (raw samples if unset)")
+    parser.add_argument('--speed', type=float, default=1.0, help="Multiple of real-time sample rate")
+    parser.add_argument('--batch', type=int, default=25, help="Samples per ESP frame")
+    parser.add_argument('--encoding', choices=('binary', 'json'), default='binary',
+                        help="ESP wire format: binary frames or one JSON message per sample")
+    parser.add_argument('--sampling-rate', type=int, default=250)
+    parser.add_argument('--duration', type=float, default=30.0, help="Measured seconds")
+    parser.add_argument('--warmup', type=float, default=5.0, help="Seconds of load before measuring")
+    parser.add_argument('--traces', type=int, default=8, help="Distinct simulated signals to share between devices")
+    parser.add_argument('--trace-seconds', type=float, default=30.0)
+    parser.add_argument('--mi-fraction', type=float, default=0.25,
+                        help="Fraction of traces that switch to an MI pattern halfway through")
+    parser.add_argument('--hop', type=int, default=25, help="ECGServer inference hop in samples")
+    parser.add_argument('--backend', choices=('thread', 'process'), default='thread')
+    parser.add_argument('--runtime', choices=MODEL_RUNTIMES, default='sklearn',
+                        help="How the model file is loaded (see src/models/runtime.py)")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--batch-max-size', type=int, default=64, help="Windows per batched model call")
+    parser.add_argument('--batch-wait-ms', type=float, default=5.0,
+                        help="Longest a window waits to join a batch (negative disables batching)")
+    parser.add_argument('--in-process', action='store_true',
+                        help="Run the server in the harness's event loop instead of a subprocess")
+    parser.add_argument('--startup-timeout', type=float, default=60.0)
+    parser.add_argument('--output', help="Also write the results as JSON to this file")
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.serve:
+        serve(args)
+        return
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    results = asyncio.run(run_load(args))
+    print_report(results)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""
+Logging helpers that keep log formatting and I/O off the ingestion hot path.
+
+``configure_queue_logging`` moves the root logger's handlers behind a queue
+drained by a background thread, so the event loop only enqueues records.
+``RateLimitedLog`` throttles per-sample/per-window diagnostics and skips
+argument formatting entirely when the level is disabled.
+"""
+import atexit
+import logging
+import queue
+import time
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure_queue_logging(max_queue: int = 10000,
+                            logger: Optional[logging.Logger] = None) -> QueueListener:
+    """
+    Route a logger's records through a queue to a background handler thread.
+
+    The logger's existing handlers (e.g. from logging.basicConfig) are moved
+    behind a QueueListener; only a non-blocking QueueHandler stays attached.
+
+    Returns:
+        The started listener (stopped automatically at interpreter exit)
+    """
+    logger = logger or logging.getLogger()
+    handlers = logger.handlers[:] or [logging.StreamHandler()]
+    for handler in logger.handlers[:]:
+        logger.removeHandler(handler)
+    log_queue = queue.Queue(max_queue)
+    logger.addHandler(NonBlockingQueueHandler(log_queue))
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(_stop_listener, listener)
+    return listener
+
+
+def _stop_listener(listener: QueueListener):
+    # QueueListener.stop() fails if the listener was already stopped by the caller
+    if listener._thread is not None:
+        listener.stop()
+
+
+class RateLimitedLog:
+    """
+    Emit at most one record per ``interval`` seconds for each message template.
+
+    Messages use %-style arguments so nothing is formatted unless the record is
+    actually emitted; the next emitted record reports how many were suppressed.
+    """
+
+    def __init__(self, logger: logging.Logger, interval: float = 1.0):
+        self.logger = logger
+        self.interval = interval
+        self._state: Dict[str, Tuple[float, int]] = {}
+
+    def log(self, level: int, msg: str, *args):
+        if not self.logger.isEnabledFor(level):
+            return
+        now = time.monotonic()
+        last, suppressed = self._state.get(msg, (None, 0))
+        if last is not None and now - last < self.interval:
+            self._state[msg] = (last, suppressed + 1)
+            return
+        self._state[msg] = (now, 0)
+        if suppressed:
+            msg += ' (%d similar messages suppressed)'
+            args += (suppressed,)
+        self.logger.log(level, msg, *args, stacklevel=3)
+
+    def debug(self, msg: str, *args):
+        self.log(logging.DEBUG, msg, *args)
+
+    def info(self, msg: str, *args):
+        self.log(logging.INFO, msg, *args)
+
+    def warning(self, msg: str, *args):
+        self.log(logging.WARNING, msg, *args)
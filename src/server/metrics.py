@@ -0,0 +1,163 @@
+"""
+Lightweight in-process metrics with a Prometheus text-format HTTP endpoint.
+
+Recording a value is a few integer/float operations (a bisect for
+histograms), cheap enough to leave on for every batch in production.
+"""
+import asyncio
+import bisect
+import logging
+from typing import Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from 50 us to 5 s
+DEFAULT_LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+    0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+
+def _format_labels(labels: LabelSet, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{value}"' for key, value in pairs) + '}'
+
+
+class Counter:
+    """Monotonically increasing count."""
+    kind = 'counter'
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def samples(self, name: str, labels: LabelSet):
+        yield f'{name}{_format_labels(labels)} {self.value}'
+
+
+class Gauge:
+    """Point-in-time value, either set explicitly or read from a callback at scrape time."""
+    kind = 'gauge'
+
+    def __init__(self, callback: Optional[Callable[[], float]] = None):
+        self.value = 0.0
+        self.callback = callback
+
+    def set(self, value: float):
+        self.value = value
+
+    def samples(self, name: str, labels: LabelSet):
+        value = self.callback() if self.callback is not None else self.value
+        yield f'{name}{_format_labels(labels)} {value}'
+
+
+class Histogram:
+    """Cumulative-bucket histogram, as in the Prometheus data model."""
+    kind = 'histogram'
+
+    def __init__(self, buckets=DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # Last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, q: float) -> float:
+        """Approximate quantile (upper bound of the bucket holding it)."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            if cumulative >= target:
+                return bound
+        return float('inf')
+
+    def samples(self, name: str, labels: LabelSet):
+        cumulative = 0
+        for bound, count in zip(self.buckets, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{_format_labels(labels, ("le", repr(bound)))} {cumulative}'
+        yield f'{name}_bucket{_format_labels(labels, ("le", "+Inf"))} {self.count}'
+        yield f'{name}_sum{_format_labels(labels)} {self.sum}'
+        yield f'{name}_count{_format_labels(labels)} {self.count}'
+
+
+class MetricsRegistry:
+    """Named metrics, optionally split by labels, rendered in Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Dict[LabelSet, object]] = {}
+        self._help: Dict[str, str] = {}
+
+    def _get(self, factory, name: str, help_text: str, labels: Optional[Dict[str, str]], **kwargs):
+        label_set = tuple(sorted((labels or {}).items()))
+        family = self._metrics.setdefault(name, {})
+        self._help.setdefault(name, help_text)
+        metric = family.get(label_set)
+        if metric is None:
+            metric = family[label_set] = factory(**kwargs)
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: Optional[Dict[str, str]] = None) -> Counter:
+        return self._get(Counter, name, help_text, labels)
+
+    def gauge(self, name: str, help_text: str, labels: Optional[Dict[str, str]] = None,
+              callback: Optional[Callable[[], float]] = None) -> Gauge:
+        return self._get(Gauge, name, help_text, labels, callback=callback)
+
+    def histogram(self, name: str, help_text: str, labels: Optional[Dict[str, str]] = None,
+                  buckets=DEFAULT_LATENCY_BUCKETS) -> Histogram:
+        return self._get(Histogram, name, help_text, labels, buckets=buckets)
+
+    def render(self) -> str:
+        lines = []
+        for name, family in self._metrics.items():
+            kind = next(iter(family.values())).kind
+            lines.append(f'# HELP {name} {self._help[name]}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, metric in family.items():
+                lines.extend(metric.samples(name, labels))
+        return '\n'.join(lines) + '\n'
+
+
+async def serve_metrics(registry: MetricsRegistry, host: str = '0.0.0.0', port: int = 9100):
+    """Serve ``GET /metrics`` over plain HTTP; returns the asyncio server."""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request_line = await reader.readline()
+            # Drain the request headers
+            while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                pass
+            parts = request_line.decode('latin-1').split()
+            if len(parts) >= 2 and parts[0] == 'GET' and parts[1].split('?')[0] in ('/metrics', '/'):
+                status, body = '200 OK', registry.render().encode('utf-8')
+            else:
+                status, body = '404 Not Found', b'Not Found\n'
+            writer.write(
+                f'HTTP/1.1 {status}\r\n'
+                f'Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n'
+                f'Content-Length: {len(body)}\r\n'
+                f'Connection: close\r\n\r\n'.encode('latin-1') + body
+            )
+            await writer.drain()
+        except Exception as e:
+            logger.error(f"Metrics request error: {e}")
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    logger.info(f"Metrics available on http://{host}:{port}/metrics")
+    return server
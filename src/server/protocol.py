@@ -0,0 +1,171 @@
+"""Binary wire formats used between ESP devices and the ECG server.
+
+ESP sample frame (all fields little-endian)::
+
+    offset  size  field
+    0       1     magic (0xEC)
+    1       1     version (1)
+    2       2     sample count (uint16)
+    4       4     sequence number (uint32, wraps)
+    8       4     device timestamp in ms of the first sample (uint32, millis())
+    12      2*n   samples (uint16 raw ADC readings)
+
+Frames are sent as binary websocket messages on the ``esp`` subprotocol,
+alongside the existing JSON text messages.
+
+Frontend sample frame, sent to clients on the ``frontend.bin`` subprotocol
+(status and alert messages stay JSON text)::
+
+    offset  size  field
+    0       1     magic (0xED)
+    1       1     version (1)
+    2       1     value encoding (1 = float32, 2 = int16), high bit set on history snapshots
+    3       1     device id length L in bytes
+    4       4     sample count n (uint32)
+    8       8     timestamp of the first sample (float64, unix seconds)
+    16      4     sample period in seconds (float32)
+    20      L     device id (utf-8), zero-padded to a multiple of 4 bytes
+    ...     n*k   values (k = 4 for float32, 2 for int16)
+    ...     ceil(n/8)  anomaly bitmask, bit i (LSB first) set if sample i is anomalous
+
+History snapshots carry the recent trace of a device as one frame when a
+client subscribes; live frames follow on from their last point.
+
+The padding keeps the values aligned so browsers can read them with a typed
+array view directly over the received ArrayBuffer.
+"""
+import struct
+from dataclasses import dataclass
+from typing import Union
+
+import numpy as np
+
+ESP_FRAME_MAGIC = 0xEC
+ESP_FRAME_VERSION = 1
+ESP_FRAME_HEADER = struct.Struct('<BBHII')
+ESP_SAMPLE_DTYPE = np.dtype('<u2')
+ADC_MAX = 1023
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+
+FRONTEND_FRAME_MAGIC = 0xED
+FRONTEND_FRAME_VERSION = 1
+FRONTEND_FRAME_HEADER = struct.Struct('<BBBBIdf')
+VALUE_FLOAT32 = 1
+VALUE_INT16 = 2
+FRAME_FLAG_HISTORY = 0x80  # Set in the encoding byte of history snapshot frames
+_VALUE_DTYPES = {VALUE_FLOAT32: np.dtype('<f4'), VALUE_INT16: np.dtype('<i2')}
+
+
+class FrameError(ValueError):
+    """Raised when a binary frame cannot be decoded."""
+
+
+@dataclass
+class ESPFrame:
+    """A decoded batch of ADC samples from an ESP device."""
+    sequence: int
+    device_timestamp_ms: int
+    samples: np.ndarray
+
+
+def decode_esp_frame(payload: BytesLike) -> ESPFrame:
+    """
+    Decode a binary ESP frame.
+
+    The returned samples array is a read-only view over ``payload``; no
+    sample data is copied.
+
+    Raises:
+        FrameError: If the header is malformed or the payload is truncated.
+    """
+    if len(payload) < ESP_FRAME_HEADER.size:
+        raise FrameError(f"Frame too short: {len(payload)} bytes")
+    magic, version, count, sequence, timestamp_ms = ESP_FRAME_HEADER.unpack_from(payload)
+    if magic != ESP_FRAME_MAGIC:
+        raise FrameError(f"Bad frame magic: {magic:#04x}")
+    if version != ESP_FRAME_VERSION:
+        raise FrameError(f"Unsupported frame version: {version}")
+    expected = ESP_FRAME_HEADER.size + count * ESP_SAMPLE_DTYPE.itemsize
+    if len(payload) != expected:
+        raise FrameError(f"Frame length {len(payload)} does not match {count} samples")
+    samples = np.frombuffer(payload, dtype=ESP_SAMPLE_DTYPE, count=count,
+                            offset=ESP_FRAME_HEADER.size)
+    return ESPFrame(sequence=sequence, device_timestamp_ms=timestamp_ms, samples=samples)
+
+
+def encode_esp_frame(samples, sequence: int, device_timestamp_ms: int) -> bytes:
+    """Encode ADC samples into a binary ESP frame (used by simulators and tests)."""
+    samples = np.asarray(samples, dtype=ESP_SAMPLE_DTYPE)
+    header = ESP_FRAME_HEADER.pack(ESP_FRAME_MAGIC, ESP_FRAME_VERSION, len(samples),
+                                   sequence & 0xFFFFFFFF, device_timestamp_ms & 0xFFFFFFFF)
+    return header + samples.tobytes()
+
+
+def valid_sample_mask(samples: np.ndarray) -> np.ndarray:
+    """Boolean mask of samples inside the ADC range (0-1023)."""
+    return (samples >= 0) & (samples <= ADC_MAX)
+
+
+def encode_frontend_frame(device_id: str, start_timestamp: float, sample_period: float,
+                          values: np.ndarray, anomalies: np.ndarray, history: bool = False) -> bytes:
+    """
+    Pack a batch of samples for a binary frontend client.
+
+    Values are sent as int16 when they are all whole numbers in range (raw ADC
+    readings), otherwise as float32.
+    """
+    values = np.asarray(values)
+    as_int = np.rint(values)
+    if np.array_equal(as_int, values) and (len(values) == 0 or (values.min() >= -32768 and values.max() <= 32767)):
+        encoding = VALUE_INT16
+    else:
+        encoding = VALUE_FLOAT32
+    device = device_id.encode('utf-8')[:255]
+    padding = -len(device) % 4
+    flags = FRAME_FLAG_HISTORY if history else 0
+    header = FRONTEND_FRAME_HEADER.pack(FRONTEND_FRAME_MAGIC, FRONTEND_FRAME_VERSION, encoding | flags,
+                                        len(device), len(values), start_timestamp, sample_period)
+    bitmask = np.packbits(np.asarray(anomalies, dtype=bool), bitorder='little')
+    return b''.join([
+        header, device, b'\0' * padding,
+        values.astype(_VALUE_DTYPES[encoding]).tobytes(), bitmask.tobytes()
+    ])
+
+
+@dataclass
+class FrontendFrame:
+    """A decoded binary frontend frame."""
+    device_id: str
+    start_timestamp: float
+    sample_period: float
+    values: np.ndarray
+    anomalies: np.ndarray
+    history: bool = False
+
+
+def decode_frontend_frame(payload: BytesLike) -> FrontendFrame:
+    """Decode a frame produced by encode_frontend_frame (used by tools and tests)."""
+    if len(payload) < FRONTEND_FRAME_HEADER.size:
+        raise FrameError(f"Frame too short: {len(payload)} bytes")
+    magic, version, encoding, id_length, count, start_timestamp, sample_period = \
+        FRONTEND_FRAME_HEADER.unpack_from(payload)
+    if magic != FRONTEND_FRAME_MAGIC or version != FRONTEND_FRAME_VERSION:
+        raise FrameError("Not a frontend sample frame")
+    history = bool(encoding & FRAME_FLAG_HISTORY)
+    encoding &= ~FRAME_FLAG_HISTORY
+    if encoding not in _VALUE_DTYPES:
+        raise FrameError(f"Unknown value encoding: {encoding}")
+    dtype = _VALUE_DTYPES[encoding]
+    offset = FRONTEND_FRAME_HEADER.size
+    device_id = bytes(payload[offset:offset + id_length]).decode('utf-8')
+    offset += id_length + (-id_length % 4)
+    expected = offset + count * dtype.itemsize + (count + 7) // 8
+    if len(payload) != expected:
+        raise FrameError(f"Frame length {len(payload)} does not match {count} samples")
+    values = np.frombuffer(payload, dtype=dtype, count=count, offset=offset)
+    offset += count * dtype.itemsize
+    bitmask = np.frombuffer(payload, dtype=np.uint8, offset=offset)
+    anomalies = np.unpackbits(bitmask, count=count, bitorder='little').astype(bool)
+    return FrontendFrame(device_id, start_timestamp, sample_period, values, anomalies, history)
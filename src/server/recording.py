@@ -0,0 +1,220 @@
+"""
+Append-only, chunked, compressed on-disk recording of raw ECG streams.
+
+Each device gets a directory holding two append-only files:
+
+    samples.dat   zlib-compressed chunks of ``chunk_samples`` int16 samples
+    index.dat     one fixed-size record per chunk (see INDEX_DTYPE)
+
+A chunk's index record is written only after its data, so a crash can leave
+at most an unreferenced tail in samples.dat (and a partial record in
+index.dat); both are truncated away when the stream is reopened for writing.
+Writers run on a single background thread; readers memory-map both files and
+decompress only the chunks a read touches.
+
+Device directories are named by percent-encoding the device id, so distinct
+ids never share a directory.
+"""
+import logging
+import mmap
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import quote
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_DTYPE = np.dtype('<i2')
+INDEX_DTYPE = np.dtype([
+    ('offset', '<u8'),        # Byte offset of the compressed chunk in samples.dat
+    ('length', '<u4'),        # Compressed length in bytes
+    ('count', '<u4'),         # Samples in the chunk
+    ('first_sample', '<u8'),  # Stream position of the chunk's first sample
+    ('timestamp', '<f8'),     # Unix time of the chunk's first sample
+    ('sample_period', '<f8'),  # Seconds between consecutive samples
+])
+
+
+def _device_dir_name(device_id: str) -> str:
+    # Everything except letters, digits, '-' and '_' is escaped, including '.', so
+    # the name is reversible and can never be '.' or '..'; '%' alone stands for ''
+    return quote(device_id, safe='-_').replace('.', '%2E').replace('~', '%7E') or '%'
+
+
+class _StreamWriter:
+    """Per-device accumulation buffer; chunks are handed to the store's writer thread."""
+
+    def __init__(self, directory: Path, chunk_samples: int):
+        directory.mkdir(parents=True, exist_ok=True)
+        self.directory = directory
+        self.pending = np.empty(chunk_samples, dtype=SAMPLE_DTYPE)
+        self.pending_count = 0
+        self.pending_timestamp = 0.0
+        index_path = directory / 'index.dat'
+        records = index_path.stat().st_size // INDEX_DTYPE.itemsize if index_path.exists() else 0
+        if records:
+            last = np.fromfile(index_path, dtype=INDEX_DTYPE, count=records)[-1]
+            self.next_sample = int(last['first_sample']) + int(last['count'])
+            self.next_offset = int(last['offset']) + int(last['length'])
+        else:
+            self.next_sample = 0
+            self.next_offset = 0
+        # Drop whatever a crash left past the last complete chunk, so new chunks
+        # are written exactly where their index records will point
+        _truncate(index_path, records * INDEX_DTYPE.itemsize)
+        _truncate(directory / 'samples.dat', self.next_offset)
+
+
+def _truncate(path: Path, size: int):
+    if path.exists() and path.stat().st_size > size:
+        logger.warning(f"Discarding {path.stat().st_size - size} unindexed bytes at the end of {path}")
+        with open(path, 'r+b') as f:
+            f.truncate(size)
+
+
+class RecordingStore:
+    """
+    Persist every device stream as fixed-size compressed chunks.
+
+    ``append`` only copies samples into a per-device buffer and is safe to call
+    from the event loop; compression and file I/O happen on a background thread.
+    """
+
+    def __init__(self, root, sampling_rate: float = 250.0, chunk_samples: int = 2500,
+                 compression_level: int = 1):
+        self.root = Path(root)
+        self.sampling_rate = sampling_rate
+        self.chunk_samples = chunk_samples
+        self.compression_level = compression_level
+        self._streams: Dict[str, _StreamWriter] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='ecg-recorder')
+
+    def open(self, device_id: str):
+        """
+        Create a device's directory and recover its files ahead of the first ``append``.
+
+        This does file I/O, so call it off the event loop; ``append`` opens
+        streams that were not opened beforehand itself.
+        """
+        self._stream(device_id)
+
+    def _stream(self, device_id: str) -> _StreamWriter:
+        stream = self._streams.get(device_id)
+        if stream is None:
+            stream = self._streams[device_id] = _StreamWriter(
+                self.root / _device_dir_name(device_id), self.chunk_samples
+            )
+        return stream
+
+    def append(self, device_id: str, samples: np.ndarray, end_timestamp: float):
+        """
+        Record a batch of samples.
+
+        Args:
+            device_id: Stream to append to
+            samples: ADC samples in arrival order
+            end_timestamp: Unix time of the last sample in the batch
+        """
+        stream = self._stream(device_id)
+        period = 1.0 / self.sampling_rate
+        n = len(samples)
+        position = 0
+        while position < n:
+            if stream.pending_count == 0:
+                stream.pending_timestamp = end_timestamp - (n - 1 - position) * period
+            take = min(self.chunk_samples - stream.pending_count, n - position)
+            stream.pending[stream.pending_count:stream.pending_count + take] = samples[position:position + take]
+            stream.pending_count += take
+            position += take
+            if stream.pending_count == self.chunk_samples:
+                self._submit(stream)
+
+    def _submit(self, stream: _StreamWriter):
+        chunk = stream.pending[:stream.pending_count].copy()
+        record = np.zeros(1, dtype=INDEX_DTYPE)
+        record['count'] = len(chunk)
+        record['first_sample'] = stream.next_sample
+        record['timestamp'] = stream.pending_timestamp
+        record['sample_period'] = 1.0 / self.sampling_rate
+        stream.next_sample += len(chunk)
+        stream.pending_count = 0
+        self._executor.submit(self._write_chunk, stream, chunk, record)
+
+    def _write_chunk(self, stream: _StreamWriter, chunk: np.ndarray, record: np.ndarray):
+        try:
+            data = zlib.compress(chunk.tobytes(), self.compression_level)
+            record['offset'] = stream.next_offset
+            record['length'] = len(data)
+            with open(stream.directory / 'samples.dat', 'ab') as f:
+                f.write(data)
+            with open(stream.directory / 'index.dat', 'ab') as f:
+                f.write(record.tobytes())
+            stream.next_offset += len(data)
+        except Exception as e:
+            logger.error(f"Error writing recording chunk to {stream.directory}: {e}")
+
+    def flush(self, device_id: Optional[str] = None):
+        """Write out partially filled chunks (for one device, or all of them)."""
+        device_ids = [device_id] if device_id is not None else list(self._streams)
+        for key in device_ids:
+            stream = self._streams.get(key)
+            if stream is not None and stream.pending_count:
+                self._submit(stream)
+
+    def close(self):
+        """Flush every stream and wait for pending writes."""
+        self.flush()
+        self._executor.shutdown(wait=True)
+
+
+class RecordingReader:
+    """Random access to a recorded stream through memory-mapped files."""
+
+    def __init__(self, root, device_id: str):
+        directory = Path(root) / _device_dir_name(device_id)
+        index_path = directory / 'index.dat'
+        records = index_path.stat().st_size // INDEX_DTYPE.itemsize if index_path.exists() else 0
+        if records:
+            self.index = np.memmap(index_path, dtype=INDEX_DTYPE, mode='r', shape=(records,))
+            with open(directory / 'samples.dat', 'rb') as f:
+                self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self.index = np.zeros(0, dtype=INDEX_DTYPE)
+            self._data = None
+
+    def __len__(self) -> int:
+        if not len(self.index):
+            return 0
+        return int(self.index['first_sample'][-1] + self.index['count'][-1])
+
+    def chunk(self, number: int) -> np.ndarray:
+        """Decompress one chunk."""
+        record = self.index[number]
+        start = int(record['offset'])
+        data = zlib.decompress(memoryview(self._data)[start:start + int(record['length'])])
+        return np.frombuffer(data, dtype=SAMPLE_DTYPE)
+
+    def read(self, start: int = 0, stop: Optional[int] = None) -> np.ndarray:
+        """Return samples ``start`` to ``stop`` of the stream, decompressing only the chunks involved."""
+        stop = len(self) if stop is None else min(stop, len(self))
+        if start >= stop:
+            return np.empty(0, dtype=SAMPLE_DTYPE)
+        first_samples = self.index['first_sample']
+        first = int(np.searchsorted(first_samples, start, side='right')) - 1
+        last = int(np.searchsorted(first_samples, stop, side='left'))
+        samples = np.concatenate([self.chunk(number) for number in range(first, last)])
+        offset = int(first_samples[first])
+        return samples[start - offset:stop - offset]
+
+    def timestamp_of(self, position: int) -> float:
+        """Unix time of the sample at a stream position (from the chunk time index)."""
+        number = int(np.searchsorted(self.index['first_sample'], position, side='right')) - 1
+        record = self.index[number]
+        return float(record['timestamp'] + (position - int(record['first_sample'])) * record['sample_period'])
+
+    def close(self):
+        if self._data is not None:
+            self._data.close()
@@ -0,0 +1,55 @@
+import time
+from typing import List, Optional
+
+
+class InferenceScheduler:
+    """
+    Decide which detection windows are due for scoring as samples arrive.
+
+    Windows are identified by their end position, i.e. the running sample
+    count at which the window's last sample was appended. In hop mode a window
+    is due every ``hop_size`` samples once ``window_size`` samples have been
+    seen; in time-budget mode the newest window is due at most once every
+    ``interval_ms`` milliseconds.
+    """
+
+    def __init__(self, window_size: int, hop_size: Optional[int] = 1,
+                 interval_ms: Optional[float] = None):
+        if interval_ms is None and (hop_size is None or hop_size < 1):
+            raise ValueError("Either a positive hop_size or an interval_ms must be configured")
+        self.window_size = window_size
+        self.hop_size = hop_size
+        self.interval_ms = interval_ms
+        self._next_end = window_size
+        self._last_run: Optional[float] = None
+
+    def due_windows(self, total_samples: int, now: Optional[float] = None) -> List[int]:
+        """
+        Return the end positions of all windows that became due.
+
+        Args:
+            total_samples: Number of samples appended to the stream so far
+            now: Monotonic timestamp in seconds (only used in time-budget mode)
+
+        Returns:
+            Window end positions in ascending order (may be empty)
+        """
+        if total_samples < self.window_size:
+            return []
+
+        if self.interval_ms is not None:
+            now = time.monotonic() if now is None else now
+            if self._last_run is not None and (now - self._last_run) * 1000.0 < self.interval_ms:
+                return []
+            self._last_run = now
+            return [total_samples]
+
+        if total_samples < self._next_end:
+            return []
+        ends = list(range(self._next_end, total_samples + 1, self.hop_size))
+        self._next_end = ends[-1] + self.hop_size
+        return ends
+
+    def reset(self):
+        self._next_end = self.window_size
+        self._last_run = None
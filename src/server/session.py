@@ -0,0 +1,68 @@
+import time
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from src.server.decimation import MinMaxDecimator
+from src.server.history import DeviceHistory
+from src.utils.ring_buffer import ECGRingBuffer
+from src.server.scheduler import InferenceScheduler
+
+DEFAULT_DEVICE_ID = 'default'
+
+
+class DeviceSession:
+    """Streaming state for one connected ESP device (one patient)."""
+
+    def __init__(self, device_id: str, websocket, window_size: int, history_size: int,
+                 hop_size: Optional[int] = None, interval_ms: Optional[float] = None,
+                 history: Optional[DeviceHistory] = None, features=None):
+        self.device_id = device_id
+        self.websocket = websocket
+        self.data_buffer = ECGRingBuffer(window_size + history_size)
+        self.scheduler = InferenceScheduler(window_size, hop_size=hop_size, interval_ms=interval_ms)
+        self.last_heartbeat = time.monotonic()
+        self.last_frame_sequence: Optional[int] = None
+        self.consecutive_anomalies = 0  # Consecutive anomalous samples, as the scored windows cover them
+        self.last_window_anomaly = False
+        self.last_window_end: Optional[int] = None  # End position of the latest scored window
+        # Samples from JSON messages waiting for the previous ones to be processed
+        self.pending_samples: List[float] = []
+        self.drain_task = None
+        # Display-rate streams, shared by every subscriber at the same rate
+        self.decimators: Dict[float, MinMaxDecimator] = {}
+        self.history = history  # Recent trace sent to newly subscribed dashboards
+        # Per-beat features (a StreamingFeaturePipeline, src/features/streaming.py) when enabled
+        self.features = features
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by this session's sample, history and feature buffers, in bytes."""
+        return (self.data_buffer.nbytes + (self.history.nbytes if self.history is not None else 0)
+                + (self.features.nbytes if self.features is not None else 0))
+
+    def touch(self):
+        """Record a heartbeat from the device (monotonic time)."""
+        self.last_heartbeat = time.monotonic()
+
+
+class RemoteDevice:
+    """A device connected to another shard, whose samples arrive over the cluster bus."""
+
+    def __init__(self, device_id: str, history: Optional[DeviceHistory] = None):
+        self.device_id = device_id
+        self.decimators: Dict[float, MinMaxDecimator] = {}
+        self.history = history
+
+
+def connection_path(websocket) -> str:
+    """Request path of a websocket connection (legacy and new websockets APIs)."""
+    request = getattr(websocket, 'request', None)
+    if request is not None:
+        return request.path
+    return getattr(websocket, 'path', '') or ''
+
+
+def query_param(websocket, name: str) -> Optional[str]:
+    """Return a query-string parameter from the connection URL, if present."""
+    values = parse_qs(urlsplit(connection_path(websocket)).query).get(name)
+    return values[0] if values else None
@@ -0,0 +1,98 @@
+import asyncio
+
+import numpy as np
+import pytest
+
+from src.models.prediction import PredictionResult
+from src.server.batching import BatchingInferenceService
+
+
+class RecordingBackend:
+    """Scores a window as its first value and records the batch sizes it was called with."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.calls = []
+
+    async def predict(self, X, threshold):
+        self.calls.append(len(X))
+        await asyncio.sleep(self.delay)
+        probabilities = X[:, 0].astype(float)
+        return PredictionResult((probabilities >= threshold).astype(int), probabilities, threshold)
+
+
+def _windows(*values):
+    return np.array([[value] * 3 for value in values])
+
+
+def test_concurrent_requests_share_one_batch():
+    backend = RecordingBackend()
+    batcher = BatchingInferenceService(backend, max_batch_size=64, max_wait=0.01)
+    sizes, waits = [], []
+    batcher.batch_size_observer = sizes.append
+    batcher.batch_wait_observer = waits.append
+
+    async def run():
+        return await asyncio.gather(*[
+            batcher.predict(_windows(device / 10, device / 10 + 0.05), 0.5) for device in range(8)
+        ])
+
+    results = asyncio.run(run())
+    assert backend.calls == [16] and sizes == [16] and len(waits) == 8
+    for device, result in enumerate(results):
+        np.testing.assert_allclose(result.probabilities, [device / 10, device / 10 + 0.05])
+        assert list(result.labels) == [int(device / 10 >= 0.5), int(device / 10 + 0.05 >= 0.5)]
+
+
+def test_full_batch_is_dispatched_before_the_deadline():
+    backend = RecordingBackend()
+    batcher = BatchingInferenceService(backend, max_batch_size=4, max_wait=10.0)
+
+    async def run():
+        return await asyncio.wait_for(asyncio.gather(*[batcher.predict(_windows(0.1, 0.2), 0.5)
+                                                      for _ in range(4)]), 1.0)
+
+    asyncio.run(run())
+    assert backend.calls == [4, 4]
+
+
+def test_windows_collect_while_every_batch_slot_is_busy():
+    backend = RecordingBackend(delay=0.05)
+    batcher = BatchingInferenceService(backend, max_batch_size=64, max_wait=0.001, max_in_flight=1)
+
+    async def run():
+        first = asyncio.create_task(batcher.predict(_windows(0.1), 0.5))
+        await asyncio.sleep(0.01)  # The first batch is now being scored
+        await asyncio.gather(first, *[batcher.predict(_windows(0.2), 0.5) for _ in range(5)])
+        await batcher.close()
+
+    asyncio.run(run())
+    assert backend.calls == [1, 5]
+
+
+def test_backend_errors_reach_every_caller():
+    class FailingBackend:
+        async def predict(self, X, threshold):
+            raise RuntimeError("model failed")
+
+    batcher = BatchingInferenceService(FailingBackend(), max_wait=0.001)
+
+    async def run():
+        return await asyncio.gather(*[batcher.predict(_windows(0.1), 0.5) for _ in range(3)],
+                                    return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in asyncio.run(run()))
+
+    class CancellingBackend:
+        async def predict(self, X, threshold):
+            raise asyncio.CancelledError()
+
+    batcher = BatchingInferenceService(CancellingBackend(), max_wait=0.001)
+
+    async def cancelled():
+        return await asyncio.wait_for(asyncio.gather(*[batcher.predict(_windows(0.1), 0.5) for _ in range(2)],
+                                                     return_exceptions=True), 1.0)
+
+    assert all(isinstance(result, asyncio.CancelledError) for result in asyncio.run(cancelled()))
+    with pytest.raises(ValueError):
+        BatchingInferenceService(FailingBackend(), max_batch_size=0)
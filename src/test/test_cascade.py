@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import GradientBoostingClassifier
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from src.models.cascade import (
+    CascadeModel, calibrate_screen_threshold, evaluate_cascade, fit_calibrated_screen, fit_screen, load_screen,
+    save_screen
+)
+from src.models.model import ECGAnomalyDetector
+
+
+def _data(rows=2000, features=15, seed=1):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(500, 100, (rows, features))
+    y = ((X[:, 0] - 500) + 0.5 * (X[:, 1] - 500) > 150).astype(int)
+    return X, y
+
+
+def test_screen_folds_the_scaler_into_a_logistic_regression():
+    X, y = _data()
+    screen = fit_screen(X, y)
+    reference = Pipeline([('scaler', StandardScaler()),
+                          ('classifier', LogisticRegression(class_weight='balanced', max_iter=1000))]).fit(X, y)
+    np.testing.assert_allclose(screen.predict_proba(X), reference.predict_proba(X), atol=1e-9)
+    assert screen.predict_proba(X[0]).shape == (1, 2)
+
+
+def test_calibrated_threshold_meets_target_recall():
+    X, y = _data()
+    screen = fit_screen(X, y)
+    threshold = calibrate_screen_threshold(screen, X, y, target_recall=0.95)
+    escalated = screen.predict_proba(X[y == 1])[:, 1] >= threshold
+    assert escalated.mean() >= 0.95
+    assert calibrate_screen_threshold(screen, X, y, target_recall=1.0) <= threshold
+    with pytest.raises(ValueError):
+        calibrate_screen_threshold(screen, X[y == 0], y[y == 0])
+
+
+def test_screen_threshold_is_calibrated_on_held_out_training_rows():
+    X, y = _data()
+    screen, threshold = fit_calibrated_screen(X, y, target_recall=0.95, random_state=3)
+    X_fit, X_calibration, y_fit, y_calibration = train_test_split(X, y, test_size=0.2, stratify=y, random_state=3)
+    np.testing.assert_allclose(screen.coef, fit_screen(X_fit, y_fit).coef)
+    assert threshold == calibrate_screen_threshold(screen, X_calibration, y_calibration, target_recall=0.95)
+
+
+class FixedProba:
+    """Model returning a fixed P(anomaly) per row, taken from the first feature."""
+    n_features_in_ = 1
+
+    def predict_proba(self, X):
+        proba = np.asarray(X, dtype=float)[:, 0]
+        return np.column_stack([1.0 - proba, proba])
+
+
+def test_cleared_windows_are_never_labelled_anomalous():
+    class HalvingModel(FixedProba):
+        def predict_proba(self, X):
+            return super().predict_proba(np.asarray(X) / 2)
+
+    # A screen threshold above the decision threshold clears windows the screen scores 0.7
+    X = np.array([[0.7], [0.95], [0.1]])
+    cascade = CascadeModel(FixedProba(), HalvingModel(), screen_threshold=0.9, threshold=0.5)
+    proba = cascade.predict_proba(X)[:, 1]
+    assert proba[0] < 0.5 and proba[1] == pytest.approx(0.475) and proba[2] == 0.1
+    assert cascade.predict(X).tolist() == [0, 0, 0]
+    # predict applies the cascade's own decision threshold
+    cascade = CascadeModel(FixedProba(), HalvingModel(), screen_threshold=0.9, threshold=0.4)
+    assert cascade.predict(X).tolist() == [0, 1, 0]
+
+
+def test_cascade_only_escalates_uncertain_windows(tmp_path):
+    X, y = _data()
+    X_test, y_test = _data(seed=2)
+    model = GradientBoostingClassifier(n_estimators=30, random_state=0).fit(X, y)
+    screen = fit_screen(X, y)
+    screen_threshold = calibrate_screen_threshold(screen, X_test, y_test, target_recall=0.99)
+
+    cascade = CascadeModel(screen, model, screen_threshold)
+    proba = cascade.predict_proba(X_test)[:, 1]
+    escalate = screen.predict_proba(X_test)[:, 1] >= screen_threshold
+    np.testing.assert_allclose(proba[escalate], model.predict_proba(X_test[escalate])[:, 1])
+    assert np.all(proba[~escalate] < screen_threshold)
+    assert 0 < cascade.escalation_rate < 0.5
+
+    report = evaluate_cascade(screen, model, screen_threshold, X_test, y_test)
+    assert report['escalation_rate'] == pytest.approx(escalate.mean())
+    assert report['cascade_recall'] >= report['full_recall'] - 0.01
+    assert report['cascade_seconds_per_window'] < report['full_seconds_per_window']
+
+    # The detector wraps whatever model it loads with the saved screen
+    import joblib
+    joblib.dump(model, tmp_path / 'model.joblib')
+    save_screen(tmp_path / 'screen.joblib', screen, screen_threshold, 0.99)
+    assert load_screen(tmp_path / 'screen.joblib')[1] == screen_threshold
+    detector = ECGAnomalyDetector(str(tmp_path / 'model.joblib'), screen_path=str(tmp_path / 'screen.joblib'))
+    np.testing.assert_allclose(detector.predict_with_proba(X_test).probabilities, proba)
@@ -0,0 +1,54 @@
+import asyncio
+import json
+
+from src.server.cluster import (
+    BUS_DEVICES, BUS_INTEREST, BUS_SAMPLES, MessageBroker, ShardRouter,
+    encode_bus_frame, read_bus_frame, shard_for_device
+)
+
+
+def test_esp_connections_are_pinned_by_device_id():
+    router = ShardRouter([9001, 9002, 9003])
+    shard = router.choose_shard('/?device_id=patient-7', ['esp'])
+    assert shard == shard_for_device('patient-7', 3)
+    assert router.choose_shard('/?device_id=patient-7&x=1', ['esp']) == shard
+    assert router.choose_shard('/', ['esp']) == 0
+
+    router.connections = [4, 1, 2]
+    assert router.choose_shard('/?rate=50', ['frontend.bin', 'frontend']) == 1
+
+
+def test_broker_forwards_only_followed_devices():
+    async def scenario():
+        broker = MessageBroker()
+        server = await asyncio.start_server(broker.handle, '127.0.0.1', 0)
+        port = server.sockets[0].getsockname()[1]
+        links = [await asyncio.open_connection('127.0.0.1', port) for _ in range(3)]
+        for number, (_, writer) in enumerate(links):
+            writer.write(encode_bus_frame(BUS_DEVICES, str(number), b'[]'))
+        links[1][1].write(encode_bus_frame(BUS_INTEREST, '1', json.dumps(['a']).encode()))
+        links[2][1].write(encode_bus_frame(BUS_INTEREST, '2', b'null'))
+        await asyncio.sleep(0.1)
+
+        links[0][1].write(encode_bus_frame(BUS_SAMPLES, 'b', b'frame-b'))
+        links[0][1].write(encode_bus_frame(BUS_SAMPLES, 'a', b'frame-a'))
+        await asyncio.sleep(0.1)
+
+        received = []
+        for reader, _ in links[1:]:
+            frames = []
+            while True:
+                try:
+                    frames.append(await asyncio.wait_for(read_bus_frame(reader), 0.1))
+                except asyncio.TimeoutError:
+                    break
+            received.append([(topic, body) for kind, topic, body in frames if kind == BUS_SAMPLES])
+        for _, writer in links:
+            writer.close()
+        server.close()
+        await broker.close()
+        return received
+
+    following_a, following_all = asyncio.run(scenario())
+    assert following_a == [('a', b'frame-a')]
+    assert following_all == [('b', b'frame-b'), ('a', b'frame-a')]
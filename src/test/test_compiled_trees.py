@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import MinMaxScaler, StandardScaler
+from sklearn.svm import SVC
+
+from src.models.compiled_trees import compile_model
+
+
+def _data(rows=400, features=12):
+    rng = np.random.default_rng(3)
+    X = rng.normal(500, 120, (rows, features))
+    y = (X[:, 0] + 0.5 * X[:, 3] - X[:, 7] > 250).astype(int)
+    return X, y
+
+
+@pytest.mark.parametrize('classifier', [
+    RandomForestClassifier(n_estimators=20, max_depth=6, class_weight='balanced', random_state=0),
+    GradientBoostingClassifier(n_estimators=30, subsample=0.8, random_state=0),
+])
+def test_compiled_pipeline_matches_sklearn(classifier):
+    X, y = _data()
+    model = Pipeline([('scaler', StandardScaler()), ('classifier', classifier)]).fit(X, y)
+    compiled = compile_model(model)
+
+    X_test = _data(200)[0] + 3.0
+    np.testing.assert_allclose(compiled.predict_proba(X_test), model.predict_proba(X_test), atol=1e-9)
+    np.testing.assert_allclose(compiled.predict_proba(X_test[0]), model.predict_proba(X_test[:1]), atol=1e-9)
+    assert compiled.n_features_in_ == 12
+
+
+def test_unsupported_models_are_rejected():
+    X, y = _data()
+    with pytest.raises(ValueError):
+        compile_model(Pipeline([('scaler', MinMaxScaler()), ('tree', RandomForestClassifier(5))]).fit(X, y))
+    with pytest.raises(ValueError):
+        compile_model(SVC(probability=True).fit(X, y))
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from src.server.decimation import MinMaxDecimator
+
+
+def test_decimation_preserves_peaks_in_order():
+    decimator = MinMaxDecimator(input_rate=250, output_rate=50)  # 10-sample buckets
+    samples = np.full(20, 500, dtype=np.float32)
+    samples[3] = 900  # R peak before the trough
+    samples[6] = 100
+    samples[12] = 50
+    flags = np.zeros(20, dtype=bool)
+    flags[15] = True
+
+    values, anomalies = decimator.push(samples, flags)
+
+    np.testing.assert_array_equal(values, [900, 100, 500, 50])
+    np.testing.assert_array_equal(anomalies, [False, False, True, True])
+
+
+def test_partial_buckets_carry_over_between_pushes():
+    decimator = MinMaxDecimator(input_rate=250, output_rate=50)
+    values, _ = decimator.push(np.arange(7, dtype=np.float32), np.zeros(7, dtype=bool))
+    assert len(values) == 0
+
+    values, _ = decimator.push(np.arange(7, 10, dtype=np.float32), np.zeros(3, dtype=bool))
+    np.testing.assert_array_equal(values, [0, 9])
+
+
+def test_display_rate_must_be_below_input_rate():
+    with pytest.raises(ValueError):
+        MinMaxDecimator(input_rate=250, output_rate=250)
@@ -0,0 +1,389 @@
+import asyncio
+import inspect
+import json
+import subprocess
+import sys
+import threading
+from pathlib import Path
+
+import joblib
+import numpy as np
+from sklearn.linear_model import LogisticRegression
+
+from src.server import ecg_server
+from src.server.cluster import ClusterBus, MessageBroker
+from src.server.ecg_server import ECGServer
+
+NORMAL = 300.0
+ANOMALY = 1000.0
+
+
+class FakeWebSocket:
+    """Connection whose incoming messages are queued by the test; None ends the stream."""
+
+    def __init__(self, path='/'):
+        self.path = path
+        self.incoming = asyncio.Queue()
+        self.sent = []
+        self.closed_with = None
+
+    async def recv(self):
+        return await self.incoming.get()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        message = await self.incoming.get()
+        if message is None:
+            raise StopAsyncIteration
+        return message
+
+    async def send(self, payload):
+        self.sent.append(payload)
+
+    async def close(self, code=1000, reason=''):
+        self.closed_with = (code, reason)
+        self.incoming.put_nowait(None)
+
+
+def _model_file(tmp_path):
+    """Logistic regression flagging windows whose mean (scaled by 1/1023) is above 0.68."""
+    rng = np.random.default_rng(0)
+    levels = rng.uniform(0, 1, 400)
+    X = levels[:, None] + rng.normal(0, 0.02, (400, 95))
+    path = tmp_path / 'model.joblib'
+    joblib.dump(LogisticRegression(C=100.0, max_iter=1000).fit(X, levels > 0.68), path)
+    return path
+
+
+def _server(tmp_path, **options):
+    options.setdefault('batch_max_wait', None)
+    return ECGServer(_model_file(tmp_path), **options)
+
+
+def _record_scoring(server):
+    """Record the windows scored, the broadcast sample flags and the alerts sent."""
+    scored, flags, alerts = [], [], []
+    detect_anomalies = server.detect_anomalies
+
+    async def record_windows(session, window_ends):
+        scored.append(list(window_ends))
+        return await detect_anomalies(session, window_ends)
+
+    server.detect_anomalies = record_windows
+    server.broadcast_samples = lambda session, samples, sample_flags: flags.append(sample_flags.copy())
+    server.send_anomaly_alert = alerts.append
+    return scored, flags, alerts
+
+
+def test_windows_are_scored_every_hop_and_alert_on_consecutive_anomalous_samples(tmp_path):
+    server = _server(tmp_path, inference_hop=25)
+    session = server.create_session('patient-1')
+    scored, flags, alerts = _record_scoring(server)
+
+    async def run():
+        alert_counts = []
+        for value, count in ((NORMAL, 90), (NORMAL, 40), (ANOMALY, 100), (ANOMALY, 25)):
+            await server.process_samples(session, np.full(count, value))
+            alert_counts.append(len(alerts))
+        return alert_counts
+
+    alert_counts = asyncio.run(run())
+
+    # No window until 95 samples, then one every 25 samples
+    assert scored == [[95, 120], [145, 170, 195, 220], [245]]
+    assert not flags[0].any() and not flags[1].any()
+    # Windows ending at 145 and 170 are still mostly normal; each sample carries the latest window at or before it
+    expected = np.zeros(100, dtype=bool)
+    expected[195 - 130 - 1:] = True
+    np.testing.assert_array_equal(flags[2], expected)
+    assert flags[3].all()
+    # Each anomalous window covers a 25-sample hop, so it already spans the 3-sample threshold and alerts
+    assert alert_counts == [0, 0, 2, 3] and alerts == [session] * 3
+    assert session.consecutive_anomalies == 75 and session.last_window_anomaly
+
+
+def test_alert_after_three_consecutive_anomalous_samples_when_scoring_every_sample(tmp_path):
+    server = _server(tmp_path, inference_hop=1)
+    session = server.create_session('patient-1')
+    _, flags, alerts = _record_scoring(server)
+
+    async def run():
+        await server.process_samples(session, np.full(200, NORMAL))
+        alert_counts = []
+        for _ in range(60):
+            await server.process_samples(session, np.full(1, ANOMALY))
+            alert_counts.append(len(alerts))
+        return alert_counts
+
+    alert_counts = asyncio.run(run())
+    # Windows turn anomalous once most of their samples are; the third in a row alerts, then every one after
+    window_flags = [bool(batch[-1]) for batch in flags[1:]]
+    first_anomalous = len(window_flags) - window_flags[::-1].index(False)
+    assert first_anomalous <= 55
+    assert alert_counts[first_anomalous + 1] == 0
+    assert alert_counts[first_anomalous + 2:] == list(range(1, 60 - first_anomalous - 1))
+
+
+def test_json_samples_arriving_during_scoring_share_one_model_call(tmp_path):
+    server = _server(tmp_path, inference_hop=1)
+    session = server.create_session('patient-1')
+    scored, flags, _ = _record_scoring(server)
+
+    async def run():
+        await server.process_samples(session, np.full(94, NORMAL))
+        await server.process_sample(session, NORMAL)
+        await asyncio.sleep(0)  # The first window is now being scored
+        for _ in range(5):
+            await server.process_sample(session, NORMAL)
+        await server._finish_pending_samples(session)
+
+    asyncio.run(run())
+    # Samples that arrived while the first window was scored are processed together
+    assert [len(batch) for batch in flags] == [94, 1, 5]
+    assert scored == [[95], [96, 97, 98, 99, 100]]
+    assert session.pending_samples == []
+
+
+def test_duplicate_device_id_is_rejected(tmp_path):
+    server = _server(tmp_path)
+
+    async def run():
+        first, duplicate, hello = FakeWebSocket('/?device_id=a'), FakeWebSocket('/?device_id=a'), FakeWebSocket()
+        first_task = asyncio.create_task(server.handle_esp_connection(first))
+        await asyncio.sleep(0)
+        session = server.sessions['a']
+        await asyncio.wait_for(server.handle_esp_connection(duplicate), 1.0)
+        # Firmware without a device_id parameter announces itself in its first message
+        hello.incoming.put_nowait(json.dumps({'type': 'hello', 'device_id': 'b'}))
+        hello_task = asyncio.create_task(server.handle_esp_connection(hello))
+        await asyncio.sleep(0.01)
+        connected = dict(server.sessions)
+        first.incoming.put_nowait(None)
+        hello.incoming.put_nowait(None)
+        await asyncio.gather(first_task, hello_task)
+        return first, duplicate, session, connected
+
+    first, duplicate, session, connected = asyncio.run(run())
+    assert duplicate.closed_with[0] == 1008 and first.closed_with is None
+    assert sorted(connected) == ['a', 'b'] and connected['a'] is session
+    assert server.sessions == {}
+
+
+def test_heartbeat_timeout_closes_the_connection_without_touching_a_reconnected_session(tmp_path):
+    server = _server(tmp_path)
+    server.ESP_TIMEOUT = 0.05
+    server.heartbeats.timeout = 0.05
+
+    async def run():
+        stale = FakeWebSocket('/?device_id=a')
+        stale_task = asyncio.create_task(server.handle_esp_connection(stale))
+        monitor = asyncio.create_task(server.monitor_esp_connection())
+        await asyncio.wait_for(stale_task, 1.0)  # The timeout ends the silent connection's handler
+        fresh = FakeWebSocket('/?device_id=a')
+        fresh_task = asyncio.create_task(server.handle_esp_connection(fresh))
+        await asyncio.sleep(0)
+        registered = server.sessions.get('a')
+        monitor.cancel()
+        await asyncio.gather(monitor, return_exceptions=True)
+        fresh.incoming.put_nowait(None)
+        await fresh_task
+        return stale, fresh, registered
+
+    stale, fresh, registered = asyncio.run(run())
+    assert stale.closed_with == (1001, 'heartbeat timeout')
+    assert registered is not None and registered.websocket is fresh and fresh.closed_with is None
+    assert server.sessions == {}
+
+
+def test_recording_files_are_opened_off_the_event_loop(tmp_path):
+    server = _server(tmp_path, recording_dir=tmp_path / 'recordings')
+    opened = []
+    open_stream = server.recorder.open
+
+    def record_open(device_id):
+        opened.append((device_id, threading.current_thread() is threading.main_thread()))
+        open_stream(device_id)
+
+    server.recorder.open = record_open
+
+    async def run():
+        websocket = FakeWebSocket('/?device_id=a')
+        websocket.incoming.put_nowait(json.dumps({'type': 'data', 'value': 500}))
+        websocket.incoming.put_nowait(None)
+        await server.handle_esp_connection(websocket)
+
+    asyncio.run(run())
+    server.recorder.close()
+    assert opened == [('a', False)]
+    assert (tmp_path / 'recordings' / 'a' / 'index.dat').exists()
+
+
+def test_frontend_clients_only_receive_subscribed_devices(tmp_path):
+    server = _server(tmp_path)
+
+    async def run():
+        devices = {device_id: FakeWebSocket(f'/?device_id={device_id}') for device_id in ('a', 'b')}
+        only_a, everyone = FakeWebSocket('/?devices=a'), FakeWebSocket()
+        tasks = [asyncio.create_task(server.handle_esp_connection(websocket)) for websocket in devices.values()]
+        tasks += [asyncio.create_task(server.handle_frontend_connection(websocket)) for websocket in (only_a, everyone)]
+        await asyncio.sleep(0.01)
+
+        async def send_sample(value):
+            for websocket in devices.values():
+                websocket.incoming.put_nowait(json.dumps({'type': 'data', 'value': value}))
+            await asyncio.sleep(0.01)
+
+        await send_sample(500)
+        everyone.incoming.put_nowait(json.dumps({'type': 'subscribe', 'devices': ['b']}))
+        await send_sample(501)
+        everyone.incoming.put_nowait(json.dumps({'type': 'unsubscribe', 'devices': ['b']}))
+        only_a.incoming.put_nowait(json.dumps({'type': 'subscribe', 'devices': '*'}))
+        await send_sample(502)
+
+        for websocket in (*devices.values(), only_a, everyone):
+            websocket.incoming.put_nowait(None)
+        await asyncio.gather(*tasks)
+        return only_a, everyone
+
+    def samples(websocket):
+        messages = [json.loads(payload) for payload in websocket.sent]
+        return {(message['device_id'], message['value']) for message in messages if 'value' in message}
+
+    only_a, everyone = asyncio.run(run())
+    assert samples(only_a) == {('a', 500), ('a', 501), ('a', 502), ('b', 502)}
+    assert samples(everyone) == {('a', 500), ('b', 500), ('b', 501)}
+
+
+def test_dashboard_on_a_shard_without_the_device_gets_its_history(tmp_path):
+    owner, other = _server(tmp_path), _server(tmp_path)
+
+    async def run():
+        broker = MessageBroker()
+        broker_server = await asyncio.start_server(broker.handle, '127.0.0.1', 0)
+        port = broker_server.sockets[0].getsockname()[1]
+        for shard_id, server in enumerate((owner, other)):
+            server.bus = ClusterBus(server, shard_id, '127.0.0.1', port)
+            await server.bus.start()
+        device = FakeWebSocket('/?device_id=a')
+        device_task = asyncio.create_task(owner.handle_esp_connection(device))
+        await asyncio.sleep(0.05)
+        # No dashboard follows the device yet, so its samples are not routed to the other shard
+        for _ in range(10):
+            device.incoming.put_nowait(json.dumps({'type': 'data', 'value': 500}))
+        await owner.process_samples(owner.sessions['a'], np.full(500, NORMAL))
+        await asyncio.sleep(0.1)
+
+        dashboard = FakeWebSocket('/?rate=50')
+        dashboard_task = asyncio.create_task(other.handle_frontend_connection(dashboard))
+        await asyncio.sleep(0.05)
+        # Live points at the history rate continue from the snapshot
+        await owner.process_samples(owner.sessions['a'], np.full(50, ANOMALY))
+        await asyncio.sleep(0.1)
+        for websocket in (device, dashboard):
+            websocket.incoming.put_nowait(None)
+        await asyncio.gather(device_task, dashboard_task)
+        for server in (owner, other):
+            await server.bus.close()
+        broker_server.close()
+        await broker.close()
+        return [json.loads(payload) for payload in dashboard.sent]
+
+    messages = asyncio.run(run())
+    history = [message for message in messages if message['type'] == 'history']
+    assert [message['device_id'] for message in history] == ['a']
+    # 510 samples at 250 Hz, decimated to 50 points/s
+    assert len(history[0]['values']) == 102 and history[0]['display_rate'] == 50.0
+    assert set(history[0]['values'][-2:]) == {NORMAL}
+    batches = [message for message in messages if message['type'] == 'data_batch']
+    assert len(batches) == 1 and batches[0]['values'] == [ANOMALY] * 10
+
+
+def test_request_cancelled_by_the_backend_is_scored_as_normal(tmp_path):
+    server = _server(tmp_path)
+
+    async def cancelled(X, threshold):
+        raise asyncio.CancelledError()
+
+    server.backend.predict = cancelled
+    windows = np.full((2, 95), ANOMALY)
+    assert asyncio.run(server._score_windows(windows)) == [False, False]
+
+
+def test_model_is_warmed_up_before_connections_are_accepted(tmp_path, monkeypatch):
+    server = _server(tmp_path, warmup_batch_sizes=(1, 8))
+    events = []
+    predict = server.backend.predict
+
+    async def record_predict(X, threshold):
+        events.append(('predict', len(X)))
+        return await predict(X, threshold)
+
+    class FakeListener:
+        def close(self):
+            pass
+
+        async def wait_closed(self):
+            pass
+
+    async def serve(*args, **kwargs):
+        events.append(('listen', None))
+        return FakeListener()
+
+    server.backend.predict = record_predict
+    monkeypatch.setattr(ecg_server.websockets, 'serve', serve)
+
+    async def run():
+        task = asyncio.create_task(server.start_server('127.0.0.1', 0))
+        while ('listen', None) not in events:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+    asyncio.run(run())
+    assert events == [('predict', 1), ('predict', 8), ('listen', None)]
+    assert {'model_load', 'backend_start', 'warm_up', 'listen'} <= server.startup_timings.keys()
+
+
+def test_heavy_modules_are_imported_lazily(tmp_path):
+    model_path = _model_file(tmp_path)
+    # A fresh interpreter, since this test session has already imported scikit-learn
+    script = (
+        "import sys\n"
+        "from src.server.ecg_server import ECGServer\n"
+        "heavy = ('sklearn', 'joblib', 'scipy', 'torch', 'onnxruntime')\n"
+        "print(sorted(name for name in heavy if name in sys.modules))\n"
+        "ECGServer(sys.argv[1], inference_backend='process', inference_workers=1)\n"
+        "print(sorted(name for name in heavy if name in sys.modules))\n"
+    )
+    result = subprocess.run([sys.executable, '-c', script, str(model_path)], capture_output=True, text=True,
+                            cwd=Path(__file__).resolve().parents[2], timeout=120)
+    assert result.returncode == 0, result.stderr
+    # Process-backend workers load the model; the server process never needs scikit-learn
+    assert result.stdout.splitlines() == ['[]', '[]']
+
+
+def test_command_line_defaults_match_the_constructor(monkeypatch):
+    created = []
+
+    class RecordingServer:
+        def __init__(self, model_path, **options):
+            created.append((model_path, options))
+
+        async def start_server(self, host, port):
+            created.append((host, port))
+
+    monkeypatch.setattr(ecg_server, 'ECGServer', RecordingServer)
+    monkeypatch.setattr(ecg_server, 'configure_queue_logging', lambda: None)
+    ecg_server.main([])
+    ecg_server.main(['--model', 'm.joblib', '--port', '9000', '--backend', 'process', '--workers', '3',
+                     '--metrics-port', '9100', '--hop', '10', '--batch-wait-ms', '-1'])
+
+    defaults = {name: parameter.default for name, parameter in inspect.signature(ECGServer).parameters.items()
+                if parameter.default is not inspect.Parameter.empty}
+    (_, options), listen, (model_path, custom), custom_listen = created
+    assert options == defaults and listen == ('0.0.0.0', 8765)
+    assert model_path == 'm.joblib' and custom_listen == ('0.0.0.0', 9000)
+    assert custom == dict(defaults, inference_backend='process', inference_workers=3, metrics_port=9100,
+                          inference_hop=10, batch_max_wait=None)
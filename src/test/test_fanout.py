@@ -0,0 +1,55 @@
+import asyncio
+
+from src.server.fanout import COALESCE, DISCONNECT, DROP_OLDEST, FrontendClient
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+        self.closed_with = None
+
+    async def send(self, payload):
+        self.sent.append(payload)
+
+    async def close(self, code=1000, reason=''):
+        self.closed_with = (code, reason)
+
+
+def test_drop_oldest_keeps_newest_messages():
+    async def run():
+        websocket = FakeWebSocket()
+        client = FrontendClient(websocket, max_queue=2, overflow_policy=DROP_OLDEST)
+        for payload in ('a', 'b', 'c'):
+            client.enqueue(payload)
+        client.start()
+        await asyncio.sleep(0)
+        await client.stop()
+        return websocket.sent, client.dropped
+
+    sent, dropped = asyncio.run(run())
+    assert sent == ['b', 'c']
+    assert dropped == 1
+
+
+def test_coalesce_replaces_queued_message_with_same_key():
+    client = FrontendClient(FakeWebSocket(), max_queue=2, overflow_policy=COALESCE)
+    client.enqueue('status', key='status')
+    client.enqueue('data-1', key='data')
+    client.enqueue('data-2', key='data')
+
+    assert [payload for _, payload in client._queue] == ['status', 'data-2']
+
+
+def test_disconnect_policy_closes_slow_client():
+    async def run():
+        websocket = FakeWebSocket()
+        client = FrontendClient(websocket, max_queue=1, overflow_policy=DISCONNECT)
+        client.enqueue('a')
+        accepted = client.enqueue('b')
+        await asyncio.sleep(0)
+        return accepted, client.closed, websocket.closed_with
+
+    accepted, closed, closed_with = asyncio.run(run())
+    assert not accepted
+    assert closed
+    assert closed_with[0] == 1008
@@ -0,0 +1,35 @@
+from src.server.heartbeat import HeartbeatTracker
+
+
+def test_touch_postpones_expiry():
+    tracker = HeartbeatTracker(timeout=10)
+    tracker.touch('a', now=0)
+    tracker.touch('b', now=1)
+    tracker.touch('a', now=8)
+
+    assert tracker.expired(now=11) == ['b']
+    assert tracker.expired(now=17) == []
+    assert tracker.expired(now=18) == ['a']
+    assert len(tracker) == 0
+
+
+def test_removed_and_readded_keys():
+    tracker = HeartbeatTracker(timeout=10)
+    tracker.touch('a', now=0)
+    tracker.remove('a')
+    assert tracker.expired(now=20) == []
+
+    tracker.touch('a', now=30)
+    tracker.remove('a')
+    tracker.touch('a', now=35)
+    assert tracker.expired(now=44) == []
+    assert tracker.expired(now=45) == ['a']
+
+
+def test_many_sessions_expire_in_one_batch():
+    tracker = HeartbeatTracker(timeout=5)
+    for index in range(1000):
+        tracker.touch(index, now=index / 1000)
+
+    assert sorted(tracker.expired(now=6)) == list(range(1000))
+    assert tracker.next_deadline() is None
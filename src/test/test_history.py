@@ -0,0 +1,39 @@
+import numpy as np
+
+from src.server.decimation import MinMaxDecimator
+from src.server.history import DeviceHistory
+
+
+def test_snapshot_keeps_the_last_seconds_at_display_rate():
+    history = DeviceHistory(input_rate=250, output_rate=50, seconds=2)
+    samples = np.arange(1000, dtype=np.float32)  # 4 s of input
+    for start in range(0, 1000, 25):
+        history.push(samples[start:start + 25], np.zeros(25, dtype=bool), now=100.0 + (start + 25) / 250)
+
+    start_timestamp, values, anomalies = history.snapshot()
+    assert len(values) == 100
+    assert not anomalies.any()
+    # The newest bucket covered samples 990-999; its min/max are the last two points
+    assert values[-2:].tolist() == [990, 999]
+    assert start_timestamp == history.last_timestamp - 99 / 50
+
+
+def test_snapshot_continues_into_live_points():
+    history = DeviceHistory(input_rate=250, output_rate=50, seconds=60)
+    reference = MinMaxDecimator(250, 50)
+    rng = np.random.default_rng(1)
+    batches = [rng.integers(0, 1024, 37).astype(np.float32) for _ in range(20)]
+    expected = [reference.push(batch, np.zeros(len(batch), dtype=bool))[0] for batch in batches]
+
+    for batch in batches[:12]:
+        history.push(batch, np.zeros(len(batch), dtype=bool), now=0.0)
+    _, snapshot, _ = history.snapshot()
+    live = [history.push(batch, np.zeros(len(batch), dtype=bool), now=0.0)[0] for batch in batches[12:]]
+
+    np.testing.assert_array_equal(np.concatenate([snapshot] + live), np.concatenate(expected))
+
+
+def test_empty_history():
+    history = DeviceHistory(input_rate=250, output_rate=50, seconds=30)
+    assert len(history) == 0
+    assert len(history.snapshot()[1]) == 0
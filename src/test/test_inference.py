@@ -0,0 +1,180 @@
+import asyncio
+import os
+import signal
+from concurrent.futures import Future
+from multiprocessing import shared_memory
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+
+from src.server import inference
+from src.server.inference import ProcessInferenceBackend, ThreadInferenceBackend, _worker_ping, validate_model
+
+
+def _fit(features):
+    rng = np.random.default_rng(0)
+    X = rng.random((40, features))
+    return LogisticRegression().fit(X, X[:, 0] > 0.5)
+
+
+def test_validate_model_checks_window_size():
+    canary = np.full((3, 95), 0.5)
+    result = validate_model(_fit(95), canary, 0.5)
+    assert result.probabilities.shape == (3,)
+    with pytest.raises(ValueError):
+        validate_model(_fit(10), canary, 0.5)
+
+
+def test_thread_backend_reload_keeps_old_model_on_failure(tmp_path):
+    old, new = _fit(95), _fit(95)
+    joblib.dump(new, tmp_path / 'new.joblib')
+    joblib.dump(_fit(10), tmp_path / 'wrong.joblib')
+    backend = ThreadInferenceBackend(old)
+    canary = np.full((2, 95), 0.5)
+
+    async def run():
+        with pytest.raises(ValueError):
+            await backend.reload(tmp_path / 'wrong.joblib', canary, 0.5)
+        assert backend.model is old
+        await backend.reload(tmp_path / 'new.joblib', canary, 0.5)
+        return await backend.predict(canary, 0.5)
+
+    result = asyncio.run(run())
+    assert backend.model is not old
+    assert result.labels.shape == (2,)
+
+
+class HungExecutor:
+    """Stands in for a worker pool that stopped picking up work."""
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, fn, *args):
+        future = Future()
+        self.futures.append(future)
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        if cancel_futures:
+            for future in self.futures:
+                future.cancel()
+
+
+def _process_backend(tmp_path, **options):
+    model = _fit(95)
+    joblib.dump(model, tmp_path / 'model.joblib')
+    backend = ProcessInferenceBackend(tmp_path / 'model.joblib', workers=1, max_rows=4, health_interval=60.0,
+                                      **options)
+    return backend, model
+
+
+def test_process_backend_matches_model_and_releases_shared_memory(tmp_path):
+    backend, model = _process_backend(tmp_path)
+    X = np.random.default_rng(1).random((10, 95)).astype(np.float32)
+
+    async def run():
+        await backend.start()
+        names = [segment.name for segment in backend._segments]
+        try:
+            return names, await backend.predict(X, 0.5)
+        finally:
+            await backend.close()
+
+    names, result = asyncio.run(run())
+    np.testing.assert_allclose(result.probabilities, model.predict_proba(X)[:, 1], rtol=1e-6)
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+
+
+def test_process_backend_restart_resubmits_queued_windows(tmp_path):
+    backend, model = _process_backend(tmp_path)
+    X = np.random.default_rng(2).random((3, 95)).astype(np.float32)
+
+    async def run():
+        await backend.start()
+        workers, hung = backend._executor, HungExecutor()
+        backend._executor = hung
+        try:
+            request = asyncio.create_task(backend.predict(X, 0.5))
+            await asyncio.sleep(0.05)
+            assert not request.done() and len(hung.futures) == 1
+            # What a failed health check does: the windows queued on the stuck pool move to a new one
+            backend._restart("health check failed (TimeoutError)")
+            return await asyncio.wait_for(request, 30.0)
+        finally:
+            workers.shutdown(wait=True)
+            await backend.close()
+
+    result = asyncio.run(run())
+    assert backend.restarts == 1
+    np.testing.assert_allclose(result.probabilities, model.predict_proba(X)[:, 1], rtol=1e-6)
+
+
+def test_process_backend_recovers_from_a_worker_crash(tmp_path):
+    backend, model = _process_backend(tmp_path)
+    X = np.random.default_rng(3).random((2, 95)).astype(np.float32)
+
+    async def run():
+        await backend.start()
+        try:
+            pid = await asyncio.get_running_loop().run_in_executor(backend._executor, _worker_ping)
+            os.kill(pid, signal.SIGKILL)
+            await asyncio.sleep(0.2)
+            return await asyncio.wait_for(backend.predict(X, 0.5), 30.0)
+        finally:
+            await backend.close()
+
+    result = asyncio.run(run())
+    assert backend.restarts == 1
+    np.testing.assert_allclose(result.probabilities, model.predict_proba(X)[:, 1], rtol=1e-6)
+
+
+def test_health_check_does_not_ping_a_busy_pool_that_is_making_progress(tmp_path):
+    backend, model = _process_backend(tmp_path)
+    X = np.random.default_rng(4).random((2, 95)).astype(np.float32)
+
+    async def run():
+        await backend.start()
+        backend.health_timeout = 0.3
+        workers, hung = backend._executor, HungExecutor()
+        backend._executor = hung
+        try:
+            request = asyncio.create_task(backend.predict(X, 0.5))
+            await asyncio.sleep(0.05)
+            # Windows are in flight and the pool went busy recently: no ping is queued behind them
+            await backend._check_health()
+            assert backend.restarts == 0 and len(hung.futures) == 1
+            # Nothing has completed for longer than the timeout: the pool is restarted
+            await asyncio.sleep(0.3)
+            await backend._check_health()
+            assert backend.restarts == 1
+            return await asyncio.wait_for(request, 30.0)
+        finally:
+            workers.shutdown(wait=True)
+            await backend.close()
+
+    result = asyncio.run(run())
+    np.testing.assert_allclose(result.probabilities, model.predict_proba(X)[:, 1], rtol=1e-6)
+
+
+def test_worker_segments_are_untracked_and_closed_on_exit(monkeypatch):
+    slot = shared_memory.SharedMemory(create=True, size=4 * 95 * 4)
+    registered = []
+    monkeypatch.setattr(inference.resource_tracker, 'register', lambda name, rtype: registered.append(name))
+    monkeypatch.setattr(inference, '_worker_model', _fit(95))
+    try:
+        inference._worker_predict(slot.name, 2, 95, 0.5)
+        attached = inference._worker_segments[slot.name]
+        # Only the parent that created the slot tracks and unlinks it
+        assert registered == []
+        inference._close_worker_segments()
+        assert inference._worker_segments == {}
+        with pytest.raises(TypeError):
+            attached.buf[0]
+    finally:
+        slot.close()
+        slot.unlink()
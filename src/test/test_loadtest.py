@@ -0,0 +1,20 @@
+from src.server.loadtest import histogram_delta, parse_prometheus
+from src.server.metrics import MetricsRegistry
+
+
+def test_histogram_delta_between_scrapes():
+    registry = MetricsRegistry()
+    latency = registry.histogram('latency_seconds', 'Latency', {'stage': 'inference'}, buckets=(0.01, 0.1, 1.0))
+    registry.counter('samples_total', 'Samples').inc(5)
+    latency.observe(0.5)
+    before = parse_prometheus(registry.render())
+    for value in (0.005, 0.05, 0.05, 0.05, 2.0):
+        latency.observe(value)
+    after = parse_prometheus(registry.render())
+
+    assert after[('samples_total', ())] == 5.0
+    delta = histogram_delta(before, after, 'latency_seconds', stage='inference')
+    assert delta.count == 5
+    assert delta.counts == [1, 3, 0, 1]
+    assert delta.quantile(0.5) == 0.1
+    assert delta.quantile(1.0) == float('inf')
@@ -0,0 +1,82 @@
+import logging
+import queue
+
+from src.server import logging_setup
+from src.server.logging_setup import NonBlockingQueueHandler, RateLimitedLog, _stop_listener, configure_queue_logging
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class Unformattable:
+    def __str__(self):
+        raise AssertionError("formatted a disabled message")
+
+
+def _logger(name, level=logging.DEBUG):
+    logger = logging.getLogger(name)
+    logger.handlers.clear()
+    logger.propagate = False
+    logger.setLevel(level)
+    handler = ListHandler()
+    logger.addHandler(handler)
+    return logger, handler
+
+
+def test_rate_limited_log_reports_suppressed_messages(monkeypatch):
+    logger, handler = _logger('test.rate_limited')
+    now = [100.0]
+    monkeypatch.setattr(logging_setup.time, 'monotonic', lambda: now[0])
+    log = RateLimitedLog(logger, interval=1.0)
+
+    for value in range(5):
+        log.warning("Value out of range: %s", value)
+        now[0] += 0.1
+    log.warning("Another message")
+    now[0] = 101.5
+    log.warning("Value out of range: %s", 9)
+
+    messages = [record.getMessage() for record in handler.records]
+    assert messages == [
+        "Value out of range: 0",
+        "Another message",
+        "Value out of range: 9 (4 similar messages suppressed)",
+    ]
+
+
+def test_rate_limited_log_skips_disabled_levels():
+    logger, handler = _logger('test.rate_limited_disabled', level=logging.INFO)
+    log = RateLimitedLog(logger)
+    log.debug("Window: %s", Unformattable())
+    assert handler.records == [] and log._state == {}
+
+
+def test_queue_logging_delivers_records_and_stops_cleanly():
+    logger, handler = _logger('test.queue_logging')
+    listener = configure_queue_logging(logger=logger)
+    assert len(logger.handlers) == 1 and isinstance(logger.handlers[0], NonBlockingQueueHandler)
+
+    for number in range(20):
+        logger.info("record %d", number)
+    thread = listener._thread
+    listener.stop()  # Drains the queue before the thread exits
+    assert not thread.is_alive()
+    assert [record.getMessage() for record in handler.records] == [f"record {number}" for number in range(20)]
+    _stop_listener(listener)  # The exit hook tolerates an already stopped listener
+
+
+def test_full_queue_drops_instead_of_blocking():
+    handler = NonBlockingQueueHandler(queue.Queue(1))
+    logger = logging.getLogger('test.queue_full')
+    logger.handlers.clear()
+    logger.propagate = False
+    logger.addHandler(handler)
+    logger.warning("kept")
+    logger.warning("dropped")
+    assert handler.dropped == 1 and handler.queue.get_nowait().getMessage() == "kept"
@@ -0,0 +1,28 @@
+from src.server.metrics import MetricsRegistry
+
+
+def test_histogram_renders_cumulative_prometheus_buckets():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('stage_seconds', 'Stage latency', {'stage': 'inference'}, buckets=(0.01, 0.1))
+    for value in (0.005, 0.05, 0.05, 3.0):
+        histogram.observe(value)
+
+    text = registry.render()
+
+    assert '# TYPE stage_seconds histogram' in text
+    assert 'stage_seconds_bucket{stage="inference",le="0.01"} 1' in text
+    assert 'stage_seconds_bucket{stage="inference",le="0.1"} 3' in text
+    assert 'stage_seconds_bucket{stage="inference",le="+Inf"} 4' in text
+    assert 'stage_seconds_count{stage="inference"} 4' in text
+    assert histogram.quantile(0.5) == 0.1
+
+
+def test_counter_and_callback_gauge():
+    registry = MetricsRegistry()
+    registry.counter('samples_total', 'Samples').inc(250)
+    registry.gauge('clients', 'Clients', callback=lambda: 3)
+
+    text = registry.render()
+
+    assert 'samples_total 250.0' in text
+    assert 'clients 3' in text
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from src.models.onnx_export import ParityError, check_parity
+from src.models.runtime import ONNX_RUNTIME, SKLEARN_RUNTIME, load_model_file, model_file_for
+
+
+def _pipeline(rows=400, features=12):
+    rng = np.random.default_rng(5)
+    X = rng.normal(500, 120, (rows, features))
+    y = (X[:, 0] - X[:, 4] > 0).astype(int)
+    model = Pipeline([('scaler', StandardScaler()),
+                      ('classifier', RandomForestClassifier(n_estimators=10, max_depth=5, random_state=0))])
+    return model.fit(X, y), X
+
+
+def test_onnx_runtime_reads_export_next_to_joblib():
+    assert model_file_for('models/rf_model.joblib', ONNX_RUNTIME) == 'models/rf_model.onnx'
+    assert model_file_for('models/rf_model.onnx', ONNX_RUNTIME) == 'models/rf_model.onnx'
+    assert model_file_for('models/rf_model.joblib', SKLEARN_RUNTIME) == 'models/rf_model.joblib'
+    with pytest.raises(ValueError):
+        load_model_file('models/rf_model.joblib', 'gpu')
+
+
+def test_check_parity_tolerates_rare_split_flips():
+    model, X = _pipeline()
+
+    class Shifted:
+        def __init__(self, rows):
+            self.rows = rows
+
+        def predict_proba(self, X):
+            proba = model.predict_proba(X).copy()
+            proba[self.rows, 1] += 0.5
+            return proba
+
+    report = check_parity(model.predict_proba, Shifted([0]), X, max_mismatch=0.01)
+    assert report.rows == len(X) and report.max_abs_diff == pytest.approx(0.5)
+    with pytest.raises(ParityError):
+        check_parity(model.predict_proba, Shifted(slice(0, 40)), X, max_mismatch=0.01)
+
+
+def test_exported_pipeline_matches_sklearn(tmp_path):
+    pytest.importorskip('skl2onnx')
+    pytest.importorskip('onnxruntime')
+    import joblib
+    from src.models.model import ECGAnomalyDetector
+    from src.models.onnx_export import export_pipeline
+
+    model, X = _pipeline()
+    model_path = tmp_path / 'rf_model.joblib'
+    joblib.dump(model, model_path)
+    report = export_pipeline(model, str(tmp_path / 'rf_model.onnx'), X)
+    assert report.mismatch_fraction <= 0.001
+
+    detector = ECGAnomalyDetector(str(model_path), runtime=ONNX_RUNTIME)
+    assert detector.model.n_features_in_ == 12
+    np.testing.assert_allclose(detector.predict_proba(X[:5]), model.predict_proba(X[:5]), atol=1e-4)
+    detector.check_parity(X)
@@ -0,0 +1,56 @@
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+
+from src.models.model import ECGAnomalyDetector
+from src.models.prediction import predict_with_proba
+
+
+class CountingModel:
+    """Fitted classifier that counts how often it is asked to score."""
+
+    def __init__(self, model):
+        self.model = model
+        self.calls = []
+
+    def predict_proba(self, X):
+        self.calls.append(('predict_proba', len(X)))
+        return self.model.predict_proba(X)
+
+    def predict(self, X):
+        self.calls.append(('predict', len(X)))
+        return self.model.predict(X)
+
+
+def _model():
+    rng = np.random.default_rng(3)
+    X = rng.normal(0, 1, (300, 10))
+    y = (X[:, :3].mean(axis=1) > 0).astype(int)
+    return CountingModel(RandomForestClassifier(n_estimators=10, max_depth=4, random_state=0).fit(X, y)), X
+
+
+def test_labels_and_probabilities_come_from_one_model_pass():
+    model, X = _model()
+    result = predict_with_proba(model, X[:40], threshold=0.3)
+    assert model.calls == [('predict_proba', 40)]
+    expected = model.model.predict_proba(X[:40])[:, 1]
+    np.testing.assert_array_equal(result.probabilities, expected)
+    np.testing.assert_array_equal(result.labels, (expected >= 0.3).astype(int))
+    assert result.threshold == 0.3
+
+
+def test_threshold_is_inclusive_and_single_windows_are_reshaped():
+    model, X = _model()
+    probability = model.model.predict_proba(X[:1])[0, 1]
+    result = predict_with_proba(model, X[0], threshold=probability)
+    assert result.labels.tolist() == [1] and result.probabilities.shape == (1,)
+
+
+def test_detector_predict_uses_the_single_pass():
+    model, X = _model()
+    detector = ECGAnomalyDetector(threshold=0.7)
+    detector.model = model
+    labels = detector.predict(X)
+    result = detector.predict_with_proba(X)
+    assert model.calls == [('predict_proba', 300)] * 2
+    np.testing.assert_array_equal(labels, result.labels)
+    np.testing.assert_array_equal(labels, (result.probabilities >= 0.7).astype(int))
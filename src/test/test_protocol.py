@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from src.server.protocol import (
+    ESP_FRAME_HEADER, FrameError, decode_esp_frame, decode_frontend_frame, encode_esp_frame,
+    encode_frontend_frame, valid_sample_mask
+)
+
+
+def test_esp_frame_round_trip():
+    """Decoded samples match the encoded ones and share the payload buffer"""
+    samples = np.arange(0, 250, dtype=np.uint16)
+    payload = encode_esp_frame(samples, sequence=7, device_timestamp_ms=123456)
+
+    frame = decode_esp_frame(payload)
+
+    assert frame.sequence == 7
+    assert frame.device_timestamp_ms == 123456
+    np.testing.assert_array_equal(frame.samples, samples)
+    assert not frame.samples.flags.owndata
+
+
+def test_esp_frame_rejects_truncated_payload():
+    payload = encode_esp_frame([1, 2, 3], sequence=0, device_timestamp_ms=0)
+    with pytest.raises(FrameError):
+        decode_esp_frame(payload[:-1])
+    with pytest.raises(FrameError):
+        decode_esp_frame(payload[:ESP_FRAME_HEADER.size - 1])
+
+
+def test_valid_sample_mask():
+    samples = np.array([0, 512, 1023, 1024, 4095], dtype=np.uint16)
+    np.testing.assert_array_equal(valid_sample_mask(samples), [True, True, True, False, False])
+
+
+def test_frontend_frame_round_trip_uses_int16_for_whole_values():
+    values = np.array([512, 530, 900, 100, 0], dtype=np.float32)
+    anomalies = np.array([False, True, True, False, True])
+
+    payload = encode_frontend_frame('patient-7', 1700000000.5, 0.004, values, anomalies)
+    frame = decode_frontend_frame(payload)
+
+    assert frame.device_id == 'patient-7'
+    assert frame.start_timestamp == 1700000000.5
+    assert frame.values.dtype == np.int16
+    np.testing.assert_array_equal(frame.values, values)
+    np.testing.assert_array_equal(frame.anomalies, anomalies)
+
+
+def test_frontend_frame_keeps_fractional_values_as_float32():
+    payload = encode_frontend_frame('a', 0.0, 0.02, np.array([1.5, 2.25]), np.zeros(2, dtype=bool))
+    frame = decode_frontend_frame(payload)
+
+    assert frame.values.dtype == np.float32
+    np.testing.assert_allclose(frame.values, [1.5, 2.25])
+
+
+def test_frontend_frame_history_flag():
+    payload = encode_frontend_frame('a', 0.0, 0.02, np.array([1, 2]), np.zeros(2, dtype=bool), history=True)
+    frame = decode_frontend_frame(payload)
+
+    assert frame.history
+    assert frame.values.dtype == np.int16
+    assert not decode_frontend_frame(encode_frontend_frame('a', 0.0, 0.02, [1], [False])).history
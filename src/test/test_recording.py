@@ -0,0 +1,91 @@
+import numpy as np
+
+from src.server.recording import INDEX_DTYPE, RecordingReader, RecordingStore
+
+
+def test_round_trip_across_chunks(tmp_path):
+    store = RecordingStore(tmp_path, sampling_rate=250, chunk_samples=100)
+    samples = np.arange(1000) % 1024
+    for start in range(0, 1000, 37):
+        batch = samples[start:start + 37]
+        store.append('esp-1', batch, end_timestamp=1000.0 + (start + len(batch) - 1) / 250)
+    store.close()
+
+    reader = RecordingReader(tmp_path, 'esp-1')
+    assert len(reader) == 1000
+    assert len(reader.index) == 10
+    np.testing.assert_array_equal(reader.read(), samples)
+    np.testing.assert_array_equal(reader.read(95, 305), samples[95:305])
+    assert reader.timestamp_of(0) == 1000.0
+    assert abs(reader.timestamp_of(250) - 1001.0) < 1e-9
+    reader.close()
+
+
+def test_reopened_store_appends(tmp_path):
+    store = RecordingStore(tmp_path, chunk_samples=64)
+    store.append('esp/1', np.full(100, 7), end_timestamp=10.0)
+    store.close()
+    store = RecordingStore(tmp_path, chunk_samples=64)
+    store.append('esp/1', np.full(30, 9), end_timestamp=20.0)
+    store.close()
+
+    reader = RecordingReader(tmp_path, 'esp/1')
+    data = reader.read()
+    assert len(data) == 130
+    assert (data[:100] == 7).all() and (data[100:] == 9).all()
+    assert reader.index['first_sample'].tolist() == [0, 64, 100]
+    reader.close()
+
+
+def test_missing_stream_is_empty(tmp_path):
+    reader = RecordingReader(tmp_path, 'nothing')
+    assert len(reader) == 0
+    assert len(reader.read()) == 0
+
+
+def test_reopening_discards_a_crashed_tail(tmp_path):
+    store = RecordingStore(tmp_path, chunk_samples=64)
+    store.append('esp-1', np.full(128, 7), end_timestamp=10.0)
+    store.close()
+    # A crash mid-write: part of a chunk's data and part of its index record
+    with open(tmp_path / 'esp-1' / 'samples.dat', 'ab') as f:
+        f.write(b'\x78\x01partial')
+    with open(tmp_path / 'esp-1' / 'index.dat', 'ab') as f:
+        f.write(b'\x00' * (INDEX_DTYPE.itemsize // 2))
+
+    store = RecordingStore(tmp_path, chunk_samples=64)
+    store.append('esp-1', np.full(100, 9), end_timestamp=20.0)
+    store.close()
+
+    reader = RecordingReader(tmp_path, 'esp-1')
+    data = reader.read()
+    assert len(data) == 228 and len(reader.index) == 4
+    assert (data[:128] == 7).all() and (data[128:] == 9).all()
+    reader.close()
+
+
+def test_timestamps_inside_the_final_partial_chunk(tmp_path):
+    store = RecordingStore(tmp_path, sampling_rate=250, chunk_samples=100)
+    store.append('esp-1', np.zeros(150), end_timestamp=1000.0 + 149 / 250)
+    store.flush('esp-1')
+    store.close()
+
+    reader = RecordingReader(tmp_path, 'esp-1')
+    assert len(reader.index) == 2
+    assert abs(reader.timestamp_of(120) - (1000.0 + 120 / 250)) < 1e-9
+    assert abs(reader.timestamp_of(149) - (1000.0 + 149 / 250)) < 1e-9
+    reader.close()
+
+
+def test_device_ids_map_to_distinct_directories(tmp_path):
+    store = RecordingStore(tmp_path, chunk_samples=10)
+    device_ids = ['esp/1', 'esp_1', 'esp%2F1', '..', '']
+    for number, device_id in enumerate(device_ids):
+        store.append(device_id, np.full(10, number), end_timestamp=1.0)
+    store.close()
+
+    assert len(list(tmp_path.iterdir())) == len(device_ids)
+    for number, device_id in enumerate(device_ids):
+        reader = RecordingReader(tmp_path, device_id)
+        assert (reader.read() == number).all() and len(reader) == 10
+        reader.close()
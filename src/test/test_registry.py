@@ -0,0 +1,64 @@
+import json
+import os
+
+import numpy as np
+import pytest
+from sklearn.ensemble import GradientBoostingClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from src.models.model import load_registered_model
+from src.models.registry import ModelRegistry, load_entry
+from src.models.runtime import MMAP_RUNTIME, load_model_file
+
+
+def _pipeline():
+    rng = np.random.default_rng(4)
+    X = rng.normal(500, 100, (300, 10))
+    y = (X[:, 1] > X[:, 2]).astype(int)
+    model = Pipeline([('scaler', StandardScaler()),
+                      ('classifier', GradientBoostingClassifier(n_estimators=15, random_state=0))])
+    return model.fit(X, y), X
+
+
+def test_registered_model_is_memory_mapped_and_matches(tmp_path):
+    model, X = _pipeline()
+    registry = ModelRegistry(tmp_path)
+    first = registry.register('boosting', model, threshold=0.3)
+    second = registry.register('boosting', model, threshold=0.4)
+
+    assert (first['version'], second['version']) == (1, 2)
+    assert registry.names() == ['boosting'] and registry.versions('boosting') == [1, 2]
+    assert first['checksum'] == second['checksum'] and first['n_features'] == 10
+
+    loaded, metadata = registry.load('boosting', verify=True)
+    assert metadata['version'] == 2 and metadata['threshold'] == 0.4
+    assert isinstance(loaded.threshold, np.memmap) or isinstance(loaded.threshold.base, np.memmap)
+    assert not loaded.threshold.flags.writeable
+    np.testing.assert_allclose(loaded.predict_proba(X), model.predict_proba(X), atol=1e-9)
+
+    # The runtime accepts a model name directory (latest version) or a version directory
+    latest = load_model_file(os.path.join(tmp_path, 'boosting'), MMAP_RUNTIME)
+    np.testing.assert_allclose(latest.predict_proba(X[:5]), model.predict_proba(X[:5]), atol=1e-9)
+    detector = load_registered_model(tmp_path, 'boosting', version=1)
+    assert detector.threshold == 0.3
+    np.testing.assert_array_equal(detector.predict(X), (model.predict_proba(X)[:, 1] >= 0.3).astype(int))
+
+
+def test_registry_rejects_tampering_and_duplicates(tmp_path):
+    model, _ = _pipeline()
+    registry = ModelRegistry(tmp_path)
+    registry.register('boosting', model)
+    with pytest.raises(ValueError):
+        registry.register('boosting', model, version=1)
+    with pytest.raises(KeyError):
+        registry.load('missing')
+
+    path = registry.path('boosting')
+    with open(os.path.join(path, 'value.npy'), 'r+b') as f:
+        f.seek(-8, os.SEEK_END)
+        f.write(b'\x00' * 8)
+    with pytest.raises(ValueError):
+        load_entry(path, verify=True)
+    with open(os.path.join(path, 'metadata.json')) as f:
+        assert json.load(f)['name'] == 'boosting'
@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from src.utils.ring_buffer import ECGRingBuffer
+
+
+def test_window_matches_last_samples_after_wraparound():
+    """Single and batch appends both produce the most recent samples in order"""
+    buffer = ECGRingBuffer(5)
+    for value in range(3):
+        buffer.append(value)
+    buffer.extend(np.arange(3, 12))
+
+    assert buffer.is_full
+    assert buffer.total_samples == 12
+    np.testing.assert_array_equal(buffer.window(), [7, 8, 9, 10, 11])
+    np.testing.assert_array_equal(buffer.window(3, end_offset=1), [8, 9, 10])
+
+
+def test_window_is_a_view_without_reallocation():
+    buffer = ECGRingBuffer(4)
+    buffer.extend([1, 2, 3, 4, 5, 6])
+    storage = buffer._data
+
+    window = buffer.window()
+
+    assert np.shares_memory(window, storage)
+    assert window.dtype == np.float32
+    assert buffer.nbytes == storage.nbytes
+
+
+def test_window_larger_than_buffered_samples_raises():
+    buffer = ECGRingBuffer(4)
+    buffer.extend([1, 2])
+    with pytest.raises(ValueError):
+        buffer.window(3)
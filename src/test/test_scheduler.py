@@ -0,0 +1,19 @@
+from src.server.scheduler import InferenceScheduler
+
+
+def test_hop_schedule_returns_every_window_due_in_a_batch():
+    scheduler = InferenceScheduler(window_size=95, hop_size=25)
+
+    assert scheduler.due_windows(94) == []
+    assert scheduler.due_windows(95) == [95]
+    assert scheduler.due_windows(110) == []
+    assert scheduler.due_windows(200) == [120, 145, 170, 195]
+    assert scheduler.due_windows(220) == [220]
+
+
+def test_time_budget_schedule_scores_latest_window_once_per_interval():
+    scheduler = InferenceScheduler(window_size=95, hop_size=None, interval_ms=100)
+
+    assert scheduler.due_windows(95, now=10.0) == [95]
+    assert scheduler.due_windows(110, now=10.05) == []
+    assert scheduler.due_windows(130, now=10.2) == [130]
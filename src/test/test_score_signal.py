@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import RandomForestClassifier
+
+from src.models.model import ECGAnomalyDetector
+from src.models.prediction import score_signal, sliding_windows
+
+WINDOW = 20
+
+
+def _detector():
+    rng = np.random.default_rng(2)
+    X = rng.normal(0, 1, (300, WINDOW))
+    y = (X[:, :5].mean(axis=1) > 0).astype(int)
+    detector = ECGAnomalyDetector(threshold=0.4)
+    detector.model = RandomForestClassifier(n_estimators=10, max_depth=4, random_state=0).fit(X, y)
+    return detector
+
+
+def test_sliding_windows_are_views():
+    signal = np.arange(50.0)
+    windows = sliding_windows(signal, WINDOW, hop=7)
+    assert windows.shape == (5, WINDOW) and np.shares_memory(windows, signal)
+    np.testing.assert_array_equal(windows[2], signal[14:34])
+    assert sliding_windows(signal[:10], WINDOW).shape == (0, WINDOW)
+    with pytest.raises(ValueError):
+        sliding_windows(np.zeros((2, 3, 4)), WINDOW)
+
+
+def test_score_signal_matches_scoring_each_window():
+    detector = _detector()
+    signal = np.random.default_rng(5).normal(0, 1, 1000)
+    # A budget of three windows forces many chunks
+    scores = detector.score_signal(signal, hop=3, memory_budget=3 * WINDOW * 8)
+
+    expected_offsets = np.arange(0, len(signal) - WINDOW + 1, 3)
+    np.testing.assert_array_equal(scores.offsets, expected_offsets)
+    expected = detector.predict_with_proba(np.stack([signal[o:o + WINDOW] for o in expected_offsets]))
+    np.testing.assert_allclose(scores.probabilities, expected.probabilities)
+    np.testing.assert_array_equal(scores.labels, expected.labels)
+    assert scores.threshold == 0.4
+
+
+def test_multi_lead_signals_are_scored_per_lead():
+    detector = _detector()
+    leads = np.random.default_rng(6).normal(0, 1, (200, 3))
+    scores = score_signal(detector.model, leads, WINDOW, hop=10, memory_budget=1)
+
+    assert scores.probabilities.shape == (len(scores.offsets), 3)
+    for lead in range(3):
+        single = detector.score_signal(leads[:, lead], hop=10)
+        np.testing.assert_allclose(scores.probabilities[:, lead], single.probabilities)
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+from src.features.beat_features import beat_segment_features, spectral_features
+from src.features.streaming import SlidingSpectrum, StreamingFeaturePipeline, StreamingRPeakDetector
+
+FS = 250
+
+
+def _ecg(seconds=40, seed=0):
+    """Synthetic ECG in ADC units: P, QRS, S and T waves at irregular RR intervals plus wander and noise."""
+    rng = np.random.default_rng(seed)
+    n = FS * seconds
+    t = np.arange(n) / FS
+    peaks = []
+    position = FS
+    while position < n - FS:
+        peaks.append(position)
+        position += int(FS * rng.uniform(0.65, 1.0))
+    signal = np.zeros(n)
+    for peak in peaks:
+        for offset, amplitude, width in ((-0.16, 0.15, 0.02), (0.0, 1.2, 0.01), (0.03, -0.2, 0.008), (0.28, 0.3, 0.04)):
+            signal += amplitude * np.exp(-(t - (peak / FS + offset)) ** 2 / (2 * width ** 2))
+    signal += 0.3 * np.sin(2 * np.pi * 0.2 * t) + rng.normal(0, 0.03, n)
+    return signal * 300 + 500, np.array(peaks)
+
+
+def _feed(consumer, signal, chunk):
+    results = []
+    for start in range(0, len(signal), chunk):
+        results.extend(consumer.update(signal[start:start + chunk]) or [])
+    return results
+
+
+def test_detector_finds_every_beat_regardless_of_chunking():
+    signal, true_peaks = _ecg()
+    found = {chunk: _feed(StreamingRPeakDetector(FS), signal, chunk) for chunk in (1, 7, 25, 400)}
+    assert found[1] == found[7] == found[25] == found[400]
+
+    found = np.array(found[25])
+    # Every beat after the learning period is found once, within a sample of the true R peak
+    expected = true_peaks[true_peaks >= found[0]]
+    assert len(found) == len(expected)
+    assert np.abs(found - expected).max() <= 1
+
+
+def test_sliding_spectrum_matches_fft_of_the_window():
+    signal, _ = _ecg(seconds=20)
+    spectrum = SlidingSpectrum(4 * FS, FS)
+    assert spectrum.features() == {}
+    fed = 0
+    for chunk in (13, 1, 250, 7) * 40:
+        spectrum.update(signal[fed:fed + chunk])
+        fed += chunk
+        if fed >= 4 * FS and fed % 3 == 0:
+            window = signal[fed - 4 * FS:fed]
+            window = (window - window.mean()) / window.std()
+            expected = spectral_features(np.abs(np.fft.rfft(window)), np.fft.rfftfreq(len(window), 1 / FS))
+            actual = spectrum.features()
+            assert actual['dominant_frequency'] == expected['dominant_frequency']
+            assert actual['spectral_power'] == pytest.approx(expected['spectral_power'], rel=1e-6)
+            assert actual['spectral_entropy'] == pytest.approx(expected['spectral_entropy'], rel=1e-6)
+        if fed > len(signal) - 250:
+            break
+
+
+def test_pipeline_featurizes_each_beat_once():
+    signal, _ = _ecg()
+    pipeline = StreamingFeaturePipeline(FS)
+    beats = _feed(pipeline, signal, 25)
+    peaks = _feed(StreamingRPeakDetector(FS), signal, 25)
+    assert [beat.r_peak for beat in beats] == peaks
+
+    beat = beats[5]
+    stored = signal.astype(np.float32)  # The pipeline buffers samples as float32, like the server
+    expected = beat_segment_features(stored[beat.r_peak - 75:beat.r_peak + 125], FS, 75)
+    for name, value in expected.items():
+        assert beat.features[name] == pytest.approx(value, rel=1e-5, abs=1e-6)
+    assert beat.rr_interval == (beat.r_peak - beats[4].r_peak) / FS
+    assert beat.heart_rate == pytest.approx(60 / beat.rr_interval)
+    assert beats[0].rr_interval is None
+    assert {'st_deviation', 'window_dominant_frequency', 'window_spectral_entropy'} <= beat.features.keys()
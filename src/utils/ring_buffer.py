@@ -0,0 +1,85 @@
+import numpy as np
+
+
+class ECGRingBuffer:
+    """
+    Fixed-capacity ring buffer of ECG samples backed by preallocated float32 storage.
+
+    Every sample is written twice (at ``i`` and ``i + capacity``) so that any
+    window over the most recent ``capacity`` samples is a contiguous slice of
+    the storage and can be returned as a view without copying or reallocating.
+    """
+
+    def __init__(self, capacity: int, dtype=np.float32):
+        if capacity <= 0:
+            raise ValueError(f"Ring buffer capacity must be positive, got {capacity}")
+        self.capacity = capacity
+        self._data = np.zeros(2 * capacity, dtype=dtype)
+        self._head = 0  # Next write position in [0, capacity)
+        self._count = 0
+        self.total_samples = 0  # Samples appended since creation or last clear()
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def is_full(self) -> bool:
+        return self._count == self.capacity
+
+    @property
+    def nbytes(self) -> int:
+        """Memory held by the sample storage, in bytes."""
+        return self._data.nbytes
+
+    def append(self, value: float):
+        """Append a single sample."""
+        self._data[self._head] = value
+        self._data[self._head + self.capacity] = value
+        self._head = (self._head + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+        self.total_samples += 1
+
+    def extend(self, values):
+        """Append a batch of samples; only the last ``capacity`` are retained."""
+        values = np.asarray(values)
+        n = len(values)
+        if n == 0:
+            return
+        self.total_samples += n
+        if n > self.capacity:
+            values = values[-self.capacity:]
+            n = self.capacity
+        first = min(n, self.capacity - self._head)
+        for offset in (0, self.capacity):
+            self._data[self._head + offset:self._head + offset + first] = values[:first]
+            self._data[offset:offset + n - first] = values[first:]
+        self._head = (self._head + n) % self.capacity
+        self._count = min(self._count + n, self.capacity)
+
+    def window(self, size: int = None, end_offset: int = 0) -> np.ndarray:
+        """
+        Return a read-only view of ``size`` consecutive samples.
+
+        Args:
+            size: Number of samples in the window (defaults to all held samples)
+            end_offset: How many of the newest samples to skip, i.e. the window
+                ends ``end_offset`` samples before the most recent one
+
+        Returns:
+            Contiguous view into the buffer storage (valid until the next write)
+        """
+        if size is None:
+            size = self._count
+        if size + end_offset > self._count:
+            raise ValueError(
+                f"Window of {size} samples ending {end_offset} back exceeds {self._count} buffered samples"
+            )
+        end = self._head + self.capacity - end_offset
+        view = self._data[end - size:end]
+        view.flags.writeable = False
+        return view
+
+    def clear(self):
+        self._head = 0
+        self._count = 0
+        self.total_samples = 0